@@ -31,7 +31,7 @@ Add:
 Return the enhanced outline while preserving the core story."""}
     ]
     
-    enhanced_text = brain.chat(messages)
+    enhanced_text = brain.chat(messages, label="chat:humor")
     
     # Extract what was added
     humor_prompt = [
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+from typing import Any, Callable, Optional
+from fake_llm import FakeLlm
+from llm_pool import LlmPool, PoolMember
+from rate_limit import RateLimiter, estimate_tokens
+from usage import record_call
+
+# Model used when none is given on the command line
+DEFAULT_MODEL = "ollama:llama3.2:latest"
+
+PING = [{"role": "user", "content": "Reply with the single word OK."}]
+
+
+def model_named(model_name: str, rate_limiter: Optional[RateLimiter] = None) -> Any:
+    """
+    Resolve a model spec to a backend with dazllm's chat/chat_structured interface.
+
+    A comma-separated spec (e.g. "ollama:llama3.2:latest*2,lmstudio:llama3.2") names several
+    equivalent endpoints and becomes a load-balanced LlmPool with hedged requests; an optional
+    "*N" suffix gives an endpoint weight N. Idle endpoints are probed with a one-word chat, so
+    a pool readmits one that has come back without waiting out its ejection. Probes wait on
+    rate_limiter, if given, like any other call, and are counted in usage.
+    "fake" (optionally with options, e.g. "fake:words=500:latency=0.2") is the offline FakeLlm.
+    Anything else is passed straight to dazllm's Llm.model_named.
+    """
+    specs = [spec.strip() for spec in model_name.split(",") if spec.strip()]
+    if len(specs) > 1:
+        members = []
+        for spec in specs:
+            name, _, weight = spec.partition("*")
+            llm = model_named(name)
+            members.append(PoolMember(llm, name=name, weight=float(weight) if weight else 1.0,
+                                      health_check=_ping(llm, name, rate_limiter)))
+        return LlmPool(members)
+
+    spec = specs[0] if specs else model_name
+    if spec == "fake" or spec.startswith("fake:"):
+        return FakeLlm.from_spec(spec)
+
+    sys.path.append(os.path.expanduser('~/src/dazllm'))
+    from dazllm import Llm
+    return Llm.model_named(spec)
+
+
+def _ping(llm: Any, name: str, rate_limiter: Optional[RateLimiter]) -> Callable[[], Any]:
+    """
+    A health check asking the backend for a one-word answer. dazllm has no cheaper readiness
+    call common to every provider, so the probe is paced and accounted for as a real request.
+    """
+    def ping():
+        prompt_tokens = estimate_tokens(PING[0]["content"])
+        if rate_limiter:
+            rate_limiter.acquire(name, prompt_tokens)
+        started = time.monotonic()
+        reply = llm.chat(PING)
+        completion_tokens = estimate_tokens(reply)
+        if rate_limiter:
+            rate_limiter.record_tokens(name, completion_tokens)
+        record_call("chat:health_check", name, prompt_tokens, completion_tokens,
+                    time.monotonic() - started, cache_hit=False)
+        return reply
+    return ping
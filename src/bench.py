@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional
+from pydantic import BaseModel
+from tracing import TraceListener, add_listener, remove_listener
+
+DEFAULT_SIZES = "1x1,10x10,50x20,200x10"
+DEFAULT_WORDS = 1500
+PHASES = ("planning", "section_planning", "writing", "epub")
+BENCH_DIR = Path(__file__).parent.parent / "bench"
+BASELINES_DIR = BENCH_DIR / "baselines"
+THRESHOLDS_FILE = BENCH_DIR / "thresholds.json"
+MIB = 1024 * 1024
+
+
+class PhaseStats(BaseModel):
+    """What one phase of write_novel cost, excluding time spent inside the (fake) model"""
+    steps: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    bytes_written: int = 0
+    files_created: int = 0
+    seconds_by_category: dict[str, float] = {}
+
+
+class BenchRun(BaseModel):
+    size: str
+    chapters: int
+    sections_per_chapter: int
+    words_per_section: int
+    phases: dict[str, PhaseStats]
+    total: PhaseStats
+
+
+class BenchReport(BaseModel):
+    created_at: str
+    python: str
+    platform: str
+    bytes_written_source: str
+    runs: list[BenchRun]
+
+
+class Threshold(BaseModel):
+    """A metric regresses when it grows by more than `ratio` of its baseline and by more than `minimum`"""
+    ratio: float
+    minimum: float = 0
+
+
+class Thresholds(BaseModel):
+    """How much each per-phase metric may grow before --compare fails"""
+    wall_seconds: Threshold = Threshold(ratio=0.25, minimum=0.05)
+    cpu_seconds: Threshold = Threshold(ratio=0.25, minimum=0.05)
+    peak_rss_bytes: Threshold = Threshold(ratio=0.15, minimum=8 * MIB)
+    bytes_written: Threshold = Threshold(ratio=0.05, minimum=64 * 1024)
+    files_created: Threshold = Threshold(ratio=0.0)
+
+
+class MetricDiff(BaseModel):
+    size: str
+    phase: str
+    metric: str
+    baseline: float
+    current: float
+    regressed: bool
+
+    @property
+    def change(self) -> Optional[float]:
+        """Relative change from the baseline, or None if the baseline was zero"""
+        return (self.current - self.baseline) / self.baseline if self.baseline else None
+
+
+def load_thresholds(path: Path = THRESHOLDS_FILE) -> Thresholds:
+    """Thresholds from the repo's bench/thresholds.json, falling back to the defaults for anything not set"""
+    if not path.exists():
+        return Thresholds()
+    with open(path, "r", encoding="utf-8") as f:
+        return Thresholds.model_validate(json.load(f))
+
+
+def load_report(path: Path) -> BenchReport:
+    with open(path, "r", encoding="utf-8") as f:
+        return BenchReport.model_validate(json.load(f))
+
+
+def compare_reports(baseline: BenchReport, current: BenchReport,
+                    thresholds: Optional[Thresholds] = None) -> list[MetricDiff]:
+    """
+    Per-phase, per-metric differences for every book size present in both reports.
+    Bytes written are only compared when both reports measured them the same way.
+    """
+    thresholds = thresholds or Thresholds()
+    metrics = list(Thresholds.model_fields)
+    if baseline.bytes_written_source != current.bytes_written_source:
+        metrics.remove("bytes_written")
+    baseline_runs = {run.size: run for run in baseline.runs}
+    diffs = []
+    for run in current.runs:
+        before = baseline_runs.get(run.size)
+        if before is None:
+            continue
+        phases = [(phase, before.phases.get(phase), stats) for phase, stats in run.phases.items()]
+        for phase, old, new in phases + [("total", before.total, run.total)]:
+            if old is None:
+                continue
+            for metric in metrics:
+                limit: Threshold = getattr(thresholds, metric)
+                old_value, new_value = getattr(old, metric), getattr(new, metric)
+                growth = new_value - old_value
+                diffs.append(MetricDiff(size=run.size, phase=phase, metric=metric, baseline=old_value,
+                                        current=new_value,
+                                        regressed=growth > limit.minimum and growth > old_value * limit.ratio))
+    return diffs
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    """"10x20" -> (10 chapters, 20 sections per chapter)"""
+    match = re.fullmatch(r"\s*(\d+)\s*[x×]\s*(\d+)\s*", size)
+    if not match:
+        raise ValueError(f"Book size must look like CHAPTERSxSECTIONS, e.g. 10x10, not {size!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def phase_for(step: str) -> str:
+    if step.startswith("Write Chapter"):
+        return "writing"
+    if step.startswith("Break Chapter"):
+        return "section_planning"
+    if step == "Create EPUB":
+        return "epub"
+    return "planning"
+
+
+def _current_rss() -> int:
+    """Resident set size now, or the process high-water mark where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _bytes_written() -> Optional[int]:
+    """Bytes passed to write() by this process so far (Linux only)"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _tree_stats(root: Path) -> tuple[int, int]:
+    """(file count, total bytes) under root"""
+    count = size = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            try:
+                size += os.stat(os.path.join(directory, name)).st_size
+            except FileNotFoundError:
+                continue
+            count += 1
+    return count, size
+
+
+class _NullWriter(io.TextIOBase):
+    """Swallows console output without a write() syscall, so it does not count as I/O"""
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+class PhaseMeter(TraceListener):
+    """
+    Splits a run into phases at step boundaries (using the spans record() emits) and
+    measures each phase: wall and CPU time, peak RSS (sampled in the background), bytes
+    written and files created under root, and traced time by span category.
+    Time spent inside model calls is subtracted from wall and CPU time (the fake model is
+    CPU-bound, so the two are the same for it), leaving the pipeline's own overhead.
+    """
+
+    def __init__(self, root: Path, sample_interval: float = 0.01):
+        self.root = root
+        self.sample_interval = sample_interval
+        self.phases: dict[str, PhaseStats] = {}
+        self._phase: Optional[str] = None
+        self._started = 0.0
+        self._cpu_started = 0.0
+        self._written_started = 0
+        self._tree_started = (0, 0)
+        self._model_seconds = 0.0
+        self._peak = 0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="bench-rss", daemon=True)
+
+    def start(self):
+        add_listener(self)
+        self._sampler.start()
+
+    def stop(self):
+        self._switch(None)
+        remove_listener(self)
+        self._stop.set()
+        self._sampler.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            self._peak = max(self._peak, _current_rss())
+
+    def span_started(self, name: str, cat: str):
+        if cat == "step":
+            phase = phase_for(name)
+            if phase != self._phase:
+                self._switch(phase)
+
+    def span_finished(self, event: dict[str, Any]):
+        if self._phase is None:
+            return
+        stats = self.phases[self._phase]
+        seconds = event["dur"] / 1e6
+        if event["cat"] == "step":
+            stats.steps += 1
+        else:
+            stats.seconds_by_category[event["cat"]] = stats.seconds_by_category.get(event["cat"], 0.0) + seconds
+        if event["cat"] == "llm":
+            self._model_seconds += seconds
+
+    def _switch(self, phase: Optional[str]):
+        now = time.perf_counter()
+        cpu = time.process_time()
+        written = _bytes_written()
+        tree = _tree_stats(self.root)
+        if self._phase is not None:
+            stats = self.phases[self._phase]
+            stats.wall_seconds += now - self._started - self._model_seconds
+            stats.cpu_seconds += max(0.0, cpu - self._cpu_started - self._model_seconds)
+            stats.peak_rss_bytes = max(stats.peak_rss_bytes, self._peak, _current_rss())
+            if written is not None:
+                stats.bytes_written += written - self._written_started
+            else:
+                stats.bytes_written += max(0, tree[1] - self._tree_started[1])
+            stats.files_created += tree[0] - self._tree_started[0]
+        if phase is not None:
+            self.phases.setdefault(phase, PhaseStats())
+            self._started, self._cpu_started = now, cpu
+            self._written_started, self._tree_started = written or 0, tree
+            self._model_seconds = 0.0
+            self._peak = _current_rss()
+        self._phase = phase
+
+
+def _total(phases: dict[str, PhaseStats]) -> PhaseStats:
+    total = PhaseStats()
+    for stats in phases.values():
+        total.steps += stats.steps
+        total.wall_seconds += stats.wall_seconds
+        total.cpu_seconds += stats.cpu_seconds
+        total.peak_rss_bytes = max(total.peak_rss_bytes, stats.peak_rss_bytes)
+        total.bytes_written += stats.bytes_written
+        total.files_created += stats.files_created
+        for category, seconds in stats.seconds_by_category.items():
+            total.seconds_by_category[category] = total.seconds_by_category.get(category, 0.0) + seconds
+    return total
+
+
+def bench_book(chapters: int, sections: int, words: int = DEFAULT_WORDS,
+               work_dir: Optional[Path] = None) -> BenchRun:
+    """
+    Write one book against the zero-latency fake model in a scratch directory (under work_dir,
+    if given - results depend on the filesystem, so compare runs made on the same one).
+    """
+    from noveliser import write_novel
+
+    with tempfile.TemporaryDirectory(prefix="noveliser-bench-", dir=work_dir) as tmpdir:
+        root = Path(tmpdir)
+        output_dir = root / "output"
+        output_dir.mkdir()
+        meter = PhaseMeter(root)
+        meter.start()
+        try:
+            with redirect_stdout(_NullWriter()):
+                write_novel("A lighthouse keeper finds a message in a bottle", output_dir,
+                            model_name=f"fake:words={words}", num_chapters=chapters,
+                            sections_per_chapter=sections, author="Bench", image_model="fake")
+        finally:
+            meter.stop()
+
+    phases = {phase: meter.phases[phase] for phase in PHASES if phase in meter.phases}
+    return BenchRun(size=f"{chapters}x{sections}", chapters=chapters, sections_per_chapter=sections,
+                    words_per_section=words, phases=phases, total=_total(phases))
+
+
+def run_benchmarks(sizes: list[str], words: int = DEFAULT_WORDS, work_dir: Optional[Path] = None,
+                   progress: Callable[[BenchRun], None] = lambda run: None) -> BenchReport:
+    """Benchmark each book size in turn"""
+    runs = []
+    for size in sizes:
+        chapters, sections = parse_size(size)
+        run = bench_book(chapters, sections, words, work_dir)
+        progress(run)
+        runs.append(run)
+    return BenchReport(
+        created_at=datetime.now().isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        bytes_written_source="wchar" if _bytes_written() is not None else "file sizes",
+        runs=runs,
+    )
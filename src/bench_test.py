@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from bench import (BASELINES_DIR, MIB, PHASES, THRESHOLDS_FILE, BenchReport, BenchRun, PhaseStats, Threshold,
+                   Thresholds, bench_book, compare_reports, load_report, load_thresholds, parse_size, phase_for)
+
+
+def test_parse_size():
+    """Test book size parsing"""
+    assert parse_size("10x20") == (10, 20)
+    assert parse_size(" 2 x 3 ") == (2, 3)
+    with pytest.raises(ValueError):
+        parse_size("ten")
+
+
+def test_phase_for_steps():
+    """Test that pipeline steps map to benchmark phases"""
+    assert phase_for("Generate a title") == "planning"
+    assert phase_for("Break into 10 chapters") == "planning"
+    assert phase_for("Break Chapter 3 into 10 sections") == "section_planning"
+    assert phase_for("Write Chapter 3, Section 2") == "writing"
+    assert phase_for("Create EPUB") == "epub"
+
+
+def test_bench_book_measures_every_phase(tmp_path):
+    """Test a small benchmark run end to end"""
+    run = bench_book(2, 2, words=50, work_dir=tmp_path)
+
+    assert list(run.phases) == list(PHASES)
+    assert run.phases["section_planning"].steps == 2
+    assert run.phases["writing"].steps == 4
+    assert run.total.steps == sum(stats.steps for stats in run.phases.values())
+    assert run.phases["writing"].files_created >= 4
+    assert run.total.bytes_written > 0
+    assert run.total.peak_rss_bytes > 0
+    assert "io" in run.phases["writing"].seconds_by_category
+    # The scratch book is cleaned up
+    assert list(tmp_path.iterdir()) == []
+
+
+def _report(wall: float, files: int, source: str = "wchar") -> BenchReport:
+    stats = PhaseStats(steps=4, wall_seconds=wall, cpu_seconds=1.0, peak_rss_bytes=100 * MIB,
+                       bytes_written=10 * MIB, files_created=files)
+    return BenchReport(created_at="now", python="3", platform="test", bytes_written_source=source,
+                       runs=[BenchRun(size="2x2", chapters=2, sections_per_chapter=2, words_per_section=50,
+                                      phases={"writing": stats}, total=stats)])
+
+
+def test_compare_reports_flags_regressions_beyond_thresholds():
+    """Test that only growth past both the ratio and the minimum counts as a regression"""
+    diffs = compare_reports(_report(wall=1.0, files=10), _report(wall=1.2, files=11))
+    regressed = {(diff.phase, diff.metric) for diff in diffs if diff.regressed}
+
+    assert regressed == {("writing", "files_created"), ("total", "files_created")}
+    wall = next(diff for diff in diffs if diff.phase == "writing" and diff.metric == "wall_seconds")
+    assert wall.change == pytest.approx(0.2)
+
+    strict = Thresholds(wall_seconds=Threshold(ratio=0.1))
+    assert any(diff.regressed for diff in compare_reports(_report(1.0, 10), _report(1.2, 10), strict)
+               if diff.metric == "wall_seconds")
+
+
+def test_compare_reports_skips_incomparable_data():
+    """Test that sizes missing from the baseline and differently measured bytes are not compared"""
+    other_size = _report(wall=1.0, files=10)
+    other_size.runs[0].size = "3x3"
+    assert compare_reports(other_size, _report(wall=9.0, files=99)) == []
+
+    diffs = compare_reports(_report(1.0, 10, source="file sizes"), _report(1.0, 10))
+    assert "bytes_written" not in {diff.metric for diff in diffs}
+
+
+def test_thresholds_file_is_valid():
+    """Test that the repo's thresholds and baselines load"""
+    assert load_thresholds() == Thresholds.model_validate_json(THRESHOLDS_FILE.read_text())
+    for path in BASELINES_DIR.glob("*.json"):
+        assert load_report(path).runs
@@ -1,82 +1,183 @@
 import json
 import hashlib
-import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any, Optional, Type
-import sys
-sys.path.append(os.path.expanduser('~/src/dazllm'))
-from dazllm import Llm
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Type
 from pydantic import BaseModel
+from backends import DEFAULT_MODEL
+from cache_store import CacheStore, INPUTS_REF
+from concurrency import AdaptiveLimiter, LimiterMetrics
+from resilience import CircuitBreaker, call_with_breaker
+from rate_limit import RateLimiter, default_rate_limiter, estimate_tokens
+from usage import record_call
+from tracing import span
+
+if TYPE_CHECKING:
+    # Only for annotations - any backend with the same interface works (see backends.model_named)
+    from dazllm import Llm
+
+_fresh: ContextVar[bool] = ContextVar("fresh_answers", default=False)
+
+# Version 1 cache keys hashed only the call's arguments; version 2 adds the model
+CACHE_KEY_VERSION = 2
+
+
+@contextmanager
+def fresh_answers(enabled: bool = True) -> Iterator[None]:
+    """Within this context (this thread or task), Brain calls act as if given refresh=True"""
+    token = _fresh.set(enabled or _fresh.get())
+    try:
+        yield
+    finally:
+        _fresh.reset(token)
 
 class Brain:
     """
     Caching wrapper for dazllm that stores LLM responses to avoid redundant API calls.
+    Responses are cached under output_dir/cache (or cache_dir) and rate limits are read from
+    output_dir. Pass store_inputs="none" to keep only responses, or "inline" to keep full prompts.
+    One Brain can be shared by threads writing several novels at once.
     """
     
-    def __init__(self, llm: Llm):
+    def __init__(self, llm: "Llm", output_dir: Path, store_inputs: str = INPUTS_REF,
+                 limiter: Optional[AdaptiveLimiter] = None, breaker: Optional[CircuitBreaker] = None,
+                 rate_limiter: Optional[RateLimiter] = None, rate_key: Optional[str] = None,
+                 cache_dir: Optional[Path] = None, legacy_model: Optional[str] = DEFAULT_MODEL):
         self.llm = llm
-        self.cache_dir = Path("output/cache")
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter or default_rate_limiter(output_dir)
+        self.rate_key = rate_key or getattr(llm, "model_name", None) or "default"
+        self.model_key = getattr(llm, "model_name", None) or self.rate_key
+        # Version 1 entries do not say which model wrote them; they are read back for this one only
+        self.read_legacy_keys = legacy_model is not None and self.model_key == legacy_model
+        self.cache_dir = Path(cache_dir) if cache_dir else Path(output_dir) / "cache"
+        self.cache = CacheStore(self.cache_dir, store_inputs)
         
     def _hash_input(self, *args, **kwargs) -> str:
-        """Create a hash from the input arguments."""
+        """Create a hash from the model and the input arguments, so another model is asked afresh."""
+        input_str = json.dumps({"version": CACHE_KEY_VERSION, "model": self.model_key, "args": args, "kwargs": kwargs},
+                               sort_keys=True, default=str)
+        return hashlib.sha256(input_str.encode()).hexdigest()
+    
+    @staticmethod
+    def _legacy_hash_input(*args, **kwargs) -> str:
+        """Create a version 1 hash, from the input arguments alone."""
         input_str = json.dumps({"args": args, "kwargs": kwargs}, sort_keys=True, default=str)
         return hashlib.sha256(input_str.encode()).hexdigest()
     
-    def _get_cache_path(self, hash_key: str) -> Path:
-        """Get the cache file path for a given hash."""
-        return self.cache_dir / f"{hash_key}.json"
+    def _keys(self, *args, **kwargs) -> list[str]:
+        """Cache keys for one call, newest scheme first."""
+        keys = [self._hash_input(*args, **kwargs)]
+        if self.read_legacy_keys:
+            keys.append(self._legacy_hash_input(*args, **kwargs))
+        return keys
+    
+    def _load_from_cache(self, keys: list[str]) -> tuple[str, Optional[dict[str, Any]]]:
+        """
+        Load the cached response under the first key that has one, returning that key and the entry.
+        On a miss the current key is returned with None. Corrupt entries are quarantined and treated as misses.
+        """
+        for hash_key in keys:
+            with span("cache lookup", "cache", key=hash_key[:16]) as args:
+                cached = self.cache.get(hash_key)
+                args["hit"] = cached is not None
+            if cached is not None:
+                return hash_key, cached
+        return keys[0], None
+    
+    @staticmethod
+    def _prompt_tokens(messages: list[dict[str, str]]) -> int:
+        return estimate_tokens("".join(message["content"] for message in messages))
     
-    def _load_from_cache(self, hash_key: str) -> Optional[dict[str, Any]]:
-        """Load cached response if it exists."""
-        cache_path = self._get_cache_path(hash_key)
-        if cache_path.exists():
-            with open(cache_path, 'r') as f:
-                return json.load(f)
-        return None
+    def _record_hit(self, label: str, messages: list[dict[str, str]], output: Any, started: float):
+        completion = output if isinstance(output, str) else json.dumps(output)
+        record_call(label, self.rate_key, self._prompt_tokens(messages), estimate_tokens(completion),
+                    time.monotonic() - started, cache_hit=True)
     
-    def _save_to_cache(self, hash_key: str, inputs: dict, output: Any):
-        """Save response to cache."""
-        cache_path = self._get_cache_path(hash_key)
-        cache_data = {
-            "inputs": inputs,
-            "output": output
-        }
-        with open(cache_path, 'w') as f:
-            json.dump(cache_data, f, indent=2, default=str)
+    def _call_llm(self, label: str, messages: list[dict[str, str]], call):
+        """
+        Run one uncached LLM call. It waits on the provider's shared rate limits, keyed by rate_key,
+        then takes a slot from the AIMD limiter so threads sharing the Brain do not overload the
+        model server. Transient failures are retried through the circuit breaker, so a backend that
+        is down or restarting pauses the pipeline with backoff instead of failing it.
+        Latency is that of the attempt that succeeded, excluding rate-limit and backoff waits.
+        """
+        prompt_tokens = self._prompt_tokens(messages)
+        latency = 0.0
+        def attempt():
+            nonlocal latency
+            self.rate_limiter.acquire(self.rate_key, prompt_tokens)
+            with self.limiter.slot(label), span(label, "llm", model=self.rate_key, prompt_tokens=prompt_tokens):
+                started = time.monotonic()
+                result = call()
+                latency = time.monotonic() - started
+            return result
+        result = call_with_breaker(self.breaker, attempt)
+        completion_tokens = estimate_tokens(result if isinstance(result, str) else result.model_dump_json())
+        self.rate_limiter.record_tokens(self.rate_key, completion_tokens)
+        record_call(label, self.rate_key, prompt_tokens, completion_tokens, latency, cache_hit=False)
+        return result
     
-    def chat(self, messages: list[dict[str, str]], **kwargs) -> str:
-        """Cached wrapper for llm.chat()"""
-        hash_key = self._hash_input(messages, **kwargs)
+    def chat(self, messages: list[dict[str, str]], refresh: bool = False, label: str = "chat", **kwargs) -> str:
+        """
+        Cached wrapper for llm.chat(). refresh=True skips the cached answer and replaces it.
+        label names the kind of call (e.g. "chat:section") for the limiter, whose latency
+        baselines are per label, and for usage; it is not part of the cache key.
+        Every call, cached or not, is reported to the usage tracker and traced for the calling
+        context's pipeline step.
+        """
+        started = time.monotonic()
+        keys = self._keys(messages, **kwargs)
         
-        cached = self._load_from_cache(hash_key)
+        hash_key, cached = (keys[0], None) if refresh or _fresh.get() else self._load_from_cache(keys)
+        self.cache.record_access(hash_key, cached is not None, "chat")
         if cached:
+            self._record_hit(label, messages, cached["output"], started)
             return cached["output"]
         
-        result = self.llm.chat(messages, **kwargs)
-        self._save_to_cache(hash_key, {"messages": messages, "kwargs": kwargs}, result)
+        result = self._call_llm(label, messages, lambda: self.llm.chat(messages, **kwargs))
+        self.cache.put(hash_key, "chat", result, messages, kwargs=kwargs)
         return result
     
-    def chat_structured(self, messages: list[dict[str, str]], model_class: Type[BaseModel], **kwargs) -> BaseModel:
-        """Cached wrapper for llm.chat_structured() - only accepts Pydantic BaseModel types"""
-        hash_key = self._hash_input(messages, model_class.__name__, **kwargs)
+    def chat_structured(self, messages: list[dict[str, str]], model_class: Type[BaseModel],
+                        refresh: bool = False, **kwargs) -> BaseModel:
+        """
+        Cached wrapper for llm.chat_structured() - only accepts Pydantic BaseModel types.
+        refresh=True skips the cached answer and replaces it. Reported and traced like chat().
+        """
+        started = time.monotonic()
+        label = f"chat_structured:{model_class.__name__}"
+        keys = self._keys(messages, model_class.__name__, **kwargs)
         
-        cached = self._load_from_cache(hash_key)
+        hash_key, cached = (keys[0], None) if refresh or _fresh.get() else self._load_from_cache(keys)
+        self.cache.record_access(hash_key, cached is not None, "chat_structured", model_class.__name__)
         if cached:
+            self._record_hit(label, messages, cached["output"], started)
             # Reconstruct the model from cached dict data
             return model_class(**cached["output"])
         
-        result = self.llm.chat_structured(messages, model_class, **kwargs)
+        result = self._call_llm(label, messages, lambda: self.llm.chat_structured(messages, model_class, **kwargs))
         
         # Cache the dict representation
-        self._save_to_cache(
-            hash_key, 
-            {"messages": messages, "model_class": model_class.__name__, "kwargs": kwargs}, 
-            result.model_dump()
-        )
+        self.cache.put(hash_key, "chat_structured", result.model_dump(mode="json"), messages,
+                       model_class=model_class.__name__, kwargs=kwargs)
         return result
     
+    def metrics(self) -> LimiterMetrics:
+        """Current concurrency limit and observed LLM latencies."""
+        return self.limiter.metrics()
+    
+    def invalidate(self, messages: list[dict[str, str]], model_class: Optional[Type[BaseModel]] = None, **kwargs) -> bool:
+        """Drop the cached answer for one chat (or chat_structured, if model_class is given) call."""
+        if model_class is None:
+            keys = self._keys(messages, **kwargs)
+        else:
+            keys = self._keys(messages, model_class.__name__, **kwargs)
+        return any([self.cache.remove(hash_key) for hash_key in keys])
+    
     def clear_cache(self):
         """Clear all cached responses."""
-        for cache_file in self.cache_dir.glob("*.json"):
-            cache_file.unlink()
\ No newline at end of file
+        self.cache.clear()
\ No newline at end of file
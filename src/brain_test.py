@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
-import sys
-import os
+import time
 from pathlib import Path
-sys.path.append(os.path.expanduser('~/src/dazllm'))
-from dazllm import Llm
+from types import SimpleNamespace
+from backends import model_named
 from brain import Brain
+from context_test import test_context
 from pydantic import BaseModel
 
 
@@ -14,10 +14,10 @@ class TestResponse(BaseModel):
     count: int
 
 
-def test_brain_chat():
+def test_brain_chat(tmp_path):
     """Test basic brain chat functionality"""
-    llm = Llm("ollama:gpt-oss:20b")
-    brain = Brain(llm)
+    llm = model_named(test_context.MODEL_NAME)
+    brain = Brain(llm, tmp_path)
     
     messages = [
         {"role": "system", "content": "You are a helpful assistant."},
@@ -31,10 +31,10 @@ def test_brain_chat():
     print(f"✅ Brain chat response: {response}")
 
 
-def test_brain_structured_chat():
+def test_brain_structured_chat(tmp_path):
     """Test brain structured chat with Pydantic models"""
-    llm = Llm("ollama:gpt-oss:20b")
-    brain = Brain(llm)
+    llm = model_named(test_context.MODEL_NAME)
+    brain = Brain(llm, tmp_path)
     
     messages = [
         {"role": "system", "content": "You are a helpful assistant that responds in JSON."},
@@ -49,10 +49,10 @@ def test_brain_structured_chat():
     print(f"✅ Structured response: text='{response.text}', count={response.count}")
 
 
-def test_brain_caching():
+def test_brain_caching(tmp_path):
     """Test that brain caches identical requests"""
-    llm = Llm("ollama:gpt-oss:20b")
-    brain = Brain(llm)
+    llm = model_named(test_context.MODEL_NAME)
+    brain = Brain(llm, tmp_path)
     
     messages = [
         {"role": "system", "content": "You are a consistent assistant."},
@@ -67,4 +67,72 @@ def test_brain_caching():
     
     # Responses should be identical due to caching
     assert response1 == response2
-    print(f"✅ Caching works: '{response1}' == '{response2}'")
\ No newline at end of file
+    print(f"✅ Caching works: '{response1}' == '{response2}'")
+
+
+def test_fresh_answers_skip_the_cache(tmp_path):
+    """Test that calls inside fresh_answers go to the model even when an answer is cached"""
+    from brain import fresh_answers
+    from usage import track_usage
+
+    brain = Brain(model_named("fake"), tmp_path)
+    messages = [{"role": "user", "content": "Say something fresh."}]
+    brain.chat(messages)
+
+    calls = []
+    with track_usage(calls):
+        brain.chat(messages)
+        with fresh_answers():
+            brain.chat(messages)
+        with fresh_answers(False):
+            brain.chat(messages)
+    assert [call.cache_hit for call in calls] == [True, False, True]
+
+
+class _ProseIsSlow:
+    """Backend that answers short calls quickly and long prose ten times slower, as a healthy server does"""
+    model_name = "slow-prose"
+
+    def chat(self, messages, **kwargs):
+        time.sleep(0.02 if "1500-2000 words" in messages[-1]["content"] else 0.002)
+        return "text"
+
+
+def test_section_and_fact_calls_keep_separate_latency_baselines(tmp_path):
+    """Test that alternating long prose and short fact calls, as write_section makes, do not shrink the limit"""
+    from concurrency import AdaptiveLimiter
+    from write_section import write_section
+
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=8)
+    brain = Brain(_ProseIsSlow(), tmp_path, limiter=limiter)
+    chapter = SimpleNamespace(number=1, title="One")
+    style = SimpleNamespace(style_description="plain", tone="calm", voice="third", pacing="even")
+    for n in range(40):
+        section = SimpleNamespace(number=n, goal=f"Goal {n}", key_events=[])
+        write_section(brain, chapter, section, "", [], style)
+
+    metrics = limiter.metrics()
+    assert metrics.decreases == 0 and metrics.limit == 8
+    assert set(metrics.baseline_latency) == {"chat:section", "chat:facts"}
+
+
+def test_version_1_entries_are_read_for_the_default_model_only(tmp_path):
+    """Test that answers cached before keys named the model still hit for the default model, and only for it"""
+    from usage import track_usage
+
+    messages = [{"role": "user", "content": "Say something old."}]
+    old = Brain(model_named("fake"), tmp_path, legacy_model="fake")
+    old.cache.put(old._legacy_hash_input(messages), "chat", "cached before the upgrade", messages, kwargs={})
+
+    assert old.chat(messages) == "cached before the upgrade"
+    assert Brain(model_named("fake"), tmp_path, legacy_model=None).chat(messages) != "cached before the upgrade"
+    assert Brain(model_named("fake:words=20"), tmp_path, legacy_model="fake").chat(messages) != "cached before the upgrade"
+
+    calls = []
+    with track_usage(calls):
+        assert old.chat(messages, refresh=True) != "cached before the upgrade"
+        old.chat(messages)
+    assert [call.cache_hit for call in calls] == [False, True]
+
+    assert old.invalidate(messages)
+    assert old.chat(messages) != "cached before the upgrade"
@@ -2,6 +2,7 @@
 
 from pydantic import BaseModel, Field
 from brain import Brain
+from count_repair import repair_count
 
 
 class Chapter(BaseModel):
@@ -61,12 +62,49 @@ Create exactly {num_chapters} chapters that progress the complete story."""}
     
     result = brain.chat_structured(messages, ChapterPlan)
     
-    # Validate we got the right number of chapters
+    # Repair a wrong chapter count by asking only for what is missing or merging the surplus
     if len(result.chapters) != num_chapters:
-        raise ValueError(f"LLM failed to generate correct number of chapters. Requested {num_chapters}, got {len(result.chapters)}")
+        try:
+            result.chapters = repair_count(
+                result.chapters, num_chapters,
+                lambda so_far, missing, attempt: _request_missing_chapters(brain, messages, so_far, missing, num_chapters, attempt),
+                _merge_chapters, "chapters")
+        except ValueError:
+            # Don't leave the bad plan cached, or the next run would fail the same way
+            brain.invalidate(messages, ChapterPlan)
+            raise
     
     # Ensure chapters are numbered correctly
     for i, chapter in enumerate(result.chapters):
         chapter.number = i + 1
     
-    return result
\ No newline at end of file
+    return result
+
+
+def _request_missing_chapters(brain: Brain, messages: list[dict[str, str]], so_far: list[Chapter],
+                              missing: int, num_chapters: int, attempt: int) -> list[Chapter]:
+    """Ask for just the chapters that come after the ones already planned."""
+    planned = "\n".join(f"Chapter {i + 1}: {chapter.title} - {chapter.chapter_goal} (ends: {chapter.closing_situation})"
+                         for i, chapter in enumerate(so_far))
+    follow_up = messages + [
+        {"role": "user", "content": f"""The plan so far has only {len(so_far)} of the {num_chapters} chapters:
+
+{planned}
+
+Create ONLY the remaining {missing} chapters (chapters {len(so_far) + 1} to {num_chapters}), continuing directly from where chapter {len(so_far)} ends. The last of them must be the final chapter of the story. Return exactly {missing} chapters."""}
+    ]
+    # Later attempts bypass the cache - replaying the same short answer would never converge
+    return brain.chat_structured(follow_up, ChapterPlan, refresh=attempt > 1).chapters
+
+
+def _merge_chapters(surplus: list[Chapter]) -> Chapter:
+    """Fold surplus chapters into one that spans them all."""
+    first, last = surplus[0], surplus[-1]
+    return Chapter(
+        number=first.number,
+        title=first.title,
+        opening_situation=first.opening_situation,
+        chapter_goal=" ".join(chapter.chapter_goal for chapter in surplus),
+        closing_situation=last.closing_situation,
+        key_events=[event for chapter in surplus for event in chapter.key_events],
+    )
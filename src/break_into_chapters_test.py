@@ -1,9 +1,38 @@
 #!/usr/bin/env python3
 
 import pytest
+from brain import Brain
 from context_test import get_test_brain
-from break_into_chapters import break_into_chapters
+from break_into_chapters import ChapterPlan, break_into_chapters
+from count_repair import MAX_REPAIR_ATTEMPTS
 from create_characters import Character, CharacterRole
+from fake_llm import FakeLlm
+
+
+class ShortPlans(FakeLlm):
+    """Fake model whose first plan is `short` items short; with fills=False its follow-ups add nothing"""
+
+    def __init__(self, short: int, fills: bool = True):
+        super().__init__()
+        self.short = short
+        self.fills = fills
+        self.requests: list[str] = []
+
+    def chat_structured(self, messages, model_class, **kwargs):
+        result = super().chat_structured(messages, model_class, **kwargs)
+        self.requests.append(messages[-1]["content"])
+        field = next(iter(model_class.model_fields))
+        if len(self.requests) == 1:
+            setattr(result, field, getattr(result, field)[:-self.short])
+        elif not self.fills:
+            setattr(result, field, [])
+        return result
+
+
+def _plan_chapters(brain: Brain, num_chapters: int) -> ChapterPlan:
+    characters = [Character(name="Alex", biography="A young hero", role=CharacterRole.PROTAGONIST, traits=["brave"])]
+    return break_into_chapters(brain, "A hero leaves home, is tested and comes back changed.", characters,
+                               ["Courage"], "Quest", "Light banter", num_chapters)
 
 
 def test_break_into_chapters_basic():
@@ -100,6 +129,42 @@ def test_single_chapter_story():
     print(f"Closing: {chapter.closing_situation}")
 
 
+def test_short_plan_is_completed_with_only_the_missing_chapters(tmp_path):
+    """A plan two chapters short gets just those two asked for, and the whole plan is renumbered"""
+    llm = ShortPlans(short=2)
+    brain = Brain(llm, tmp_path)
+
+    result = _plan_chapters(brain, 5)
+
+    assert llm.calls == 2
+    assert "Create ONLY the remaining 2 chapters (chapters 4 to 5)" in llm.requests[1]
+    assert "Return exactly 2 chapters" in llm.requests[1]
+    assert [chapter.number for chapter in result.chapters] == [1, 2, 3, 4, 5]
+
+    # Both answers are cached, so a rerun rebuilds the same plan without asking again
+    assert _plan_chapters(brain, 5) == result
+    assert llm.calls == 2
+
+
+def test_unrepairable_plan_is_dropped_from_the_cache(tmp_path):
+    """Repeated follow-ups are asked afresh, and a plan that can't be repaired isn't left cached"""
+    llm = ShortPlans(short=2, fills=False)
+    brain = Brain(llm, tmp_path)
+
+    with pytest.raises(ValueError):
+        _plan_chapters(brain, 5)
+
+    # The follow-up prompt doesn't change, so only refresh= keeps later attempts off the cache
+    assert llm.calls == 1 + MAX_REPAIR_ATTEMPTS
+    assert len(set(llm.requests[1:])) == 1
+
+    # A rerun asks for the whole plan again rather than replaying the short one
+    llm.requests.clear()
+    with pytest.raises(ValueError):
+        _plan_chapters(brain, 5)
+    assert "Create exactly 5 chapters" in llm.requests[0]
+
+
 if __name__ == "__main__":
     test_break_into_chapters_basic()
     test_single_chapter_story()
\ No newline at end of file
@@ -3,6 +3,7 @@
 from pydantic import BaseModel, Field
 from brain import Brain
 from break_into_chapters import Chapter
+from count_repair import repair_count
 
 
 class Section(BaseModel):
@@ -81,12 +82,44 @@ CRITICAL: Create exactly {sections_per_chapter} sections that collectively tell
         
         result = brain.chat_structured(messages, SectionPlan)
         
-        # Validate we got the right number of sections
+        # Repair a wrong section count by asking only for what is missing or merging the surplus
         if len(result.sections) != sections_per_chapter:
-            raise ValueError(f"LLM failed to generate correct number of sections. Requested {sections_per_chapter}, got {len(result.sections)}")
+            try:
+                result.sections = repair_count(
+                    result.sections, sections_per_chapter,
+                    lambda so_far, missing, attempt: _request_missing_sections(brain, messages, so_far, missing, sections_per_chapter, attempt),
+                    _merge_sections, "sections")
+            except ValueError:
+                # Don't leave the bad plan cached, or the next run would fail the same way
+                brain.invalidate(messages, SectionPlan)
+                raise
         
         # Ensure sections are numbered correctly
         for i, section in enumerate(result.sections):
             section.number = i + 1
         
-        return result
\ No newline at end of file
+        return result
+
+
+def _request_missing_sections(brain: Brain, messages: list[dict[str, str]], so_far: list[Section],
+                              missing: int, sections_per_chapter: int, attempt: int) -> list[Section]:
+    """Ask for just the sections that come after the ones already planned."""
+    planned = "\n".join(f"Section {i + 1}: {section.goal}" for i, section in enumerate(so_far))
+    follow_up = messages + [
+        {"role": "user", "content": f"""The plan so far has only {len(so_far)} of the {sections_per_chapter} sections:
+
+{planned}
+
+Create ONLY the remaining {missing} sections (sections {len(so_far) + 1} to {sections_per_chapter}), continuing from where section {len(so_far)} ends and reaching the chapter's closing situation. Return exactly {missing} sections."""}
+    ]
+    # Later attempts bypass the cache - replaying the same short answer would never converge
+    return brain.chat_structured(follow_up, SectionPlan, refresh=attempt > 1).sections
+
+
+def _merge_sections(surplus: list[Section]) -> Section:
+    """Fold surplus sections into one that covers them all."""
+    return Section(
+        number=surplus[0].number,
+        goal=" ".join(section.goal for section in surplus),
+        key_events=" ".join(section.key_events for section in surplus),
+    )
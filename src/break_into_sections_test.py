@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
 import pytest
+from brain import Brain
 from context_test import get_test_brain
 from break_into_sections import break_into_sections
 from break_into_chapters import Chapter
+from break_into_chapters_test import ShortPlans
 
 
 def test_break_chapter_into_sections():
@@ -63,6 +65,25 @@ def test_single_section_chapter():
     print(f"✅ Chapter broken into 1 section successfully")
 
 
+def test_short_plan_is_completed_with_only_the_missing_sections(tmp_path):
+    """A plan a section short gets just that one asked for, and the whole plan is renumbered"""
+    llm = ShortPlans(short=1)
+    brain = Brain(llm, tmp_path)
+    chapter = Chapter(number=2, title="The Crossing", opening_situation="The river is in flood.",
+                      chapter_goal="Get the party across.", closing_situation="They reach the far bank.",
+                      key_events=["The ferry breaks", "A rope bridge is built"])
+
+    result = break_into_sections(brain, chapter, 4)
+
+    assert llm.calls == 2
+    assert "Create ONLY the remaining 1 sections" in llm.requests[1]
+    assert [section.number for section in result.sections] == [1, 2, 3, 4]
+
+    # Both answers are cached, so a rerun rebuilds the same plan without asking again
+    assert break_into_sections(brain, chapter, 4) == result
+    assert llm.calls == 2
+
+
 if __name__ == "__main__":
     test_break_chapter_into_sections()
     test_single_section_chapter()
\ No newline at end of file
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import mmap
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from pydantic import BaseModel
+from safe_io import atomic_writer
+
+PACK_NAME = "cache.pack"
+MAGIC = b"NVPK"
+VERSION = 1
+
+# Layout: header | entry bodies | sorted index | footer
+# Each index record is the raw 32-byte sha256 key, the body offset and the body length.
+HEADER = struct.Struct(">4sI")
+RECORD = struct.Struct(">32sQI")
+FOOTER = struct.Struct(">QQ4s")
+
+
+class PackResult(BaseModel):
+    pack_path: str
+    entries: int
+    folded_in: int
+    dropped: int
+    bytes: int
+    blobs: int = 0
+    blobs_dropped: int = 0
+    blob_bytes: int = 0
+
+
+class PackReader:
+    """
+    Read-only view of a pack file.
+    The whole file is memory-mapped and keys are found by binary search over the sorted index,
+    so a lookup costs no file opens at all.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Empty pack file: {self.path}")
+
+        # A pack cut short (by a partial copy, say) is refused like any other foreign file
+        if len(self._map) < HEADER.size + FOOTER.size:
+            self.close()
+            raise ValueError(f"Truncated cache pack: {self.path}")
+        magic, version = HEADER.unpack_from(self._map, 0)
+        index_offset, count, footer_magic = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+        if magic != MAGIC or footer_magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a noveliser cache pack: {self.path}")
+        if index_offset < HEADER.size or index_offset + count * RECORD.size != len(self._map) - FOOTER.size:
+            self.close()
+            raise ValueError(f"Truncated cache pack: {self.path}")
+        self._index_offset = index_offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, i: int) -> tuple[bytes, int, int]:
+        return RECORD.unpack_from(self._map, self._index_offset + i * RECORD.size)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the encoded entry body for a hex key, or None if it is not in the pack"""
+        try:
+            target = bytes.fromhex(key)
+        except ValueError:
+            return None
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record_key = self._map[self._index_offset + mid * RECORD.size:self._index_offset + mid * RECORD.size + 32]
+            if record_key < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            record_key, offset, length = self._record(lo)
+            if record_key == target:
+                return self._map[offset:offset + length]
+        return None
+
+    def keys(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self._record(i)[0].hex()
+
+    def items(self) -> Iterator[tuple[str, bytes]]:
+        for i in range(self._count):
+            record_key, offset, length = self._record(i)
+            yield record_key.hex(), self._map[offset:offset + length]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def write_pack(path: Path, entries: Iterable[tuple[str, bytes]]) -> int:
+    """
+    Atomically write a pack from (hex key, encoded body) pairs and return its size in bytes.
+    Later duplicates of a key win.
+    """
+    bodies: dict[bytes, bytes] = {}
+    for key, body in entries:
+        bodies[bytes.fromhex(key)] = body
+
+    records = []
+    with atomic_writer(path) as f:
+        f.write(HEADER.pack(MAGIC, VERSION))
+        offset = HEADER.size
+        for key in sorted(bodies):
+            body = bodies[key]
+            f.write(body)
+            records.append(RECORD.pack(key, offset, len(body)))
+            offset += len(body)
+        index_offset = offset
+        for record in records:
+            f.write(record)
+        f.write(FOOTER.pack(index_offset, len(records), MAGIC))
+        size = f.tell()
+    return size
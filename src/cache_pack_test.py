@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import hashlib
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from cache_pack import PackReader, write_pack
+from cache_store import PACK_RECHECK, CacheStore
+
+
+def _key(n: int) -> str:
+    return hashlib.sha256(str(n).encode()).hexdigest()
+
+
+def test_write_and_read_pack():
+    """Test binary-search lookups over a written pack"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "cache.pack"
+        entries = [(_key(i), f"body {i}".encode()) for i in range(200)]
+        write_pack(path, entries)
+
+        reader = PackReader(path)
+        try:
+            assert len(reader) == 200
+            for key, body in entries:
+                assert reader.get(key) == body
+            assert reader.get(_key(999)) is None
+            assert reader.get("not-hex") is None
+            assert list(reader.keys()) == sorted(key for key, _ in entries)
+        finally:
+            reader.close()
+
+
+def test_empty_pack():
+    """Test that a pack with no entries is valid"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "cache.pack"
+        write_pack(path, [])
+
+        reader = PackReader(path)
+        assert len(reader) == 0
+        assert reader.get(_key(1)) is None
+        reader.close()
+
+
+def test_rejects_foreign_file():
+    """Test that a file which is not a pack is refused"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "cache.pack"
+        path.write_bytes(b"x" * 64)
+        with pytest.raises(ValueError):
+            PackReader(path)
+
+
+def test_truncated_pack_is_quarantined():
+    """Test that a pack cut short is refused, and a store opening it sets it aside and starts"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        for i in range(5):
+            store.put(_key(i), "chat", f"answer {i}", [])
+        store.pack()
+        data = store.pack_path.read_bytes()
+
+        for length in (3, len(data) // 2, len(data) - 1):
+            store.pack_path.write_bytes(data[:length])
+            with pytest.raises(ValueError):
+                PackReader(store.pack_path)
+
+            cold = CacheStore(Path(tmpdir))
+            assert not cold.pack_path.exists()
+            assert cold.get(_key(1)) is None
+            cold.put(_key(1), "chat", "again", [])
+            assert cold.get(_key(1))["output"] == "again"
+            cold.remove(_key(1))
+
+
+def test_store_pack_folds_loose_entries():
+    """Test that packing moves loose entries into the pack and lookups still hit"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        for i in range(5):
+            store.put(_key(i), "chat", f"answer {i}", [])
+
+        result = store.pack()
+        assert result.entries == 5
+        assert result.folded_in == 5
+        assert list(store.loose_keys()) == []
+
+        # A fresh store (cold start) reads everything from the pack
+        cold = CacheStore(Path(tmpdir))
+        assert cold.get(_key(3))["output"] == "answer 3"
+        assert set(cold.keys()) == {_key(i) for i in range(5)}
+
+
+def test_new_entries_stay_loose_until_next_pack():
+    """Test that entries written after a pack are found and folded in next time"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put(_key(1), "chat", "one", [])
+        store.pack()
+
+        store.put(_key(2), "chat", "two", [])
+        assert store.get(_key(2))["output"] == "two"
+        assert list(store.loose_keys()) == [_key(2)]
+
+        result = store.pack()
+        assert result.entries == 2
+        assert result.folded_in == 1
+        assert store.get(_key(1))["output"] == "one"
+
+
+def test_remove_packed_entry():
+    """Test that removing a packed entry hides it immediately and drops it on the next pack"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put(_key(1), "chat", "one", [])
+        store.put(_key(2), "chat", "two", [])
+        store.pack()
+
+        assert store.remove(_key(1))
+        assert store.get(_key(1)) is None
+        assert CacheStore(Path(tmpdir)).get(_key(1)) is None
+
+        result = store.pack()
+        assert result.entries == 1
+        assert result.dropped == 1
+        assert store.get(_key(2))["output"] == "two"
+
+
+def test_store_sees_a_pack_written_by_another_process():
+    """Test that a long-lived store finds entries another store packed (and removed) after it opened"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put(_key(1), "chat", "one", [])
+        store.pack()
+        assert store.get(_key(1))["output"] == "one"
+
+        other = CacheStore(Path(tmpdir))
+        other.put(_key(2), "chat", "two", [])
+        other.pack()
+        assert store.get(_key(2))["output"] == "two"
+
+        other.remove(_key(1))
+        store._pack_checked -= PACK_RECHECK
+        assert store.get(_key(1)) is None
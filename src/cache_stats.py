@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import time
+from datetime import datetime
+from typing import Any, Optional
+from pydantic import BaseModel
+from cache_store import CacheStore
+
+
+class EntryInfo(BaseModel):
+    key: str
+    entry_type: str
+    bytes: int
+    hits: int
+    last_used: Optional[float] = None
+
+
+class TypeStats(BaseModel):
+    entries: int = 0
+    bytes: int = 0
+    hits: int = 0
+
+
+class CacheStats(BaseModel):
+    entry_count: int
+    total_bytes: int
+    blob_bytes: int
+    window_hours: float
+    lookups_in_window: int
+    hits_in_window: int
+    hit_ratio: Optional[float]
+    by_type: dict[str, TypeStats]
+    largest: list[EntryInfo]
+    oldest_untouched: list[EntryInfo]
+    never_reused: int
+
+
+def entry_type(entry: dict[str, Any]) -> str:
+    """Label an entry by call type and, for structured calls, the pydantic model it returns"""
+    kind = entry.get("kind")
+    model_class = entry.get("model_class")
+    if kind is None:
+        # Legacy entries only record the model class inside their stored inputs
+        model_class = (entry.get("inputs") or {}).get("model_class")
+        kind = "chat_structured" if model_class else "chat"
+    return f"{kind}:{model_class}" if model_class else kind
+
+
+def _created_timestamp(entry: dict[str, Any]) -> Optional[float]:
+    created_at = entry.get("created_at")
+    if not created_at:
+        return None
+    try:
+        return datetime.fromisoformat(created_at).timestamp()
+    except ValueError:
+        return None
+
+
+def collect_cache_stats(store: CacheStore, window_hours: float = 24.0, top: int = 10) -> CacheStats:
+    """Summarise what a cache holds and how it has been used, from its entries and access log"""
+    window_start = time.time() - window_hours * 3600
+    lookups = hits_in_window = 0
+    # Lookups older than the access log keeps were folded into per-key counts when the cache was packed
+    summary = store.access_summary()
+    hit_counts = {key: hits for key, (hits, _) in summary.items()}
+    last_used = {key: t for key, (_, t) in summary.items()}
+    for access in store.read_access_log():
+        key = access.get("key")
+        t = access.get("t", 0)
+        if access.get("hit"):
+            hit_counts[key] = hit_counts.get(key, 0) + 1
+        last_used[key] = max(last_used.get(key, 0), t)
+        if t >= window_start:
+            lookups += 1
+            hits_in_window += 1 if access.get("hit") else 0
+
+    infos = []
+    by_type: dict[str, TypeStats] = {}
+    for key, size, entry in store.entries():
+        label = entry_type(entry)
+        hits = hit_counts.get(key, 0)
+        info = EntryInfo(key=key, entry_type=label, bytes=size, hits=hits,
+                         last_used=last_used.get(key) or _created_timestamp(entry))
+        infos.append(info)
+        stats = by_type.setdefault(label, TypeStats())
+        stats.entries += 1
+        stats.bytes += size
+        stats.hits += hits
+
+    blob_bytes = sum(p.stat().st_size for p in store.blob_dir.glob("*/*.z")) if store.blob_dir.exists() else 0
+    if store.blob_pack_path.exists():
+        blob_bytes += store.blob_pack_path.stat().st_size
+
+    return CacheStats(
+        entry_count=len(infos),
+        total_bytes=sum(info.bytes for info in infos),
+        blob_bytes=blob_bytes,
+        window_hours=window_hours,
+        lookups_in_window=lookups,
+        hits_in_window=hits_in_window,
+        hit_ratio=hits_in_window / lookups if lookups else None,
+        by_type=dict(sorted(by_type.items(), key=lambda item: item[1].bytes, reverse=True)),
+        largest=sorted(infos, key=lambda info: info.bytes, reverse=True)[:top],
+        oldest_untouched=sorted(infos, key=lambda info: info.last_used or 0)[:top],
+        never_reused=sum(1 for info in infos if info.hits == 0),
+    )
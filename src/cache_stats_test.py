@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from cache_stats import collect_cache_stats, entry_type
+from cache_store import CacheStore
+
+
+def _key(n: int) -> str:
+    return hashlib.sha256(str(n).encode()).hexdigest()
+
+
+def test_entry_type_labels():
+    """Test labelling of new and legacy entries"""
+    assert entry_type({"kind": "chat"}) == "chat"
+    assert entry_type({"kind": "chat_structured", "model_class": "ChapterPlan"}) == "chat_structured:ChapterPlan"
+    assert entry_type({"inputs": {"messages": [], "model_class": "Title"}, "output": {}}) == "chat_structured:Title"
+    assert entry_type({"inputs": {"messages": []}, "output": "x"}) == "chat"
+
+
+def test_collect_cache_stats():
+    """Test counts, hit ratio and type breakdown"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put(_key(1), "chat", "x" * 5000, [])
+        store.put(_key(2), "chat_structured", {"title": "T"}, [], model_class="Title")
+        store.put(_key(3), "chat", "short", [])
+
+        store.record_access(_key(1), False, "chat")
+        store.record_access(_key(1), True, "chat")
+        store.record_access(_key(1), True, "chat")
+        store.record_access(_key(2), False, "chat_structured", "Title")
+
+        stats = collect_cache_stats(store)
+
+        assert stats.entry_count == 3
+        assert stats.lookups_in_window == 4
+        assert stats.hits_in_window == 2
+        assert stats.hit_ratio == 0.5
+        assert stats.by_type["chat"].entries == 2
+        assert stats.by_type["chat"].hits == 2
+        assert stats.by_type["chat_structured:Title"].entries == 1
+        assert stats.largest[0].key == _key(1)
+        assert stats.never_reused == 2
+
+
+def test_window_excludes_old_lookups():
+    """Test that the hit ratio only covers the requested window"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put(_key(1), "chat", "x", [])
+        old = time.time() - 3 * 3600
+        with open(store.access_log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"t": old, "key": _key(1), "hit": True, "kind": "chat"}) + "\n")
+            f.write("{torn line\n")
+        store.record_access(_key(1), False, "chat")
+
+        stats = collect_cache_stats(store, window_hours=1)
+        assert stats.lookups_in_window == 1
+        assert stats.hit_ratio == 0.0
+        # Lifetime hit counts still include the older lookup
+        assert stats.largest[0].hits == 1
+
+
+def test_oldest_untouched_order():
+    """Test that entries unused for longest come first, including packed ones"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        for i in range(3):
+            store.put(_key(i), "chat", str(i), [])
+        store.pack()
+        with open(store.access_log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"t": 100.0, "key": _key(2), "hit": True, "kind": "chat"}) + "\n")
+
+        stats = collect_cache_stats(store)
+        assert stats.entry_count == 3
+        assert stats.oldest_untouched[0].key == _key(2)
+
+
+def test_pack_folds_old_lookups_into_counts():
+    """Test that packing moves old lookups out of the access log without losing their counts"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put(_key(1), "chat", "x", [])
+        old = time.time() - 30 * 24 * 3600
+        with open(store.access_log_path, 'a', encoding='utf-8') as f:
+            for _ in range(3):
+                f.write(json.dumps({"t": old, "key": _key(1), "hit": True, "kind": "chat"}) + "\n")
+            f.write(json.dumps({"t": old, "key": _key(9), "hit": True, "kind": "chat"}) + "\n")
+        store.record_access(_key(1), True, "chat")
+
+        store.pack()
+        store.record_access(_key(1), True, "chat")
+
+        assert len(list(store.read_access_log())) == 2
+        assert store.access_summary() == {_key(1): (3, old)}
+        stats = collect_cache_stats(store)
+        assert stats.largest[0].hits == 5
+        assert stats.lookups_in_window == 2
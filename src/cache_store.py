@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from cache_pack import PACK_NAME, PackReader, PackResult, write_pack
+from safe_io import atomic_write_bytes, atomic_write_json, atomic_write_text, file_lock, quarantine, read_json
+
+ENTRY_SUFFIX = ".jz"
+LEGACY_SUFFIX = ".json"
+FORMAT_VERSION = 3
+# Version 2 entries split prompts into blobs at paragraph breaks rather than content-defined line ends
+PARAGRAPH_CHUNKS_VERSION = 2
+
+# How input prompts are kept alongside each response
+INPUTS_REF = "ref"        # chunks stored once as content-addressed blobs
+INPUTS_INLINE = "inline"  # full prompts embedded in the entry
+INPUTS_NONE = "none"      # prompts dropped - the hash key is all that is needed for lookups
+
+ACCESS_LOG_NAME = "access.log"
+ACCESS_SUMMARY_NAME = "access.summary"  # not .json, which marks legacy entries
+# Lookups older than this are folded into per-key counters when the cache is packed
+ACCESS_LOG_KEEP_HOURS = 7 * 24
+# How often a writer checks whether a pack has replaced the access log under it
+ACCESS_LOG_RECHECK = 1.0
+
+# How often a lookup checks whether another process has repacked the cache or removed entries
+PACK_RECHECK = 1.0
+
+BLOB_PACK_NAME = "blobs.pack"
+# Entry field holding a long text output as chunks, in place of "output"
+OUTPUT_CHUNKS = "output_chunks"
+# Prompts are split into chunks at sentence and line ends chosen by their content alone, so text
+# that reappears in a later prompt - as it was, quoted, or with more appended - splits the same way
+# and is stored once. A chunk ends after each sentence whose hash has its low bits clear (about one
+# in CHUNK_MASK + 1), or at MAX_CHUNK characters. Text and chunks shorter than MIN_CHUNK stay inline.
+MIN_CHUNK = 256
+MAX_CHUNK = 8192
+CHUNK_MASK = 15
+_SENTENCE = re.compile(r'.*?(?:[.!?]\s+|\n)|.+', re.DOTALL)
+# pack() leaves unreferenced loose blobs younger than this, as an entry being written may need them
+BLOB_GRACE_SECONDS = 3600
+
+
+def encode_entry(entry: dict[str, Any]) -> bytes:
+    """Serialise a cache entry as compact, compressed JSON"""
+    return zlib.compress(json.dumps(entry, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def decode_entry(data: bytes) -> dict[str, Any]:
+    """Inverse of encode_entry"""
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def content_chunks(text: str) -> Iterator[str]:
+    """Split text into chunks whose boundaries depend only on the sentences they end with (see CHUNK_MASK)"""
+    start = end = 0
+    for sentence in _SENTENCE.finditer(text):
+        end = sentence.end()
+        while end - start > MAX_CHUNK:
+            yield text[start:start + MAX_CHUNK]
+            start += MAX_CHUNK
+        stripped = sentence.group().strip()
+        if stripped and zlib.crc32(stripped.encode('utf-8')) & CHUNK_MASK == 0:
+            yield text[start:end]
+            start = end
+    if start < len(text):
+        yield text[start:]
+
+
+def blob_refs(entry: dict[str, Any]) -> Iterator[str]:
+    """Digests of the blobs an entry's stored prompts and output refer to"""
+    stored = entry.get("inputs")
+    chunk_lists = [message.get("content", []) for message in stored] if isinstance(stored, list) else []
+    chunk_lists.append(entry.get(OUTPUT_CHUNKS, []))
+    for chunks in chunk_lists:
+        for chunk in chunks:
+            if isinstance(chunk, dict):
+                yield chunk["blob"]
+
+
+def _is_hash_key(key: str) -> bool:
+    """Pack indexes hold raw sha256 digests, so only well-formed hex keys can be packed"""
+    try:
+        return len(bytes.fromhex(key)) == 32
+    except ValueError:
+        return False
+
+
+class CacheStore:
+    """
+    On-disk store for Brain responses.
+
+    Each entry is a zlib-compressed JSON body named by its hash key. Prompts and long text
+    responses are split into content-defined chunks and stored as content-addressed blobs, so
+    text that reappears in later prompts (sections, growing fact lists) is only kept once.
+    Legacy pretty-printed .json entries are still read.
+
+    New entries and blobs are written loose, one file each. pack() folds them into a pack file
+    for entries and one for blobs, dropping blobs no entry refers to any more. The entries'
+    memory-mapped index is searched first, so warm caches need no per-entry file opens.
+    It also folds lookups older than ACCESS_LOG_KEEP_HOURS from the access log into per-key
+    hit counts and last-used times, so the log only grows between packs. A store notices a
+    pack written by another process on its next miss (or within PACK_RECHECK) and reopens it.
+    """
+
+    def __init__(self, cache_dir: Path, store_inputs: str = INPUTS_REF):
+        if store_inputs not in (INPUTS_REF, INPUTS_INLINE, INPUTS_NONE):
+            raise ValueError(f"Unknown store_inputs mode: {store_inputs}")
+        self.cache_dir = Path(cache_dir)
+        self.blob_dir = self.cache_dir / "blobs"
+        self.store_inputs = store_inputs
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.pack_path = self.cache_dir / PACK_NAME
+        self.deleted_path = self.cache_dir / f"{PACK_NAME}.deleted"
+        self.blob_pack_path = self.cache_dir / BLOB_PACK_NAME
+        self._pack: Optional[PackReader] = None
+        self._blob_pack: Optional[PackReader] = None
+        self._deleted: set[str] = set()
+        self._open_pack()
+        self.access_log_path = self.cache_dir / ACCESS_LOG_NAME
+        self.access_summary_path = self.cache_dir / ACCESS_SUMMARY_NAME
+        self._access_fd: Optional[int] = None
+        self._access_checked = 0.0
+        self._access_guard = threading.Lock()
+
+    def _open_pack(self, close: bool = True):
+        """
+        (Re)open the pack files and the list of keys removed from the entries' pack since it was written.
+        Without close, the old packs are left for lookups still using them, and close once they are done.
+        """
+        self._pack_seen = self._pack_signature()
+        self._pack_checked = time.monotonic()
+        if close:
+            for old in (self._pack, self._blob_pack):
+                if old:
+                    old.close()
+        self._pack = self._read_pack(self.pack_path)
+        self._blob_pack = self._read_pack(self.blob_pack_path)
+        try:
+            self._deleted = set(self.deleted_path.read_text(encoding='utf-8').split())
+        except FileNotFoundError:
+            self._deleted = set()
+
+    @staticmethod
+    def _read_pack(path: Path) -> Optional[PackReader]:
+        if not path.exists():
+            return None
+        try:
+            return PackReader(path)
+        except ValueError:
+            quarantine(path)
+            return None
+
+    def _pack_signature(self) -> tuple:
+        """Identity of the pack files and the list of removed keys as they are on disk"""
+        signature = []
+        for path in (self.pack_path, self.deleted_path, self.blob_pack_path):
+            try:
+                stat = path.stat()
+                signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh_pack(self) -> bool:
+        """Reopen the pack if another process has rewritten it (or removed entries) since; return whether it did"""
+        self._pack_checked = time.monotonic()
+        if self._pack_signature() == self._pack_seen:
+            return False
+        self._open_pack(close=False)
+        return True
+
+    def _get_packed(self, key: str) -> Optional[bytes]:
+        if self._pack is None or key in self._deleted:
+            return None
+        return self._pack.get(key)
+
+    def entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{ENTRY_SUFFIX}"
+
+    def _legacy_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{LEGACY_SUFFIX}"
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """Load an entry, or None on a miss. Corrupt entries are quarantined and count as misses."""
+        if time.monotonic() - self._pack_checked >= PACK_RECHECK:
+            self._refresh_pack()
+        entry = self._get(key)
+        if entry is None and self._refresh_pack():
+            # Another process has packed the cache since, perhaps folding this entry in and deleting its file
+            entry = self._get(key)
+        return entry
+
+    def _get(self, key: str) -> Optional[dict[str, Any]]:
+        packed = self._get_packed(key)
+        if packed is not None:
+            try:
+                return self._with_output(decode_entry(packed))
+            except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+                return None
+
+        path = self.entry_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            legacy = read_json(self._legacy_path(key))
+            if isinstance(legacy, dict) and "output" in legacy:
+                return legacy
+            return None
+
+        try:
+            entry = decode_entry(data)
+        except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+            quarantine(path)
+            return None
+        if not isinstance(entry, dict) or ("output" not in entry and OUTPUT_CHUNKS not in entry):
+            quarantine(path)
+            return None
+        return self._with_output(entry)
+
+    def _with_output(self, entry: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """The entry with an output stored as chunks joined back up, or None if a chunk is lost"""
+        if OUTPUT_CHUNKS not in entry:
+            return entry
+        try:
+            entry["output"] = self._join_chunks(entry.pop(OUTPUT_CHUNKS))
+        except (FileNotFoundError, zlib.error, UnicodeDecodeError):
+            return None
+        return entry
+
+    def put(self, key: str, kind: str, output: Any, messages: list[dict[str, str]],
+            model_class: Optional[str] = None, kwargs: Optional[dict] = None):
+        """
+        Store a response together with (a reference to) the prompts that produced it.
+        With prompts stored by reference, long text responses are chunked into blobs too,
+        so a section written here and quoted in later prompts is kept once.
+        """
+        entry = {
+            "v": FORMAT_VERSION,
+            "kind": kind,
+            "model_class": model_class,
+            "created_at": datetime.now().isoformat(),
+            "kwargs": kwargs or {},
+            "inputs": self._encode_inputs(messages),
+        }
+        if self.store_inputs == INPUTS_REF and isinstance(output, str) and len(output) >= MIN_CHUNK:
+            entry[OUTPUT_CHUNKS] = self._split_chunks(output)
+        else:
+            entry["output"] = output
+        # Concurrent writers of one key each produce a valid entry for it,
+        # so the atomic rename alone is enough - no lock needed
+        atomic_write_bytes(self.entry_path(key), encode_entry(entry))
+
+    def remove(self, key: str) -> bool:
+        """Delete an entry, returning whether anything was removed. Its blobs go at the next pack."""
+        removed = False
+        for path in (self.entry_path(key), self._legacy_path(key)):
+            try:
+                path.unlink()
+                removed = True
+            except FileNotFoundError:
+                pass
+        if self._get_packed(key) is not None:
+            # Packs are immutable - record the removal and drop the entry on the next pack
+            with file_lock(self.deleted_path):
+                with open(self.deleted_path, 'a', encoding='utf-8') as f:
+                    f.write(key + "\n")
+            self._deleted.add(key)
+            removed = True
+        return removed
+
+    def record_access(self, key: str, hit: bool, kind: str, model_class: Optional[str] = None):
+        """
+        Append one lookup to the access log used by cache-stats.
+        Each line is written with a single O_APPEND write, so concurrent processes never interleave.
+        """
+        line = json.dumps({"t": round(time.time(), 3), "key": key, "hit": hit,
+                           "kind": kind, "model_class": model_class}, separators=(',', ':')) + "\n"
+        with self._access_guard:
+            now = time.monotonic()
+            if self._access_fd is not None and now - self._access_checked >= ACCESS_LOG_RECHECK:
+                self._access_checked = now
+                if not self._access_log_current():
+                    self._close_access_log()
+            if self._access_fd is None:
+                self._access_fd = os.open(self.access_log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._access_checked = now
+            os.write(self._access_fd, line.encode('utf-8'))
+
+    def _access_log_current(self) -> bool:
+        """Whether the open access log is still the file at access_log_path (a pack replaces it)"""
+        try:
+            return os.fstat(self._access_fd).st_ino == os.stat(self.access_log_path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _close_access_log(self):
+        if self._access_fd is not None:
+            os.close(self._access_fd)
+            self._access_fd = None
+
+    def read_access_log(self) -> Iterator[dict[str, Any]]:
+        """Lookups recorded by record_access, oldest first. Torn or foreign lines are skipped."""
+        try:
+            f = open(self.access_log_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def access_summary(self) -> dict[str, tuple[int, float]]:
+        """Hits and last-used time per key for lookups folded out of the access log by pack()"""
+        summary = read_json(self.access_summary_path)
+        if not isinstance(summary, dict):
+            return {}
+        return {key: (hits, last_used) for key, (hits, last_used) in summary.items()}
+
+    def _fold_access_log(self, keys: set[str]):
+        """Fold old lookups of the given (still stored) keys into the summary; keep the rest of the log"""
+        cutoff = time.time() - ACCESS_LOG_KEEP_HOURS * 3600
+        summary = {key: counts for key, counts in self.access_summary().items() if key in keys}
+        kept = []
+        for access in self.read_access_log():
+            key = access.get("key")
+            t = access.get("t", 0)
+            if t >= cutoff:
+                kept.append(json.dumps(access, separators=(',', ':')) + "\n")
+            elif key in keys:
+                hits, last_used = summary.get(key, (0, 0.0))
+                summary[key] = (hits + (1 if access.get("hit") else 0), max(last_used, t))
+        atomic_write_json(self.access_summary_path, summary, separators=(',', ':'))
+        # Writers in other processes notice the replaced log within ACCESS_LOG_RECHECK and reopen it
+        atomic_write_text(self.access_log_path, "".join(kept))
+        with self._access_guard:
+            self._close_access_log()
+
+    def entries(self) -> Iterator[tuple[str, int, dict[str, Any]]]:
+        """(key, stored bytes, entry) for every entry, packed and loose, as stored (see get())"""
+        seen = set()
+        if self._pack:
+            for key, body in self._pack.items():
+                if key in self._deleted:
+                    continue
+                seen.add(key)
+                try:
+                    yield key, len(body), decode_entry(body)
+                except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+                    continue
+        for key in list(self.loose_keys()):
+            if key in seen:
+                continue
+            path = self.entry_path(key) if self.entry_path(key).exists() else self._legacy_path(key)
+            entry = self._read_loose(key)
+            if entry is not None:
+                yield key, path.stat().st_size, entry
+
+    def loose_keys(self) -> Iterator[str]:
+        """Keys of entries written since the last pack"""
+        for path in self.cache_dir.iterdir():
+            if path.suffix in (ENTRY_SUFFIX, LEGACY_SUFFIX) and not path.name.startswith('.'):
+                yield path.stem
+
+    def keys(self) -> Iterator[str]:
+        """Keys of all entries, packed and loose"""
+        seen = set()
+        if self._pack:
+            for key in self._pack.keys():
+                if key not in self._deleted:
+                    seen.add(key)
+                    yield key
+        for key in self.loose_keys():
+            if key not in seen:
+                yield key
+
+    def pack(self) -> PackResult:
+        """
+        Fold loose entries and the existing pack into a fresh pack, and the blobs they refer to
+        into a fresh blob pack, then delete the loose files and the blobs nothing refers to
+        """
+        with file_lock(self.cache_dir):
+            self._open_pack()
+            entries: list[tuple[str, bytes]] = []
+            referenced: set[str] = set()
+            if self._pack:
+                for key, body in self._pack.items():
+                    if key in self._deleted:
+                        continue
+                    entries.append((key, body))
+                    try:
+                        referenced.update(blob_refs(decode_entry(body)))
+                    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+                        continue
+
+            folded = []
+            for key in list(self.loose_keys()):
+                if not _is_hash_key(key):
+                    continue
+                entry = self._read_loose(key)
+                if entry is None:
+                    continue
+                entries.append((key, encode_entry(entry)))
+                referenced.update(blob_refs(entry))
+                folded.append(key)
+
+            size = write_pack(self.pack_path, entries)
+            blobs, blobs_dropped, blob_bytes, blob_files = self._pack_blobs(referenced)
+            dropped = len(self._deleted)
+            for key in folded:
+                for path in (self.entry_path(key), self._legacy_path(key)):
+                    path.unlink(missing_ok=True)
+            self.deleted_path.unlink(missing_ok=True)
+            self._open_pack()
+            for path in blob_files:
+                path.unlink(missing_ok=True)
+                try:
+                    path.parent.rmdir()
+                except OSError:
+                    pass
+            self._fold_access_log({key for key, _ in entries})
+
+        return PackResult(pack_path=str(self.pack_path), entries=len(self._pack) if self._pack else 0,
+                          folded_in=len(folded), dropped=dropped, bytes=size,
+                          blobs=blobs, blobs_dropped=blobs_dropped, blob_bytes=blob_bytes)
+
+    def _pack_blobs(self, referenced: set[str]) -> tuple[int, int, int, list[Path]]:
+        """
+        Write a blob pack of the referenced blobs, packed or loose. Returns how many it holds,
+        how many it dropped, its size and the loose blob files to delete once it is in place.
+        """
+        blobs: dict[str, bytes] = {}
+        dropped: set[str] = set()
+        if self._blob_pack:
+            for digest, data in self._blob_pack.items():
+                if digest in referenced:
+                    blobs[digest] = data
+                else:
+                    dropped.add(digest)
+        young = time.time() - BLOB_GRACE_SECONDS
+        loose = []
+        for path in self.blob_dir.glob("*/*.z") if self.blob_dir.exists() else []:
+            digest = path.stem
+            try:
+                if digest in referenced and _is_hash_key(digest):
+                    blobs.setdefault(digest, path.read_bytes())
+                elif path.stat().st_mtime > young:
+                    continue
+                else:
+                    dropped.add(digest)
+            except FileNotFoundError:
+                continue
+            loose.append(path)
+        size = write_pack(self.blob_pack_path, blobs.items())
+        return len(blobs), len(dropped), size, loose
+
+    def _read_loose(self, key: str) -> Optional[dict[str, Any]]:
+        path = self.entry_path(key)
+        if not path.exists():
+            legacy = read_json(self._legacy_path(key))
+            return legacy if isinstance(legacy, dict) and "output" in legacy else None
+        try:
+            return decode_entry(path.read_bytes())
+        except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+            quarantine(path)
+            return None
+
+    def inputs(self, entry: dict[str, Any]) -> Optional[list[dict[str, str]]]:
+        """Rebuild the prompt messages of an entry, or None if they were not stored"""
+        stored = entry.get("inputs")
+        if stored is None:
+            return None
+        version = entry.get("v")
+        if version not in (FORMAT_VERSION, PARAGRAPH_CHUNKS_VERSION):
+            return stored.get("messages")
+        separator = "\n\n" if version == PARAGRAPH_CHUNKS_VERSION else ""
+        try:
+            return [{"role": message["role"], "content": self._join_chunks(message["content"], separator)}
+                    for message in stored]
+        except FileNotFoundError:
+            # A blob lost to a pack racing the write of this entry - the prompt is gone, the response is fine
+            return None
+
+    def clear(self):
+        """Remove every entry, pack and blob"""
+        for key in list(self.loose_keys()):
+            self.remove(key)
+        for pack in (self._pack, self._blob_pack):
+            if pack:
+                pack.close()
+        self._pack = self._blob_pack = None
+        self.pack_path.unlink(missing_ok=True)
+        self.blob_pack_path.unlink(missing_ok=True)
+        self.deleted_path.unlink(missing_ok=True)
+        self._deleted = set()
+        with self._access_guard:
+            self._close_access_log()
+        self.access_log_path.unlink(missing_ok=True)
+        self.access_summary_path.unlink(missing_ok=True)
+        if self.blob_dir.exists():
+            for blob in self.blob_dir.glob("*/*.z"):
+                blob.unlink()
+
+    def _encode_inputs(self, messages: list[dict[str, str]]) -> Optional[list[dict[str, Any]]]:
+        if self.store_inputs == INPUTS_NONE:
+            return None
+        if self.store_inputs == INPUTS_INLINE:
+            return [{"role": m["role"], "content": [m["content"]]} for m in messages]
+        return [{"role": m["role"], "content": self._split_chunks(m["content"])} for m in messages]
+
+    def _split_chunks(self, content: str) -> list[Any]:
+        if len(content) < MIN_CHUNK:
+            return [content]
+        return [chunk if len(chunk) < MIN_CHUNK else {"blob": self._put_blob(chunk)}
+                for chunk in content_chunks(content)]
+
+    def _join_chunks(self, chunks: list[Any], separator: str = "") -> str:
+        return separator.join(chunk if isinstance(chunk, str) else self._get_blob(chunk["blob"]) for chunk in chunks)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}.z"
+
+    def _put_blob(self, text: str) -> str:
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists() and (self._blob_pack is None or self._blob_pack.get(digest) is None):
+            atomic_write_bytes(path, zlib.compress(data))
+        return digest
+
+    def _get_blob(self, digest: str) -> str:
+        packed = self._blob_pack.get(digest) if self._blob_pack else None
+        if packed is None:
+            try:
+                packed = self._blob_path(digest).read_bytes()
+            except FileNotFoundError:
+                # Perhaps folded into a blob pack another process has written since
+                if not self._refresh_pack() or self._blob_pack is None or self._blob_pack.get(digest) is None:
+                    raise
+                packed = self._blob_pack.get(digest)
+        return zlib.decompress(packed).decode('utf-8')
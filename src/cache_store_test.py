@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import random
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import cache_store
+from cache_store import CacheStore, INPUTS_INLINE, INPUTS_NONE, INPUTS_REF, OUTPUT_CHUNKS, blob_refs, content_chunks
+
+
+_WORDS = "rain harbour lantern whisper captain storm letter silver door shadow bell tide".split()
+_rng = random.Random(7)
+SECTION_TEXT = "\n\n".join(" ".join(_rng.choice(_WORDS) for _ in range(120)) for _ in range(20))
+
+
+def _section_messages(previous_text: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": "You extract concrete facts from text."},
+        {"role": "user", "content": f"Extract facts from this section:\n\n{previous_text}\n\nReturn as a simple list."},
+    ]
+
+
+def test_put_and_get_round_trip():
+    """Test that a stored response comes back with its metadata"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put("abc", "chat_structured", {"title": "X"}, _section_messages("short"), model_class="Title")
+
+        entry = store.get("abc")
+        assert entry["output"] == {"title": "X"}
+        assert entry["kind"] == "chat_structured"
+        assert entry["model_class"] == "Title"
+        assert store.get("missing") is None
+
+
+def test_inputs_are_rebuilt_from_blobs():
+    """Test that prompts stored by reference are reconstructed exactly"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir), INPUTS_REF)
+        messages = _section_messages(SECTION_TEXT)
+        store.put("abc", "chat", "facts", messages)
+
+        assert store.inputs(store.get("abc")) == messages
+        assert list((Path(tmpdir) / "blobs").glob("*/*.z"))
+
+
+def test_repeated_text_is_stored_once():
+    """Test that text embedded in many prompts costs far less than storing it inline"""
+    with tempfile.TemporaryDirectory() as ref_dir, tempfile.TemporaryDirectory() as inline_dir:
+        ref_store = CacheStore(Path(ref_dir), INPUTS_REF)
+        inline_store = CacheStore(Path(inline_dir), INPUTS_INLINE)
+        for i in range(10):
+            messages = _section_messages(SECTION_TEXT + f"\n\nVariation {i}")
+            ref_store.put(f"key{i}", "chat", "facts", messages)
+            inline_store.put(f"key{i}", "chat", "facts", messages)
+
+        def disk_usage(path):
+            return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+        legacy_size = 10 * len(json.dumps({"inputs": {"messages": _section_messages(SECTION_TEXT)}}, indent=2))
+        assert disk_usage(ref_dir) < disk_usage(inline_dir)
+        assert disk_usage(ref_dir) * 10 < legacy_size
+
+
+def test_chunks_survive_quoting_and_appending():
+    """Test that text quoted after a header, or grown by appending, splits into mostly the same chunks"""
+    chunks = list(content_chunks(SECTION_TEXT))
+    assert "".join(chunks) == SECTION_TEXT
+    assert all(len(chunk) <= cache_store.MAX_CHUNK for chunk in chunks)
+
+    quoted = list(content_chunks(f"Extract facts from this section:\n\n{SECTION_TEXT}\n\nReturn as a simple list."))
+    grown = list(content_chunks(SECTION_TEXT + "\n\nAnd then the tide turned. " * 40))
+    assert len(set(chunks) & set(quoted)) >= len(chunks) - 2
+    assert len(set(chunks) & set(grown)) >= len(chunks) - 1
+
+
+def test_growing_fact_list_is_stored_linearly():
+    """Test that a list appended to at every step costs about its final size, not the sum of its versions"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        facts = []
+        versions = 0
+        for step in range(50):
+            facts.extend(f"Fact {step}.{i}: the {_rng.choice(_WORDS)} by the {_rng.choice(_WORDS)} is {_rng.choice(_WORDS)}."
+                         for i in range(4))
+            store.put(f"key{step}", "chat", "more facts", _section_messages("\n".join(facts)))
+            versions += len("\n".join(facts))
+        assert store.inputs(store.get("key49")) == _section_messages("\n".join(facts))
+
+        blob_chars = sum(len(store._get_blob(path.stem)) for path in store.blob_dir.glob("*/*.z"))
+        # Each version adds its new facts and a fresh last chunk, rather than a whole new copy
+        assert blob_chars * 3 < versions
+
+
+def test_long_output_is_stored_once_with_the_prompts_quoting_it():
+    """Test that a long response and a later prompt quoting it share their chunks"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put("section", "chat", SECTION_TEXT, [{"role": "user", "content": "Write a section"}])
+        store.put("facts", "chat", "- a fact", _section_messages(SECTION_TEXT))
+
+        assert store.get("section")["output"] == SECTION_TEXT
+        stored = {key: entry for key, _, entry in store.entries()}
+        section_blobs = set(blob_refs(stored["section"]))
+        fact_blobs = set(blob_refs(stored["facts"]))
+        assert len(section_blobs & fact_blobs) >= len(section_blobs) - 2
+
+        store.pack()
+        assert CacheStore(Path(tmpdir)).get("section")["output"] == SECTION_TEXT
+
+
+def test_pack_folds_blobs_in_and_drops_unused_ones(monkeypatch):
+    """Test that packing moves blobs into the blob pack and deletes those no entry needs any more"""
+    monkeypatch.setattr(cache_store, "BLOB_GRACE_SECONDS", 0)
+    key = lambda n: f"{n:064x}"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        kept = _section_messages(SECTION_TEXT)
+        store.put(key(1), "chat", "kept", kept)
+        store.put(key(2), "chat", "removed", _section_messages(SECTION_TEXT[::-1]))
+        store.pack()
+        store.remove(key(2))
+        store.put(key(3), "chat", "removed loose", _section_messages(SECTION_TEXT.upper()))
+        store.remove(key(3))
+
+        result = store.pack()
+        assert result.blobs == len(set(blob_refs(next(entry for _, _, entry in store.entries()))))
+        assert result.blobs_dropped > 0
+        assert not list(store.blob_dir.glob("*/*.z"))
+
+        cold = CacheStore(Path(tmpdir))
+        assert cold.inputs(cold.get(key(1))) == kept
+
+
+def test_unused_blobs_written_just_now_are_kept(monkeypatch):
+    """Test that packing leaves a fresh unreferenced blob, which an entry being written may be about to use"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        digest = store._put_blob(SECTION_TEXT)
+        store.pack()
+        assert store._get_blob(digest) == SECTION_TEXT
+
+        monkeypatch.setattr(cache_store, "BLOB_GRACE_SECONDS", 0)
+        assert store.pack().blobs_dropped == 1
+        assert not store.blob_dir.exists() or not list(store.blob_dir.glob("*/*.z"))
+
+
+def test_cache_of_a_whole_book_is_compact(tmp_path):
+    """Test, on a book written end to end, that a packed cache is several times smaller than the old format"""
+    from backends import model_named
+    from brain import Brain
+    from noveliser import write_novel
+
+    output_dir = tmp_path / "output"
+    brain = Brain(model_named("fake:words=1500"), output_dir)
+    with redirect_stdout(io.StringIO()):
+        write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake:words=1500",
+                    num_chapters=3, sections_per_chapter=4, image_model="fake", brain=brain)
+    store = CacheStore(output_dir / "cache")
+    keys = list(store.keys())
+    # Before this format, each entry was its prompts and output as indented JSON
+    old_format = sum(len(json.dumps({"inputs": {"messages": store.inputs(entry)}, "output": entry["output"]},
+                                    indent=2).encode('utf-8'))
+                     for entry in map(store.get, keys))
+
+    store.pack()
+    files = [path for path in store.cache_dir.rglob("*") if path.is_file() and not path.name.startswith(".")]
+    assert {path.name for path in files} <= {"cache.pack", "blobs.pack", "access.log", "access.summary"}
+    assert sum(path.stat().st_size for path in files if path.name.endswith(".pack")) * 3 < old_format
+
+    # Long responses (the outline, each section) are kept once, though later prompts quote them
+    stored = {key: entry for key, _, entry in store.entries()}
+    for key, entry in stored.items():
+        if OUTPUT_CHUNKS in entry:
+            own = {chunk["blob"] for chunk in entry[OUTPUT_CHUNKS] if isinstance(chunk, dict)}
+            quoted = {digest for other, other_entry in stored.items() if other != key
+                      for digest in blob_refs(other_entry)}
+            assert len(own & quoted) >= len(own) - 2
+    assert all(store.get(key) is not None for key in keys)
+
+
+def test_inputs_can_be_dropped():
+    """Test that store_inputs='none' keeps only the response"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir), INPUTS_NONE)
+        store.put("abc", "chat", "hello", _section_messages(SECTION_TEXT))
+
+        entry = store.get("abc")
+        assert entry["output"] == "hello"
+        assert store.inputs(entry) is None
+        assert not (Path(tmpdir) / "blobs").exists()
+
+
+def test_legacy_json_entries_are_read():
+    """Test that caches written by older versions still hit"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        legacy = {"inputs": {"messages": [{"role": "user", "content": "hi"}], "kwargs": {}}, "output": "hello"}
+        (Path(tmpdir) / "old.json").write_text(json.dumps(legacy, indent=2), encoding='utf-8')
+
+        store = CacheStore(Path(tmpdir))
+        entry = store.get("old")
+        assert entry["output"] == "hello"
+        assert store.inputs(entry) == [{"role": "user", "content": "hi"}]
+        assert set(store.keys()) == {"old"}
+
+
+def test_corrupt_entry_is_quarantined():
+    """Test that a truncated entry is a miss, not a crash"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put("abc", "chat", "hello", [])
+        path = store.entry_path("abc")
+        path.write_bytes(path.read_bytes()[:5])
+
+        assert store.get("abc") is None
+        assert list(Path(tmpdir).glob("abc.jz.corrupt-*"))
+
+
+def test_remove_and_clear():
+    """Test removing single entries and clearing the store"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.put("a", "chat", "1", _section_messages(SECTION_TEXT))
+        store.put("b", "chat", "2", [])
+
+        assert store.remove("a")
+        assert not store.remove("a")
+        assert set(store.keys()) == {"b"}
+
+        store.clear()
+        assert list(store.keys()) == []
+        assert not list((Path(tmpdir) / "blobs").glob("*/*.z"))
+
+
+def test_access_log_survives_clear():
+    """Test that lookups recorded after a clear go to a fresh access log"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = CacheStore(Path(tmpdir))
+        store.record_access("a", False, "chat")
+        store.clear()
+        store.record_access("b", True, "chat")
+
+        assert [access["key"] for access in store.read_access_log()] == ["b"]
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+from tracing import span
+
+if TYPE_CHECKING:
+    from metadata import BookMetadata
+
+CATALOG_FILE = "catalog.sqlite"
+# Bumped when the books table changes; a catalog of another version is rebuilt
+CATALOG_VERSION = "2"
+# Directories under the output directory that never hold books
+_NOT_BOOKS = {"cache"}
+
+_COLUMNS = ("directory", "name", "title", "status", "created_at", "updated_at", "author", "description",
+            "current_step", "completed_steps", "stale_steps", "epub_path", "cover_path", "forked_from")
+
+
+class Catalog:
+    """
+    Index of every book under an output directory, kept in SQLite so listing books and finding
+    one by title are single indexed queries instead of a scan of every metadata.json. It maps
+    each book to its directory, relative to the output directory, wherever the layout put it.
+
+    write_metadata keeps a book's row current, and a session writing a book updates the row's
+    progress as each step starts and completes, between metadata.json flushes. A catalog opened for the first time (or written by an older version) is
+    built from the books already there; rebuild() does that again if the two ever disagree.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / CATALOG_FILE
+        self._local = threading.local()
+        self._guard = threading.Lock()
+        self._checked = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Rows are small, and every page an update touches is written again to the WAL
+            conn.execute("PRAGMA page_size=1024")
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The catalog can always be rebuilt, so it need not be fsynced on every commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS catalog (key TEXT PRIMARY KEY, value TEXT)")
+            self._local.conn = conn
+        with self._guard:
+            if not self._checked:
+                self._checked = True
+                version = conn.execute("SELECT value FROM catalog WHERE key = 'version'").fetchone()
+                if version is None or version[0] != CATALOG_VERSION:
+                    conn.execute("DROP TABLE IF EXISTS books")
+                    self._create_books(conn)
+                    self._rebuild(conn)
+        return conn
+
+    def _create_books(self, conn: sqlite3.Connection):
+        conn.execute("CREATE TABLE books (directory TEXT PRIMARY KEY, name TEXT NOT NULL, title TEXT NOT NULL, "
+                     "status TEXT NOT NULL, created_at TEXT, updated_at TEXT NOT NULL, author TEXT, "
+                     "description TEXT, current_step TEXT, completed_steps INTEGER, stale_steps TEXT, "
+                     "epub_path TEXT, cover_path TEXT, forked_from TEXT)")
+        conn.execute("CREATE INDEX books_by_status ON books (status, updated_at)")
+        conn.execute("CREATE INDEX books_by_title ON books (title)")
+        conn.execute("CREATE INDEX books_by_name ON books (name)")
+
+    def upsert(self, novel_dir: Path, metadata: "BookMetadata"):
+        """Record a book's current metadata"""
+        row = self._row(novel_dir, metadata)
+        with span("catalog update", "metadata"):
+            self._connection().execute(
+                f"INSERT OR REPLACE INTO books ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", row)
+
+    def update_progress(self, novel_dir: Path, metadata: "BookMetadata"):
+        """Record a book's current, completed and stale steps, leaving the rest of its row as it was"""
+        with span("catalog progress", "metadata"):
+            self._connection().execute(
+                "UPDATE books SET current_step = ?, completed_steps = ?, stale_steps = ? WHERE directory = ?",
+                (metadata.current_step, len(metadata.completed_steps), json.dumps(metadata.stale_steps),
+                 self._directory(novel_dir)))
+
+    def books(self, status: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> list[dict[str, Any]]:
+        """Books (with the given status), most recently updated first"""
+        where, args = ("WHERE status = ?", [status]) if status else ("", [])
+        rows = self._connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM books {where} ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+            args + [-1 if limit is None else limit, offset]).fetchall()
+        return [self._book(row) for row in rows]
+
+    def count(self, status: Optional[str] = None) -> int:
+        where, args = ("WHERE status = ?", [status]) if status else ("", [])
+        return self._connection().execute(f"SELECT COUNT(*) FROM books {where}", args).fetchone()[0]
+
+    def find(self, title: str) -> Optional[Path]:
+        """
+        Directory of the book with this directory name or title. Forks share their parent's
+        title, so the original book is preferred; a fork is found by its directory name.
+        """
+        row = self._connection().execute(
+            "SELECT directory FROM books WHERE name = ? UNION ALL "
+            "SELECT directory FROM (SELECT directory FROM books WHERE title = ? ORDER BY forked_from IS NOT NULL) "
+            "LIMIT 1", (title, title)).fetchone()
+        return self.output_dir / row[0] if row else None
+
+    def directory_of(self, title: str) -> Optional[Path]:
+        """Directory of the book (not a fork) with this title, if there is one"""
+        row = self._connection().execute(
+            "SELECT directory FROM books WHERE title = ? AND forked_from IS NULL ORDER BY updated_at DESC LIMIT 1",
+            (title,)).fetchone()
+        return self.output_dir / row[0] if row else None
+
+    def rebuild(self) -> int:
+        """Re-create the catalog from the books' metadata on disk, returning how many it found"""
+        conn = self._connection()
+        return self._rebuild(conn)
+
+    def _rebuild(self, conn: sqlite3.Connection) -> int:
+        from metadata import read_metadata
+
+        rows = []
+        with span("catalog rebuild", "metadata"):
+            for novel_dir in self._book_dirs():
+                metadata = read_metadata(novel_dir)
+                if metadata:
+                    rows.append(self._row(novel_dir, metadata))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM books")
+                conn.executemany(f"INSERT INTO books ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows)
+                conn.execute("INSERT OR REPLACE INTO catalog (key, value) VALUES ('built', datetime('now'))")
+                conn.execute("INSERT OR REPLACE INTO catalog (key, value) VALUES ('version', ?)", (CATALOG_VERSION,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def _book_dirs(self):
+        """Every directory with a metadata.json, as deep as a layout may nest them"""
+        from layout import MAX_SHARD_LEVELS
+        from metadata import METADATA_FILE
+
+        for directory, subdirs, files in os.walk(self.output_dir):
+            depth = len(Path(directory).relative_to(self.output_dir).parts)
+            if METADATA_FILE in files:
+                subdirs.clear()
+                yield Path(directory)
+            elif depth == 0:
+                subdirs[:] = [name for name in subdirs if name not in _NOT_BOOKS]
+            elif depth > MAX_SHARD_LEVELS:
+                subdirs.clear()
+
+    def _directory(self, novel_dir: Path) -> str:
+        return Path(os.path.relpath(novel_dir, self.output_dir)).as_posix()
+
+    def _row(self, novel_dir: Path, metadata: "BookMetadata") -> tuple:
+        return (self._directory(novel_dir), Path(novel_dir).name, metadata.title, metadata.status.value, metadata.created_at,
+                metadata.updated_at, metadata.author, metadata.description, metadata.current_step,
+                len(metadata.completed_steps), json.dumps(metadata.stale_steps), metadata.epub_path,
+                metadata.cover_path, metadata.forked_from)
+
+    def _book(self, row: tuple) -> dict[str, Any]:
+        book = dict(zip(_COLUMNS, row))
+        book["directory"] = str(self.output_dir / book["directory"])
+        book["stale_steps"] = json.loads(book["stale_steps"] or "[]")
+        return book
+
+
+_catalogs: dict[Path, Catalog] = {}
+_catalogs_guard = threading.Lock()
+
+
+def catalog_for(output_dir: Path) -> Catalog:
+    """The process-wide catalog of an output directory"""
+    key = Path(output_dir).resolve()
+    with _catalogs_guard:
+        if key not in _catalogs:
+            _catalogs[key] = Catalog(output_dir)
+        return _catalogs[key]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import shutil
+from datetime import datetime
+
+from catalog import CATALOG_FILE, Catalog
+from metadata import BookMetadata, BookStatus, METADATA_FILE, write_metadata
+from safe_io import atomic_write_json
+
+
+def _book(output_dir, name, title, status=BookStatus.ONGOING, updated="2026-01-01", catalogued=True, **fields):
+    metadata = BookMetadata(title=title, description="d", status=status, created_at=updated,
+                            updated_at=updated, author="a", model_name="fake", num_chapters=1,
+                            sections_per_chapter=1, **fields)
+    novel_dir = output_dir / name
+    novel_dir.mkdir()
+    if catalogued:
+        write_metadata(novel_dir, metadata)
+    else:
+        atomic_write_json(novel_dir / METADATA_FILE, metadata.model_dump(mode="json"))
+    return novel_dir
+
+
+def test_books_are_listed_a_page_at_a_time(tmp_path):
+    """Test that listings are filtered by status, newest first, and paginated"""
+    for n in range(5):
+        _book(tmp_path, f"book_{n}", f"Book {n}")
+    _book(tmp_path, "done", "Done", BookStatus.FINISHED)
+
+    catalog = Catalog(tmp_path)
+    titles = [book["title"] for book in catalog.books("ongoing")]
+    assert titles == ["Book 4", "Book 3", "Book 2", "Book 1", "Book 0"]
+    assert [book["title"] for book in catalog.books("ongoing", limit=2, offset=2)] == ["Book 2", "Book 1"]
+    assert catalog.count("ongoing") == 5
+    assert catalog.books("finished")[0]["directory"] == str(tmp_path / "done")
+
+
+def test_find_prefers_the_original_over_forks(tmp_path):
+    """Test that a title finds the original book, and a directory name finds a fork"""
+    fork = _book(tmp_path, "Tides_fake", "Tides", forked_from="Tides")
+    original = _book(tmp_path, "Tides", "Tides")
+
+    catalog = Catalog(tmp_path)
+    assert catalog.find("Tides") == original
+    assert catalog.find("Tides_fake") == fork
+    assert catalog.find("Ebb") is None
+
+
+def test_existing_trees_are_catalogued_when_first_opened(tmp_path):
+    """Test that books written before the catalog existed are found, and rebuild drops removed ones"""
+    kept = _book(tmp_path, "kept", "Kept", catalogued=False)
+    gone = _book(tmp_path, "gone", "Gone", catalogued=False)
+    assert not (tmp_path / CATALOG_FILE).exists()
+
+    catalog = Catalog(tmp_path)
+    assert {book["title"] for book in catalog.books()} == {"Kept", "Gone"}
+
+    shutil.rmtree(gone)
+    (kept / METADATA_FILE).unlink()
+    _book(tmp_path, "new", "New", updated=datetime.now().isoformat())
+    assert catalog.rebuild() == 1
+    assert [book["title"] for book in catalog.books()] == ["New"]
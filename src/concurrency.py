@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+from pydantic import BaseModel
+
+
+class LimiterMetrics(BaseModel):
+    limit: int
+    in_flight: int
+    waiting: int
+    completed: int
+    errors: int
+    increases: int
+    decreases: int
+    recent_error_rate: float
+    latency_avg: Optional[float] = None
+    latency_p90: Optional[float] = None
+    baseline_latency: dict[str, float] = {}
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for LLM calls.
+
+    The limit grows by roughly one slot per limit's worth of healthy completions
+    (additive increase) and is cut by `backoff` when a call fails or is slow
+    (multiplicative decrease). A call is slow when its latency exceeds both
+    `latency_tolerance` times the baseline for the same kind of call - a low percentile
+    of its recent latencies - and the baseline plus `min_slack` seconds, so scheduler
+    jitter on very fast calls doesn't count. Decreases are spaced at least one limit's
+    worth of completions apart so a single burst of slow calls cannot collapse the limit.
+    """
+
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 latency_tolerance: float = 2.0, backoff: float = 0.7, window: int = 50,
+                 min_slack: float = 0.05, clock: Callable[[], float] = time.monotonic):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.min_slack = min_slack
+        self._clock = clock
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._since_decrease = 0
+        self._condition = threading.Condition()
+        self._recent: deque[tuple[float, bool]] = deque(maxlen=window)
+        self._by_label: dict[str, deque[float]] = {}
+        self._window = window
+        self.completed = 0
+        self.errors = 0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, min(self.max_limit, math.floor(self._limit)))
+
+    @contextmanager
+    def slot(self, label: str = "default") -> Iterator[None]:
+        """Wait for a free slot, run the body in it, and feed its latency and outcome back"""
+        with self._condition:
+            self._waiting += 1
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._waiting -= 1
+            self._in_flight += 1
+
+        start = self._clock()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._complete(label, self._clock() - start, failed)
+
+    def _complete(self, label: str, latency: float, failed: bool):
+        with self._condition:
+            self._in_flight -= 1
+            self.completed += 1
+            self._since_decrease += 1
+            self._recent.append((latency, failed))
+
+            samples = self._by_label.setdefault(label, deque(maxlen=self._window))
+            baseline = _baseline(samples) if samples else None
+            if not failed:
+                samples.append(latency)
+
+            degraded = failed or (baseline is not None and
+                                  latency > max(baseline * self.latency_tolerance, baseline + self.min_slack))
+            if failed:
+                self.errors += 1
+
+            if degraded:
+                if self._since_decrease >= self.limit:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._since_decrease = 0
+                    self.decreases += 1
+            elif self._limit < self.max_limit:
+                before = self.limit
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+                if self.limit > before:
+                    self.increases += 1
+
+            self._condition.notify_all()
+
+    def metrics(self) -> LimiterMetrics:
+        """Snapshot of the current limit and observed latencies"""
+        with self._condition:
+            latencies = sorted(latency for latency, _ in self._recent)
+            recent_errors = sum(1 for _, failed in self._recent if failed)
+            return LimiterMetrics(
+                limit=self.limit,
+                in_flight=self._in_flight,
+                waiting=self._waiting,
+                completed=self.completed,
+                errors=self.errors,
+                increases=self.increases,
+                decreases=self.decreases,
+                recent_error_rate=recent_errors / len(self._recent) if self._recent else 0.0,
+                latency_avg=sum(latencies) / len(latencies) if latencies else None,
+                latency_p90=latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))] if latencies else None,
+                baseline_latency={label: _baseline(samples) for label, samples in self._by_label.items() if samples},
+            )
+
+
+def _baseline(samples: deque[float]) -> float:
+    """Typical fast latency of a kind of call: the 10th percentile, so one lucky call doesn't set it"""
+    ordered = sorted(samples)
+    return ordered[int(0.1 * (len(ordered) - 1))]
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+import pytest
+
+from concurrency import AdaptiveLimiter
+
+
+class _Clock:
+    """Clock that only moves when a call takes its (fixed) latency"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _limiter(**kwargs) -> AdaptiveLimiter:
+    return AdaptiveLimiter(clock=_Clock(), **kwargs)
+
+
+def _run(limiter: AdaptiveLimiter, label: str = "chat", delay: float = 0.0, fail: bool = False):
+    try:
+        with limiter.slot(label):
+            limiter._clock.now += delay
+            if fail:
+                raise TimeoutError("backend timed out")
+    except TimeoutError:
+        pass
+
+
+def test_limit_grows_while_healthy():
+    """Test additive increase while latency stays at baseline"""
+    limiter = _limiter(initial_limit=2, max_limit=8)
+    for _ in range(60):
+        _run(limiter, delay=0.001)
+
+    metrics = limiter.metrics()
+    assert metrics.limit > 2
+    assert metrics.limit <= 8
+    assert metrics.increases > 0
+    assert metrics.decreases == 0
+
+
+def test_errors_back_off():
+    """Test multiplicative decrease on failures"""
+    limiter = _limiter(initial_limit=10, max_limit=10, backoff=0.5)
+    for _ in range(10):
+        _run(limiter, fail=True)
+
+    metrics = limiter.metrics()
+    assert metrics.limit == 5
+    assert metrics.errors == 10
+    assert metrics.recent_error_rate == 1.0
+
+
+def test_latency_degradation_backs_off():
+    """Test that calls much slower than the label's baseline shrink the limit"""
+    limiter = _limiter(initial_limit=4, max_limit=4, latency_tolerance=2.0, backoff=0.5)
+    for _ in range(4):
+        _run(limiter, delay=0.1)
+    for _ in range(8):
+        _run(limiter, delay=0.5)
+
+    assert limiter.metrics().limit < 4
+    assert limiter.metrics().decreases >= 1
+
+
+def test_baselines_are_per_label():
+    """Test that a slow kind of call is not compared with a fast one"""
+    limiter = _limiter(initial_limit=4, max_limit=4)
+    for _ in range(5):
+        _run(limiter, "chat_structured:Title", delay=0.1)
+        _run(limiter, "chat", delay=3.0)
+
+    metrics = limiter.metrics()
+    assert metrics.decreases == 0
+    assert set(metrics.baseline_latency) == {"chat_structured:Title", "chat"}
+
+
+def test_jitter_on_fast_calls_is_not_a_slowdown():
+    """Test that fast calls several times their baseline but within min_slack don't back off"""
+    limiter = _limiter(initial_limit=4, max_limit=4, min_slack=0.05)
+    for delay in [0.00001, 0.002, 0.00001, 0.004] * 10:
+        _run(limiter, delay=delay)
+
+    assert limiter.metrics().decreases == 0
+
+
+def test_one_lucky_call_does_not_set_the_baseline():
+    """Test that the baseline is a low percentile of recent latencies, not their minimum"""
+    limiter = _limiter()
+    _run(limiter, delay=0.01)
+    for _ in range(20):
+        _run(limiter, delay=1.0)
+
+    decreases = limiter.metrics().decreases
+    assert limiter.metrics().baseline_latency["chat"] == pytest.approx(1.0)
+
+    for _ in range(20):
+        _run(limiter, delay=1.0)
+    assert limiter.metrics().decreases == decreases
+
+
+def test_limit_never_below_minimum():
+    """Test that backoff stops at min_limit"""
+    limiter = _limiter(initial_limit=2, min_limit=1)
+    for _ in range(20):
+        _run(limiter, fail=True)
+    assert limiter.metrics().limit == 1
+
+
+def test_in_flight_never_exceeds_limit():
+    """Test that concurrent callers wait for a free slot"""
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+    peak = {"value": 0}
+    guard = threading.Lock()
+
+    def worker():
+        with limiter.slot():
+            with guard:
+                peak["value"] = max(peak["value"], limiter.metrics().in_flight)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak["value"] == 2
+    assert limiter.metrics().completed == 8
+
+
+def test_invalid_limits_rejected():
+    """Test constructor validation"""
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(initial_limit=0)
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(initial_limit=10, max_limit=5)
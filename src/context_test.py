@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 
-import sys
 import os
-sys.path.append(os.path.expanduser('~/src/dazllm'))
-from dazllm import Llm
+import tempfile
+from pathlib import Path
+from backends import model_named
 from brain import Brain
 
 
@@ -13,8 +13,8 @@ class TestContext:
     _instance = None
     _brain = None
     
-    # Configure the model for all tests here
-    MODEL_NAME = "ollama:gpt-oss:20b"
+    # Configure the model for all tests here (NOVELISER_TEST_MODEL=fake runs them offline)
+    MODEL_NAME = os.environ.get("NOVELISER_TEST_MODEL", "ollama:gpt-oss:20b")
     
     def __new__(cls):
         if cls._instance is None:
@@ -25,8 +25,8 @@ class TestContext:
         """Get the shared brain instance for all tests"""
         if self._brain is None:
             print(f"🧠 Initializing test brain with model: {self.MODEL_NAME}")
-            llm = Llm.model_named(self.MODEL_NAME)
-            self._brain = Brain(llm)
+            llm = model_named(self.MODEL_NAME)
+            self._brain = Brain(llm, Path(tempfile.mkdtemp(prefix="noveliser-test-")))
         return self._brain
     
     def reset_brain(self):
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+from typing import Callable, TypeVar
+from colorama import Fore, Style
+
+T = TypeVar("T")
+
+MAX_REPAIR_ATTEMPTS = 3
+
+
+def repair_count(items: list[T], expected: int,
+                 request_missing: Callable[[list[T], int, int], list[T]],
+                 merge_surplus: Callable[[list[T]], T],
+                 what: str = "items",
+                 max_attempts: int = MAX_REPAIR_ATTEMPTS) -> list[T]:
+    """
+    Bring a model-generated list to exactly `expected` items without regenerating it.
+
+    A list that is too long has its surplus tail merged into the last kept item.
+    A list that is too short is extended by asking only for the missing items:
+    request_missing(items_so_far, missing_count, attempt) returns new items to append.
+    Attempts are bounded; after the last one a ValueError is raised.
+    """
+    items = list(items)
+    if expected < 1:
+        raise ValueError(f"Cannot repair a list of {what} to {expected} items")
+
+    attempt = 0
+    while len(items) < expected:
+        if attempt >= max_attempts:
+            raise ValueError(f"LLM failed to generate correct number of {what}. Requested {expected}, got {len(items)} after {max_attempts} repair attempts")
+        attempt += 1
+        missing = expected - len(items)
+        print(f"{Fore.YELLOW}   ⚠️  Got {len(items)} of {expected} {what}; requesting the {missing} missing (attempt {attempt}/{max_attempts}){Style.RESET_ALL}")
+        items.extend(request_missing(items, missing, attempt))
+
+    if len(items) > expected:
+        print(f"{Fore.YELLOW}   ⚠️  Got {len(items)} {what}, expected {expected}; merging the surplus{Style.RESET_ALL}")
+        items = items[:expected - 1] + [merge_surplus(items[expected - 1:])]
+
+    return items
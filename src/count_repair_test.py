@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from count_repair import repair_count
+
+
+def _merge(surplus: list[str]) -> str:
+    return "+".join(surplus)
+
+
+def test_correct_count_is_unchanged():
+    """Test that a list of the right length passes straight through"""
+    def request_missing(so_far, missing, attempt):
+        raise AssertionError("should not be called")
+
+    assert repair_count(["a", "b", "c"], 3, request_missing, _merge) == ["a", "b", "c"]
+
+
+def test_surplus_is_merged_into_last_item():
+    """Test that extra items are folded into the final kept item"""
+    assert repair_count(["a", "b", "c", "d", "e"], 3, lambda *args: [], _merge) == ["a", "b", "c+d+e"]
+
+
+def test_surplus_down_to_one_item():
+    """Test merging everything into a single item"""
+    assert repair_count(["a", "b"], 1, lambda *args: [], _merge) == ["a+b"]
+
+
+def test_only_missing_items_are_requested():
+    """Test that a short list asks for exactly the missing items"""
+    calls = []
+
+    def request_missing(so_far, missing, attempt):
+        calls.append((list(so_far), missing, attempt))
+        return [f"new{i}" for i in range(missing)]
+
+    result = repair_count(["a", "b"], 5, request_missing, _merge)
+
+    assert result == ["a", "b", "new0", "new1", "new2"]
+    assert calls == [(["a", "b"], 3, 1)]
+
+
+def test_partial_fills_retry_until_complete():
+    """Test that repeated partial answers keep filling the gap"""
+    def request_missing(so_far, missing, attempt):
+        return [f"attempt{attempt}"]
+
+    result = repair_count(["a"], 3, request_missing, _merge)
+    assert result == ["a", "attempt1", "attempt2"]
+
+
+def test_over_delivery_while_filling_is_merged():
+    """Test that a follow-up returning too many items is merged back down"""
+    result = repair_count(["a"], 3, lambda so_far, missing, attempt: ["x", "y", "z"], _merge)
+    assert result == ["a", "x", "y+z"]
+
+
+def test_attempts_are_bounded():
+    """Test that repair gives up with a ValueError after the attempt limit"""
+    attempts = []
+
+    def request_missing(so_far, missing, attempt):
+        attempts.append(attempt)
+        return []
+
+    with pytest.raises(ValueError, match="Requested 4, got 1"):
+        repair_count(["a"], 4, request_missing, _merge, what="chapters", max_attempts=2)
+    assert attempts == [1, 2]
@@ -45,5 +45,5 @@ CRITICAL: This outline must contain a complete story arc with:
 The story should feel complete and satisfying at this length, not like a fragment or the beginning of a longer work."""}
     ]
     
-    outline_text = brain.chat(messages)
+    outline_text = brain.chat(messages, label="chat:outline")
     return Outline(outline=outline_text)
\ No newline at end of file
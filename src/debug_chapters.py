@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+from pathlib import Path
 from brain import Brain
 from dazllm import Llm
 from break_into_chapters import break_into_chapters
@@ -10,7 +11,7 @@ def debug_break_into_chapters():
     
     # Set up the brain
     llm = Llm.model_named("ollama:llama3.2:latest")
-    brain = Brain(llm)
+    brain = Brain(llm, Path(__file__).parent.parent / "output")
     
     sample_outline = """
     This is a complete story that follows a character through multiple phases.
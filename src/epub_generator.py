@@ -4,22 +4,44 @@ import uuid
 from pathlib import Path
 from pydantic import BaseModel
 from ebooklib import epub
-from generate_cover import generate_cover
+from generate_cover import IMAGE_MODEL, generate_cover
+from session import novel_dir_for
 
 
 class EpubResult(BaseModel):
     epub_path: str
     cover_path: str
+    # Hash of each chapter's content as rendered, so a rebuild can tell which chapters changed
+    chapter_hashes: dict[int, str] = {}
 
 
 def create_epub(title: str, author: str, chapters: list[dict[str, any]], 
                content_by_chapter: dict[int, dict], output_dir: Path,
-               themes: list[str] | None = None, plot_type: str | None = None) -> EpubResult:
-    """Create an EPUB file from the novel content."""
+               themes: list[str] | None = None, plot_type: str | None = None,
+               image_model: str = IMAGE_MODEL, chapter_hashes: dict[int, str] | None = None,
+               previous: EpubResult | None = None, novel_dir: Path | None = None) -> EpubResult:
+    """
+    Create an EPUB file from the novel content.
+    A section's content is its text, or a function that loads it, called as the section is rendered.
+
+    Given the previous build of the book, this rebuilds it incrementally: its cover is reused,
+    and chapters whose hash is unchanged are copied from it instead of being rendered again.
+
+    novel_dir is the book's directory, by default the one its title maps to. The EPUB is
+    written beside it. A book in a directory of its own (a fork) names its EPUB after the
+    directory, not the shared title.
+    """
+    novel_dir = novel_dir or novel_dir_for(output_dir, title)
     
-    # Generate cover using AI
-    cover_result = generate_cover(title, author, output_dir, themes, plot_type)
-    cover_path = Path(cover_result.cover_path)
+    # Generate cover using AI, unless the previous build already has one
+    if previous and Path(previous.cover_path).exists():
+        cover_path = Path(previous.cover_path)
+    else:
+        cover_result = generate_cover(title, author, output_dir, themes, plot_type, image_model=image_model,
+                                      novel_dir=novel_dir)
+        cover_path = Path(cover_result.cover_path)
+    chapter_hashes = chapter_hashes or {}
+    previous_book = _read_previous(previous)
     
     book = epub.EpubBook()
     
@@ -49,7 +71,16 @@ def create_epub(title: str, author: str, chapters: list[dict[str, any]],
             chapter_content = ""  # No chapter heading for single chapter
             chapter_title = title  # Use the book title instead
         
+        unchanged = (previous_book is not None and chapter_num in chapter_hashes
+                     and previous.chapter_hashes.get(chapter_num) == chapter_hashes[chapter_num])
+        previous_chapter = previous_book.get_item_with_href(f'chapter_{chapter_num}.xhtml') if unchanged else None
+        if previous_chapter is not None:
+            chapter_content = previous_chapter.get_body_content().decode('utf-8')
+            chapter_data = {}
+
         for section_num, section_text in chapter_data.items():
+            if callable(section_text):
+                section_text = section_text()
             if isinstance(section_text, str):
                 # Split into paragraphs for better formatting
                 paragraphs = section_text.split('\n\n')
@@ -79,7 +110,20 @@ def create_epub(title: str, author: str, chapters: list[dict[str, any]],
     book.spine = spine
     
     # Write epub
-    epub_path = output_dir / f"{title.replace(':', ' -')}.epub"
+    if novel_dir == novel_dir_for(output_dir, title):
+        epub_path = novel_dir.parent / f"{title.replace(':', ' -')}.epub"
+    else:
+        epub_path = novel_dir.parent / f"{novel_dir.name}.epub"
     epub.write_epub(str(epub_path), book, {})
     
-    return EpubResult(epub_path=str(epub_path), cover_path=str(cover_path))
\ No newline at end of file
+    return EpubResult(epub_path=str(epub_path), cover_path=str(cover_path), chapter_hashes=chapter_hashes)
+
+
+def _read_previous(previous: EpubResult | None) -> epub.EpubBook | None:
+    """The previously built book, if it is still there and readable"""
+    if previous is None or not previous.chapter_hashes or not Path(previous.epub_path).exists():
+        return None
+    try:
+        return epub.read_epub(previous.epub_path, {"ignore_ncx": True})
+    except Exception:
+        return None
\ No newline at end of file
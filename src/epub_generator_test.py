@@ -61,3 +61,25 @@ def test_epub_creation():
         print(f"✅ Cover created: {cover_path}")
 
 
+
+
+def test_rebuild_reuses_unchanged_chapters(tmp_path):
+    """Test that a rebuild keeps the cover and copies chapters whose hash has not changed"""
+    from ebooklib import epub
+
+    chapters = [{"number": 1, "title": "Ebb"}, {"number": 2, "title": "Flow"}]
+    first = create_epub("Tides", "Test Author", chapters,
+                        {1: {1: "The first ebb."}, 2: {1: "The first flow."}}, tmp_path,
+                        image_model="fake", chapter_hashes={1: "a", 2: "b"})
+    cover_written = Path(first.cover_path).stat().st_mtime_ns
+
+    # Chapter 1's text here is never read: its hash matches, so the last build's chapter is kept
+    rebuilt = create_epub("Tides", "Test Author", chapters,
+                          {1: {1: lambda: 1 / 0}, 2: {1: "The second flow."}}, tmp_path,
+                          image_model="fake", chapter_hashes={1: "a", 2: "c"}, previous=first)
+
+    assert rebuilt.chapter_hashes == {1: "a", 2: "c"}
+    assert Path(rebuilt.cover_path).stat().st_mtime_ns == cover_written
+    book = epub.read_epub(rebuilt.epub_path, {"ignore_ncx": True})
+    assert b"The first ebb." in book.get_item_with_href("chapter_1.xhtml").get_body_content()
+    assert b"The second flow." in book.get_item_with_href("chapter_2.xhtml").get_body_content()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import enum
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import types
+from pathlib import Path
+from typing import Any, Callable, Optional, Type, Union, get_args, get_origin
+from pydantic import BaseModel
+from rate_limit import estimate_tokens
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+_WORDS = ("the", "a", "old", "silent", "river", "lantern", "city", "storm", "letter", "garden", "shadow",
+          "promise", "stranger", "bridge", "winter", "secret", "harbor", "clock", "voice", "map", "door",
+          "morning", "fire", "glass", "road", "memory", "tower", "song", "island", "key", "forest",
+          "walked", "found", "remembered", "watched", "carried", "opened", "whispered", "followed",
+          "slowly", "quietly", "again", "beyond", "beneath", "toward", "before", "after", "under")
+_TITLE_WORDS = ("Lantern", "River", "Winter", "Secret", "Harbor", "Clock", "Shadow", "Garden", "Storm",
+                "Promise", "Island", "Tower", "Glass", "Forest", "Letter", "Bridge", "Memory", "Song")
+_FIRST_NAMES = ("Ada", "Bram", "Celia", "Dorian", "Elena", "Felix", "Greta", "Hugo", "Iris", "Jonah",
+                "Kira", "Leon", "Mira", "Nico", "Orla", "Piet")
+_LAST_NAMES = ("Ashby", "Brennan", "Castell", "Drummond", "Everly", "Frost", "Galloway", "Hale",
+               "Ingram", "Jarvis", "Keane", "Lowell")
+
+DEFAULT_WORDS = 200
+DEFAULT_LIST_LENGTH = 3
+
+
+class FakeLlm:
+    """
+    Offline stand-in for a dazllm model, for tests, CI and benchmarks.
+
+    Answers are deterministic for a given prompt and seed. chat() returns a title, a bulleted
+    list or prose, depending on what the prompt asks for; prose is `words` words long, or the
+    length the prompt asks for ("approximately N words"). chat_structured() fills in any
+    pydantic model from its field types, honouring "exactly N" in the prompt for the model's
+    list and the min/max lengths declared on fields. image() writes a plain PNG.
+
+    latency (seconds per call) and tokens_per_second simulate a real backend's speed.
+    error_rate makes that fraction of calls fail, with a retryable connection error
+    (error="transient") or a non-retryable ValueError (error="permanent").
+    """
+
+    def __init__(self, model_name: str = "fake", words: Optional[int] = None, latency: float = 0.0,
+                 tokens_per_second: Optional[float] = None, error_rate: float = 0.0,
+                 error: str = TRANSIENT, seed: int = 0, sleep: Callable[[float], None] = time.sleep):
+        if error not in (TRANSIENT, PERMANENT):
+            raise ValueError(f"Unknown fake error kind: {error}")
+        self.model_name = model_name
+        self.words = words
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error = error
+        self.seed = seed
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._errors = random.Random(seed)
+        self.calls = 0
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "FakeLlm":
+        """Build from a model spec such as "fake" or "fake:words=500:latency=0.2:error_rate=0.1" """
+        options: dict[str, Any] = {}
+        for part in spec.split(":")[1:]:
+            key, _, value = part.partition("=")
+            if key in ("words", "seed"):
+                options[key] = int(value)
+            elif key in ("latency", "tokens_per_second", "error_rate"):
+                options[key] = float(value)
+            elif key == "error":
+                options[key] = value
+            else:
+                raise ValueError(f"Unknown fake model option: {part}")
+        return cls(model_name=spec, **options)
+
+    def chat(self, messages: list[dict[str, str]], **kwargs) -> str:
+        rng = self._rng(messages)
+        request = _last_user_message(messages)
+        lowered = request.lower()
+        if "just the title" in lowered:
+            text = self._title(rng)
+        elif "simple list" in lowered:
+            text = "\n".join(f"- {self._sentence(rng)}" for _ in range(rng.randint(2, 5)))
+        else:
+            text = self._prose(rng, self.words or _requested_words(request) or DEFAULT_WORDS)
+        self._respond(text)
+        return text
+
+    def chat_structured(self, messages: list[dict[str, str]], model_class: Type[BaseModel], **kwargs) -> BaseModel:
+        rng = self._rng(messages, model_class.__name__)
+        count = _requested_count(_last_user_message(messages))
+        result = model_class.model_validate(self._model_data(model_class, rng, count))
+        self._respond(result.model_dump_json())
+        return result
+
+    def image(self, prompt: str, file_name: str, width: int = 1024, height: int = 1024) -> str:
+        from PIL import Image
+        rng = random.Random(_digest(self.seed, prompt))
+        self._respond("")
+        Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3))).save(file_name, "PNG")
+        return file_name
+
+    def _respond(self, output: str):
+        """Count the call, fail it if an error is due, and take as long as a real backend would"""
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate > 0 and self._errors.random() < self.error_rate
+        delay = self.latency
+        if self.tokens_per_second:
+            delay += estimate_tokens(output) / self.tokens_per_second
+        if delay > 0:
+            self._sleep(delay)
+        if fail:
+            if self.error == TRANSIENT:
+                raise ConnectionResetError(f"{self.model_name}: simulated connection reset")
+            raise ValueError(f"{self.model_name}: simulated invalid request")
+
+    def _rng(self, messages: list[dict[str, str]], *extra: str) -> random.Random:
+        return random.Random(_digest(self.seed, json.dumps(messages, sort_keys=True), *extra))
+
+    def _model_data(self, model_class: Type[BaseModel], rng: random.Random,
+                    count: Optional[int] = None, index: Optional[int] = None) -> dict[str, Any]:
+        # The requested count applies to the list a plan model wraps (chapters, sections, ...)
+        list_fields = [name for name, field in model_class.model_fields.items()
+                       if get_origin(_unwrap_optional(field.annotation)) is list]
+        data = {}
+        for name, field in model_class.model_fields.items():
+            length = count if count and list_fields == [name] else None
+            data[name] = self._value(field.annotation, field.metadata, name, rng, index, length)
+        return data
+
+    def _value(self, annotation: Any, metadata: list, name: str, rng: random.Random,
+               index: Optional[int], length: Optional[int]) -> Any:
+        """A value of the given type; index is the position of the enclosing list item, if any"""
+        annotation = _unwrap_optional(annotation)
+        origin = get_origin(annotation)
+        if origin is list:
+            (item_type,) = get_args(annotation) or (str,)
+            if length is None:
+                length = _clamp_length(DEFAULT_LIST_LENGTH, metadata)
+            return [self._value(item_type, [], name, rng, i, None) for i in range(length)]
+        if origin is dict:
+            return {}
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return self._model_data(annotation, rng, index=index)
+        if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+            members = list(annotation)
+            if index is None:
+                return rng.choice(members).value
+            # List items cycle through the members so that, e.g., characters cover every role
+            return members[index % len(members)].value
+        if annotation is int:
+            if name == "number":
+                return 1 if index is None else index + 1
+            return rng.randint(1, 10)
+        if annotation is float:
+            return round(rng.uniform(0, 1), 3)
+        if annotation is bool:
+            return rng.random() < 0.5
+        if name == "name":
+            return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+        if name == "title":
+            return self._title(rng)
+        return " ".join(self._sentence(rng) for _ in range(rng.randint(1, 3)))
+
+    @staticmethod
+    def _title(rng: random.Random) -> str:
+        return "The " + " ".join(rng.sample(_TITLE_WORDS, rng.randint(1, 2))) + " " + rng.choice(_TITLE_WORDS)
+
+    @staticmethod
+    def _sentence(rng: random.Random, length: Optional[int] = None) -> str:
+        words = [rng.choice(_WORDS) for _ in range(length or rng.randint(8, 16))]
+        return " ".join(words).capitalize() + "."
+
+    def _prose(self, rng: random.Random, words: int) -> str:
+        paragraphs = []
+        sentences = []
+        written = 0
+        while written < words:
+            length = min(rng.randint(8, 16), max(1, words - written))
+            sentences.append(self._sentence(rng, length))
+            written += length
+            if len(sentences) >= rng.randint(4, 6):
+                paragraphs.append(" ".join(sentences))
+                sentences = []
+        if sentences:
+            paragraphs.append(" ".join(sentences))
+        return "\n\n".join(paragraphs)
+
+
+def _digest(*parts: Any) -> int:
+    return int.from_bytes(hashlib.sha256("\x00".join(map(str, parts)).encode('utf-8')).digest()[:8], "big")
+
+
+def _last_user_message(messages: list[dict[str, str]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content", "")
+    return ""
+
+
+def _requested_count(text: str) -> Optional[int]:
+    """The last "exactly N" in a prompt - follow-up requests restate the count they now want"""
+    matches = re.findall(r"\bexactly (\d+)\b", text, re.IGNORECASE)
+    return int(matches[-1]) if matches else None
+
+
+def _requested_words(text: str) -> Optional[int]:
+    match = re.search(r"approximately (\d+)(?:-\d+)? words", text, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return args[0] if args else str
+    return annotation
+
+
+def _clamp_length(length: int, metadata: list) -> int:
+    for constraint in metadata:
+        minimum = getattr(constraint, "min_length", None)
+        maximum = getattr(constraint, "max_length", None)
+        if minimum is not None:
+            length = max(length, minimum)
+        if maximum is not None:
+            length = min(length, maximum)
+    return length
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import pytest
+from PIL import Image
+
+from backends import model_named
+from break_into_chapters import ChapterPlan
+from break_into_sections import SectionPlan, SingleSection
+from create_characters import CharacterRole, CharactersList
+from fake_llm import FakeLlm
+from rate_limit import RateLimits
+from rate_limit_test import FakeClock, make_limiter
+from resilience import is_retryable
+from select_themes import ThemeSelection
+from usage import track_usage
+from write_section import SectionResult
+
+
+def ask(content: str) -> list[dict[str, str]]:
+    return [{"role": "system", "content": "You are a test."}, {"role": "user", "content": content}]
+
+
+def test_structured_lists_honour_requested_count():
+    """Test that "exactly N" in the prompt sets the length of a plan's list"""
+    llm = FakeLlm()
+    plan = llm.chat_structured(ask("Break this story into EXACTLY 7 chapters."), ChapterPlan)
+    assert len(plan.chapters) == 7
+    assert [chapter.number for chapter in plan.chapters] == list(range(1, 8))
+    assert all(chapter.title and chapter.key_events for chapter in plan.chapters)
+
+    follow_up = ask("Break into EXACTLY 10 sections.\n\nCreate ONLY the remaining 4 sections. Return exactly 4 sections.")
+    assert len(llm.chat_structured(follow_up, SectionPlan).sections) == 4
+
+
+def test_structured_values_fit_the_schema():
+    """Test enum cycling, declared list bounds and nested models"""
+    llm = FakeLlm()
+    characters = llm.chat_structured(ask("Create 3-8 characters for this story"), CharactersList)
+    roles = [character.role for character in characters.characters]
+    assert CharacterRole.PROTAGONIST in roles and CharacterRole.ANTAGONIST in roles
+    assert all(" " in character.name for character in characters.characters)
+
+    themes = llm.chat_structured(ask("Select 2-3 universal themes"), ThemeSelection)
+    assert 2 <= len(themes.themes) <= 3
+    assert len(set(themes.themes)) == len(themes.themes)
+
+    section = llm.chat_structured(ask("Plan this chapter as a single section"), SingleSection)
+    assert section.goal and section.key_events
+
+    assert isinstance(llm.chat_structured(ask("Write it"), SectionResult).new_facts, list)
+
+
+def test_answers_are_deterministic():
+    """Test that the same prompt and seed always give the same answer, and a new seed a different one"""
+    messages = ask("Write approximately 300 words for this section.")
+    assert FakeLlm().chat(messages) == FakeLlm().chat(messages)
+    assert FakeLlm(seed=1).chat(messages) != FakeLlm().chat(messages)
+
+
+def test_chat_shapes_and_prose_size():
+    """Test titles, lists and prose of the requested or configured size"""
+    llm = FakeLlm()
+    title = llm.chat(ask("Create a title.\n\nRespond with just the title, no quotes or explanation."))
+    assert "\n" not in title and title.startswith("The ")
+
+    facts = llm.chat(ask("Extract new facts. Return as a simple list."))
+    assert all(line.startswith("- ") for line in facts.splitlines())
+
+    prose = llm.chat(ask("Write approximately 1500-2000 words for this section."))
+    assert len(prose.split()) == 1500
+    assert len(FakeLlm(words=50).chat(ask("Write approximately 1500-2000 words.")).split()) == 50
+
+
+def test_latency_and_throughput_are_simulated():
+    """Test that each call sleeps for the base latency plus output tokens over throughput"""
+    slept = []
+    llm = FakeLlm(words=400, latency=0.5, tokens_per_second=100, sleep=slept.append)
+    text = llm.chat(ask("Write something."))
+    assert slept == [pytest.approx(0.5 + (len(text) // 4) / 100)]
+
+
+def test_error_injection():
+    """Test that transient errors are retryable and permanent ones are not"""
+    transient = FakeLlm(error_rate=1.0)
+    with pytest.raises(ConnectionError) as error:
+        transient.chat(ask("Hello"))
+    assert is_retryable(error.value)
+
+    permanent = FakeLlm(error_rate=1.0, error="permanent")
+    with pytest.raises(ValueError) as error:
+        permanent.chat(ask("Hello"))
+    assert not is_retryable(error.value)
+
+    sometimes = FakeLlm(error_rate=0.3, seed=4)
+    failures = 0
+    for _ in range(200):
+        try:
+            sometimes.chat(ask("Hello"))
+        except ConnectionError:
+            failures += 1
+    assert 30 < failures < 90
+
+
+def test_image_writes_png(tmp_path):
+    """Test that image generation writes a PNG of the requested size"""
+    path = tmp_path / "covers" / "cover.png"
+    FakeLlm().image("A cover", str(path), width=64, height=96)
+    with Image.open(path) as image:
+        assert image.format == "PNG"
+        assert image.size == (64, 96)
+
+
+def test_model_named_builds_fakes():
+    """Test that "fake" specs, with options and in pools, resolve offline"""
+    assert isinstance(model_named("fake"), FakeLlm)
+    llm = model_named("fake:words=120:latency=0.25:error_rate=0.1:seed=3")
+    assert (llm.words, llm.latency, llm.error_rate, llm.seed) == (120, 0.25, 0.1, 3)
+    pool = model_named("fake:seed=1,fake:seed=2")
+    assert [member.name for member in pool.members] == ["fake:seed=1", "fake:seed=2"]
+    pool.check_health()
+    assert [member.llm.calls for member in pool.members] == [1, 1]
+    pool.close()
+
+    with pytest.raises(ValueError):
+        model_named("fake:colour=blue")
+
+
+def test_pool_health_checks_are_rate_limited_and_counted(tmp_path):
+    """Test that probing a pool's members waits on the rate limiter and shows in usage"""
+    clock = FakeClock()
+    limiter = make_limiter(tmp_path, {"fake": RateLimits(requests_per_minute=1)}, clock)
+    pool = model_named("fake:seed=1,fake:seed=2", limiter)
+    calls = []
+    try:
+        with track_usage(calls):
+            pool.check_health()
+    finally:
+        pool.close()
+
+    assert [(call.kind, call.model) for call in calls] == [("chat:health_check", "fake:seed=1"),
+                                                           ("chat:health_check", "fake:seed=2")]
+    # Both members are under the "fake" budget of one request a minute, so the second probe waited
+    assert sum(clock.slept) > 50
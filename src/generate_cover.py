@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+import time
 from pathlib import Path
 from pydantic import BaseModel
-from dazllm import Llm
+from backends import model_named
+from rate_limit import default_rate_limiter, estimate_tokens
+from session import novel_dir_for
+from usage import record_call
+
+IMAGE_MODEL = 'openai:gpt-image-1'
 
 
 class CoverResult(BaseModel):
@@ -12,8 +18,12 @@ class CoverResult(BaseModel):
 
 
 def generate_cover(title: str, author: str, output_dir: Path, 
-                  themes: list[str] | None = None, plot_type: str | None = None) -> CoverResult:
-    """Generate a professional book cover using AI image generation."""
+                  themes: list[str] | None = None, plot_type: str | None = None,
+                  image_model: str = IMAGE_MODEL, novel_dir: Path | None = None) -> CoverResult:
+    """
+    Generate a professional book cover using AI image generation.
+    It is saved in novel_dir, by default the directory the title maps to.
+    """
     
     # Create a very detailed prompt that emphasizes what should and shouldn't be included
     theme_context = f"The story explores themes of {', '.join(themes)}. " if themes else ""
@@ -73,8 +83,8 @@ CRITICAL REMINDERS:
 - Professional publishing industry standard appearance"""
     
     # Ensure the novel-specific directory exists
-    novel_dir = output_dir / title.replace(' ', '_').replace(':', '_')
-    novel_dir.mkdir(exist_ok=True)
+    novel_dir = novel_dir or novel_dir_for(output_dir, title)
+    novel_dir.mkdir(parents=True, exist_ok=True)
     
     # Generate cover image using dazllm
     cover_filename = f"cover_{title.replace(' ', '_').replace(':', '_')}.png"
@@ -82,8 +92,11 @@ CRITICAL REMINDERS:
     
     try:
         # Use dazllm's image generation with exact DALL-E supported dimensions
-        llm = Llm.model_named('openai:gpt-image-1')
+        llm = model_named(image_model)
+        default_rate_limiter(output_dir).acquire(image_model)
+        started = time.monotonic()
         result = llm.image(prompt, str(cover_path), width=1024, height=1536)  # Portrait book cover format - now working with fixed dazllm
+        record_call("image", image_model, estimate_tokens(prompt), 0, time.monotonic() - started, cache_hit=False)
         
         return CoverResult(
             cover_path=str(cover_path),
@@ -16,5 +16,5 @@ def generate_title(brain: Brain, description: str) -> Title:
         {"role": "user", "content": f"Create a compelling, memorable title for this story:\n\n{description}\n\nRespond with just the title, no quotes or explanation."}
     ]
     
-    title_text = brain.chat(messages).strip().strip('"\'')
+    title_text = brain.chat(messages, label="chat:title").strip().strip('"\'')
     return Title(title=title_text)
\ No newline at end of file
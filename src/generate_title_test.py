@@ -1,17 +1,12 @@
 #!/usr/bin/env python3
 
-import sys
-import os
-sys.path.append(os.path.expanduser('~/src/dazllm'))
-from dazllm import Llm
-from brain import Brain
+from context_test import get_test_brain
 from generate_title import generate_title
 
 
 def test_title_generation():
     """Test basic title generation"""
-    llm = Llm("ollama:gpt-oss:20b")
-    brain = Brain(llm)
+    brain = get_test_brain()
     
     description = "a novel about a girl scientist working in a lab who through some accident gets sent back to ancient rome"
     
@@ -25,8 +20,7 @@ def test_title_generation():
 
 def test_title_generation_short_description():
     """Test title generation with shorter description"""
-    llm = Llm("ollama:gpt-oss:20b")
-    brain = Brain(llm)
+    brain = get_test_brain()
     
     description = "A romantic comedy about two rivals"
     
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+from safe_io import append_jsonl, read_json
+
+JOURNAL_FILE = "journal.jsonl"
+STARTED = "started"
+COMPLETED = "completed"
+FORKED = "forked"
+REPARENTED = "reparented"
+
+# The start of a completed event that carries a result, and the inputs hash and carry that may
+# end it, as append_jsonl writes them. Matching these lets the journal be indexed without
+# parsing the (large) results themselves.
+_COMPLETED_WITH_RESULT = re.compile(
+    rb'\{"event":"completed","step":("(?:[^"\\]|\\.)*"),"at":[-+.\deE]+,"result":')
+_INPUTS_AT_END = re.compile(rb',"inputs":"([0-9a-f]+)"(?:,"carry":(\{.*\}))?\}\n\Z')
+
+
+def step_file_name(step_description: str) -> str:
+    """Name of the per-step JSON file novels written before the journal used for a step"""
+    return step_description.lower().replace(' ', '_').replace('generate_', '').replace('determine_', '').replace('create_', '').replace('select_', '') + ".json"
+
+
+def read_events(path: Path, offset: int = 0) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    Journal events from a byte offset on, each with the offset just past it.
+    Stops at a torn final line; lines that fail to parse are skipped.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            try:
+                yield offset, json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+
+
+def _indexed_step(line: bytes) -> Optional[tuple[str, Optional[str], Optional[bytes]]]:
+    """
+    The step a journal line records a result for, the hash of its inputs and its carry (as
+    JSON, unparsed), or None if it records no result
+    """
+    match = _COMPLETED_WITH_RESULT.match(line)
+    if match:
+        end = _INPUTS_AT_END.search(line)
+        if end is None:
+            return json.loads(match.group(1)), None, None
+        return json.loads(match.group(1)), end.group(1).decode(), end.group(2)
+    if line.startswith((b'{"event":"started"', b'{"event":"completed"')) and b'"result":' not in line:
+        return None
+    # Not in append_jsonl's layout (edited by hand, say), so parse it properly
+    try:
+        event = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if isinstance(event, dict) and event.get("event") == COMPLETED and "result" in event:
+        carry = event.get("carry")
+        return event["step"], event.get("inputs"), json.dumps(carry).encode() if carry is not None else None
+    return None
+
+
+class Journal:
+    """
+    Append-only log of a novel's steps: a line when a step starts and a line, carrying the
+    step's result, when it completes. Completed events are fsynced, so a step counts as done
+    only once its result is on disk. metadata.json is a compacted view of this log.
+
+    Results stay on disk: the journal keeps only where each step's result line is, and
+    reads a result when asked for it. A result may carry a hash of the inputs it was made
+    from, so a step whose inputs have since changed can be told apart from one still current,
+    and a carry: the little a later step needs from it, which the index holds so it can be
+    had without reading the result.
+
+    A forked novel's journal starts with a forked event naming its parent's directory and
+    the steps it inherits. Their results are read from the parent's journal as it was when
+    the fork was made - the parent only ever appends - so they are stored once for both.
+    A reparented event, written when the parent's directory moves, says where it now is.
+    """
+
+    def __init__(self, novel_dir: Path, until: Optional[int] = None):
+        self.novel_dir = Path(novel_dir)
+        self.path = self.novel_dir / JOURNAL_FILE
+        self.until = until
+        self.uncompacted_bytes = 0
+        self._parent: Optional[Journal] = None
+        self._inherited: list[str] = []
+        # Step description -> (offset, length, inputs hash, carry) of the line holding its latest result
+        self._index: Optional[dict[str, tuple[int, int, Optional[str], Optional[bytes]]]] = None
+        self._end: Optional[int] = None
+        self._tail_checked = False
+
+    def append(self, event: str, step: str, durable: bool = False, **fields: Any) -> int:
+        """Append an event and return the offset its line starts at"""
+        if not self._tail_checked:
+            self._end_torn_line()
+        record = {"event": event, "step": step, "at": round(time.time(), 3), **fields}
+        offset = self._end
+        written = append_jsonl(self.path, record, fsync=durable)
+        self._end += written
+        self.uncompacted_bytes += written
+        return offset
+
+    def end_offset(self) -> int:
+        """Offset just past the last event, assuming this journal object is the novel's only writer"""
+        if not self._tail_checked:
+            self._end_torn_line()
+        return self._end
+
+    def started(self, step: str):
+        self.append(STARTED, step)
+
+    def completed(self, step: str, result: Any, inputs: Optional[str] = None, carry: Any = None):
+        """Record a step's result, the hash of its inputs and, with those, a carry (see carry())"""
+        fields = {"result": result} if inputs is None else {"result": result, "inputs": inputs}
+        if inputs is not None and carry is not None:
+            fields["carry"] = carry
+        offset = self.append(COMPLETED, step, durable=True, **fields)
+        if self._index is not None:
+            carried = json.dumps(fields["carry"]).encode() if "carry" in fields else None
+            self._index[step] = (offset, self._end - offset, inputs, carried)
+
+    def fork(self, parent: "Journal", from_step: str) -> list[str]:
+        """
+        Start this (empty) journal as a fork of parent that re-runs from_step and everything
+        after it, and return the steps it inherits: those parent completed before from_step.
+        """
+        steps = parent.steps()
+        if from_step not in steps:
+            raise ValueError(f"'{from_step}' has not completed in '{parent.novel_dir.name}'")
+        inherited = steps[:steps.index(from_step)]
+        self.append(FORKED, from_step, durable=True, parent=os.path.relpath(parent.novel_dir, self.novel_dir),
+                    parent_offset=parent.end_offset(), inherited=inherited)
+        self._index = None
+        return inherited
+
+    def reparent(self, parent_dir: Path):
+        """Record that the parent this journal was forked from has moved to parent_dir"""
+        self.append(REPARENTED, "", durable=True, parent=os.path.relpath(parent_dir, self.novel_dir))
+        self._index = None
+
+    @property
+    def parent(self) -> Optional["Journal"]:
+        """The journal this one was forked from, as it was at the time"""
+        self._load_index()
+        return self._parent
+
+    def steps(self) -> list[str]:
+        """Every step with a result, inherited ones first, in the order they first completed"""
+        own = self._load_index()
+        return self._inherited + [step for step in own if step not in self._inherited]
+
+    def own_steps(self) -> list[str]:
+        """Every step with a result in this journal itself, rather than inherited from its parent"""
+        return list(self._load_index())
+
+    def has_result(self, step: str) -> bool:
+        """Whether the journal itself (not a legacy step file) holds a result for the step"""
+        return step in self._load_index() or step in self._inherited
+
+    def results(self) -> dict[str, Any]:
+        """Result of every step completed in the journal, by step description. Reads them all."""
+        return {step: self.result(step) for step in self.steps()}
+
+    def result(self, step: str) -> Optional[Any]:
+        """
+        A completed step's result, or None if it has not completed. Novels started before
+        the journal existed keep their results in per-step JSON files, which are read instead.
+        """
+        if step in self._load_index():
+            return self._read_result(step)
+        if step in self._inherited:
+            return self._parent.result(step)
+        return read_json(self.novel_dir / step_file_name(step))
+
+    def inputs(self, step: str) -> Optional[str]:
+        """Hash of the inputs the step's latest result was made from, if it recorded one"""
+        entry = self._load_index().get(step)
+        if entry is None and step in self._inherited:
+            return self._parent.inputs(step)
+        return entry[2] if entry else None
+
+    def carry(self, step: str) -> Optional[Any]:
+        """What the step's latest result carries forward to later steps, read without reading the result"""
+        entry = self._load_index().get(step)
+        if entry is None and step in self._inherited:
+            return self._parent.carry(step)
+        return json.loads(entry[3]) if entry and entry[3] is not None else None
+
+    def loader(self, step: str, field: str) -> Callable[[], Any]:
+        """A function reading one field of a completed step's result each time it is called"""
+        return lambda: self.result(step)[field]
+
+    def _load_index(self) -> dict[str, tuple[int, int, Optional[str], Optional[bytes]]]:
+        if self._index is None:
+            index = {}
+            offset = 0
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                f = None
+            if f is not None:
+                with f:
+                    for line in f:
+                        if not line.endswith(b"\n") or (self.until is not None and offset >= self.until):
+                            break
+                        if line.startswith((b'{"event":"forked"', b'{"event":"reparented"')):
+                            self._load_parent(json.loads(line))
+                        indexed = _indexed_step(line)
+                        if indexed is not None:
+                            step, inputs, carry = indexed
+                            index[step] = (offset, len(line), inputs, carry)
+                        offset += len(line)
+            self._index = index
+        return self._index
+
+    def _load_parent(self, event: dict[str, Any]):
+        if event["event"] == REPARENTED:
+            if self._parent is not None:
+                self._parent = Journal(self.novel_dir / event["parent"], until=self._parent.until)
+            return
+        self._parent = Journal(self.novel_dir / event["parent"], until=event["parent_offset"])
+        self._inherited = list(event["inherited"])
+
+    def _read_result(self, step: str) -> Any:
+        offset, length, _, _ = self._index[step]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))["result"]
+
+    def _end_torn_line(self):
+        """Terminate a line torn by a crash, so the next event starts on a line of its own"""
+        self._tail_checked = True
+        try:
+            with open(self.path, 'rb+') as f:
+                self._end = f.seek(0, os.SEEK_END)
+                if self._end:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._end += f.write(b"\n")
+        except FileNotFoundError:
+            self._end = 0
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import json
+
+import pytest
+
+from journal import COMPLETED, JOURNAL_FILE, Journal, read_events, step_file_name
+
+
+def test_completed_results_survive_reopening(tmp_path):
+    """Test that a fresh journal finds the results written by an earlier one"""
+    journal = Journal(tmp_path)
+    journal.started("Generate a title")
+    journal.completed("Generate a title", {"title": "Tides"})
+    journal.started("Determine plot type")
+
+    reopened = Journal(tmp_path)
+    assert reopened.results() == {"Generate a title": {"title": "Tides"}}
+    assert reopened.result("Determine plot type") is None
+
+
+def test_result_falls_back_to_legacy_step_files(tmp_path):
+    """Test that novels written before the journal still resume from their step files"""
+    (tmp_path / step_file_name("Determine plot type")).write_text(json.dumps({"plot_type": "quest"}))
+
+    assert step_file_name("Determine plot type") == "plot_type.json"
+    assert Journal(tmp_path).result("Determine plot type") == {"plot_type": "quest"}
+
+
+def test_torn_line_is_skipped_and_terminated(tmp_path):
+    """Test that a line torn by a crash is ignored and does not swallow the next event"""
+    Journal(tmp_path).completed("Generate a title", {"title": "Tides"})
+    with open(tmp_path / JOURNAL_FILE, "ab") as f:
+        f.write(b'{"event":"completed","step":"Select th')
+
+    assert [event["step"] for _, event in read_events(tmp_path / JOURNAL_FILE)] == ["Generate a title"]
+
+    Journal(tmp_path).completed("Select themes", {"themes": []})
+    results = Journal(tmp_path).results()
+    assert set(results) == {"Generate a title", "Select themes"}
+
+
+def test_read_events_resumes_from_offset(tmp_path):
+    """Test that offsets returned by read_events skip the events already seen"""
+    journal = Journal(tmp_path)
+    journal.completed("One", 1)
+    journal.completed("Two", 2)
+
+    events = list(read_events(journal.path))
+    offset = events[0][0]
+    assert [event["result"] for _, event in read_events(journal.path, offset)] == [2]
+    assert events[-1][0] == journal.path.stat().st_size
+    assert all(event["event"] == COMPLETED for _, event in events)
+
+
+def test_results_are_read_from_disk_when_asked_for(tmp_path):
+    """Test that a loader reads the latest result of its step each time it is called"""
+    journal = Journal(tmp_path)
+    journal.completed("Write Chapter 1, Section 1", {"text": "First draft", "new_facts": []})
+    text = Journal(tmp_path).loader("Write Chapter 1, Section 1", "text")
+    assert text() == "First draft"
+
+    journal.completed("Write Chapter 1, Section 1", {"text": "Second draft", "new_facts": []})
+    assert journal.loader("Write Chapter 1, Section 1", "text")() == "Second draft"
+    assert Journal(tmp_path).result("Write Chapter 1, Section 1")["text"] == "Second draft"
+
+
+def test_carry_is_read_without_the_result(tmp_path, monkeypatch):
+    """Test that a step's carry comes from the index, for the journal's own steps and inherited ones"""
+    journal = Journal(tmp_path / "Tides")
+    journal.completed("Write Chapter 1, Section 1", {"text": "}\",\"carry\":{", "new_facts": []}, "a",
+                      {"story": "b", "facts": ["The lamp is } red"]})
+    journal.completed("Write Chapter 1, Section 2", {"text": "Later", "new_facts": []}, "c")
+    fork = Journal(tmp_path / "Tides_variant")
+    fork.fork(Journal(tmp_path / "Tides"), "Write Chapter 1, Section 2")
+    monkeypatch.setattr(Journal, "_read_result", lambda self, step: pytest.fail(f"read {step}"))
+
+    assert Journal(tmp_path / "Tides").carry("Write Chapter 1, Section 1") == {"story": "b", "facts": ["The lamp is } red"]}
+    assert Journal(tmp_path / "Tides").carry("Write Chapter 1, Section 2") is None
+    assert journal.carry("Write Chapter 1, Section 1") == {"story": "b", "facts": ["The lamp is } red"]}
+    assert Journal(tmp_path / "Tides_variant").carry("Write Chapter 1, Section 1") == {"story": "b", "facts": ["The lamp is } red"]}
+
+
+def test_index_reads_lines_in_other_layouts(tmp_path):
+    """Test that results in lines not written by append_jsonl are still found"""
+    Journal(tmp_path).completed("Step \"quoted\"", 1)
+    with open(tmp_path / JOURNAL_FILE, "a") as f:
+        f.write(json.dumps({"step": "Spaced", "event": "completed", "result": 2}) + "\n")
+        f.write(json.dumps({"event": "completed", "step": "No result"}) + "\n")
+
+    journal = Journal(tmp_path)
+    assert journal.results() == {"Step \"quoted\"": 1, "Spaced": 2}
+    assert not journal.has_result("No result")
+
+
+def test_fork_reads_inherited_results_from_its_parent(tmp_path):
+    """Test that a fork shares its parent's results as they were when it was forked"""
+    parent = Journal(tmp_path / "Tides")
+    parent.completed("Generate a title", {"title": "Tides"}, "a")
+    parent.completed("Create outline", {"outline": "first"}, "b")
+    parent.completed("Define writing style", {"style": "plain"}, "c")
+
+    fork = Journal(tmp_path / "Tides_variant")
+    assert fork.fork(parent, "Define writing style") == ["Generate a title", "Create outline"]
+    parent.completed("Create outline", {"outline": "revised"}, "d")
+    fork.completed("Define writing style", {"style": "ornate"})
+
+    reopened = Journal(tmp_path / "Tides_variant")
+    assert reopened.steps() == ["Generate a title", "Create outline", "Define writing style"]
+    assert reopened.result("Create outline") == {"outline": "first"}
+    assert reopened.inputs("Create outline") == "b"
+    assert reopened.result("Define writing style") == {"style": "ornate"}
+    assert b"first" not in reopened.path.read_bytes()
+    with pytest.raises(ValueError):
+        Journal(tmp_path / "Other").fork(parent, "Write Chapter 1, Section 1")
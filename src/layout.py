@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Literal, Optional
+from colorama import Fore, Style
+from pydantic import BaseModel, Field
+from catalog import catalog_for
+from safe_io import atomic_write_json, read_json
+
+LAYOUT_FILE = "layout.json"
+# Most directory levels a layout may put between the output directory and a book
+MAX_SHARD_LEVELS = 4
+
+
+class Layout(BaseModel):
+    """
+    How book directories are arranged under the output directory, read from its layout.json:
+    flat (output/<Title>/), hash (output/3f/a2/<Title>/ - levels of two hex digits of a hash
+    of the directory name) or date (output/2026/10/<Title>/ - the book's creation date, as
+    date_format, of at most MAX_SHARD_LEVELS parts). A book's EPUB sits beside its directory.
+    """
+    shard: Literal["flat", "hash", "date"] = "flat"
+    levels: int = Field(2, ge=1, le=MAX_SHARD_LEVELS)
+    date_format: str = "%Y/%m"
+
+    def book_dir(self, name: str, created: datetime) -> Path:
+        """Where, relative to the output directory, the book with this directory name goes"""
+        if self.shard == "hash":
+            digest = hashlib.sha256(name.encode('utf-8')).hexdigest()
+            return Path(*(digest[2 * level:2 * level + 2] for level in range(self.levels))) / name
+        if self.shard == "date":
+            return Path(created.strftime(self.date_format)) / name
+        return Path(name)
+
+
+def book_name(title: str) -> str:
+    """Directory name for a book with this title"""
+    clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
+    return clean_title.replace(' ', '_')
+
+
+def load_layout(output_dir: Path) -> Layout:
+    """The output directory's layout; without a layout.json it is flat"""
+    data = read_json(Path(output_dir) / LAYOUT_FILE)
+    return Layout(**data) if data else Layout()
+
+
+def output_root(novel_dir: Path) -> Path:
+    """
+    The output directory a book's directory is under: the nearest one above it (within the
+    levels a layout can add) with a layout.json, or else its parent, as in a flat layout
+    """
+    novel_dir = Path(novel_dir)
+    for directory in novel_dir.parents[:MAX_SHARD_LEVELS + 1]:
+        if (directory / LAYOUT_FILE).exists():
+            return directory
+    return novel_dir.parent
+
+
+def migrate_layout(output_dir: Path, layout: Layout) -> int:
+    """
+    Switch the output directory to a new layout, moving every book (and its EPUB) where the
+    layout puts it, and return how many moved. Paths recorded in the books' metadata and
+    journals are updated, forks are pointed at their parents' new directories, and the
+    catalog is rebuilt. New books go where the new layout puts them from the start.
+    """
+    from journal import Journal
+    from metadata import read_metadata, write_metadata
+
+    output_dir = Path(os.path.abspath(output_dir))
+    catalog = catalog_for(output_dir)
+    catalog.rebuild()
+    atomic_write_json(output_dir / LAYOUT_FILE, layout.model_dump(), indent=2)
+
+    books = [Path(os.path.abspath(book["directory"])) for book in catalog.books()]
+    parents = {novel_dir: _parent_dir(Journal(novel_dir)) for novel_dir in books}
+    moves: dict[Path, Path] = {}
+    renamed: dict[str, str] = {}
+    for novel_dir in books:
+        metadata = read_metadata(novel_dir)
+        target = output_dir / layout.book_dir(novel_dir.name, datetime.fromisoformat(metadata.created_at))
+        if target == novel_dir:
+            continue
+        if target.exists():
+            print(f"{Fore.YELLOW}⚠️  Not moving {novel_dir}: {target} already exists{Style.RESET_ALL}")
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.rename(novel_dir, target)
+        moves[novel_dir] = target
+        renamed[str(novel_dir)] = str(target)
+        if metadata.epub_path and Path(metadata.epub_path).parent == novel_dir.parent and Path(metadata.epub_path).exists():
+            epub_path = target.parent / Path(metadata.epub_path).name
+            os.rename(metadata.epub_path, epub_path)
+            renamed[metadata.epub_path] = str(epub_path)
+        _remove_empty_parents(novel_dir.parent, output_dir)
+
+    # Books refer to files of other books (a fork uses its parent's cover), so every book is checked
+    for novel_dir, parent_dir in parents.items():
+        novel_dir = moves.get(novel_dir, novel_dir)
+        journal = Journal(novel_dir)
+        for step in journal.own_steps():
+            result = journal.result(step)
+            moved = _renamed(result, renamed)
+            if moved != result:
+                journal.completed(step, moved, journal.inputs(step), journal.carry(step))
+        if parent_dir is not None and moves.get(parent_dir, parent_dir) != Path(os.path.normpath(journal.parent.novel_dir)):
+            journal.reparent(moves.get(parent_dir, parent_dir))
+        metadata = read_metadata(novel_dir)
+        if (metadata.epub_path, metadata.cover_path) != (_renamed(metadata.epub_path, renamed), _renamed(metadata.cover_path, renamed)):
+            metadata.epub_path = _renamed(metadata.epub_path, renamed)
+            metadata.cover_path = _renamed(metadata.cover_path, renamed)
+            write_metadata(novel_dir, metadata, touch=False)
+    catalog.rebuild()
+    return len(moves)
+
+
+def _parent_dir(journal) -> Optional[Path]:
+    parent = journal.parent
+    return Path(os.path.normpath(parent.novel_dir)) if parent is not None else None
+
+
+def _renamed(value, renamed: dict[str, str]):
+    """value with any path under a renamed one rewritten to its new location"""
+    if isinstance(value, str):
+        for old, new in renamed.items():
+            if value == old or value.startswith(old + os.sep):
+                return new + value[len(old):]
+        return value
+    if isinstance(value, dict):
+        return {key: _renamed(item, renamed) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_renamed(item, renamed) for item in value]
+    return value
+
+
+def _remove_empty_parents(directory: Path, output_dir: Path):
+    """Remove shard directories left empty, up to the output directory"""
+    while directory != output_dir and output_dir in directory.parents:
+        try:
+            directory.rmdir()
+        except OSError:
+            return
+        directory = directory.parent
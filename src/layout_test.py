@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+
+from layout import LAYOUT_FILE, Layout, load_layout, output_root
+from safe_io import atomic_write_json
+
+
+def test_layouts_place_books_by_hash_or_date():
+    """Test that each layout maps a directory name to its place under the output directory"""
+    created = datetime(2026, 10, 19)
+    assert str(Layout().book_dir("Tides", created)) == "Tides"
+    hashed = Layout(shard="hash", levels=3).book_dir("Tides", created)
+    assert len(hashed.parts) == 4 and all(len(part) == 2 for part in hashed.parts[:3])
+    assert hashed == Layout(shard="hash", levels=3).book_dir("Tides", datetime(2020, 1, 1))
+    assert str(Layout(shard="date").book_dir("Tides", created)) == "2026/10/Tides"
+
+
+def test_output_root_is_found_above_shards(tmp_path):
+    """Test that a sharded book's output directory is the one holding the layout"""
+    sharded = tmp_path / "sharded"
+    atomic_write_json(sharded / LAYOUT_FILE, {"shard": "hash", "levels": 2})
+    assert load_layout(sharded).shard == "hash"
+    assert output_root(sharded / "3f" / "a2" / "Tides") == sharded
+
+    flat = tmp_path / "flat"
+    assert load_layout(flat) == Layout()
+    assert output_root(flat / "Tides") == flat
+    assert output_root(sharded / "1" / "2" / "3" / "4" / "5" / "Tides") == sharded / "1" / "2" / "3" / "4" / "5"
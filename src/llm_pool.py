@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional, Type
+from pydantic import BaseModel
+from resilience import CircuitBreaker, OPEN, is_retryable
+from tracing import span
+
+
+class PoolMember:
+    """
+    One backend in a pool - anything with dazllm's chat/chat_structured interface.
+    Tracks in-flight requests for balancing; its circuit breaker decides ejection.
+    health_check, if given, is a cheap probe that raises when the backend is down.
+    """
+
+    def __init__(self, llm: Any, name: Optional[str] = None, weight: float = 1.0,
+                 health_check: Optional[Callable[[], Any]] = None):
+        if weight <= 0:
+            raise ValueError("Pool member weight must be positive")
+        self.llm = llm
+        self.name = name or getattr(llm, "model_name", None) or repr(llm)
+        self.weight = weight
+        self.health_check = health_check
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.current_weight = 0.0
+        self.last_success = 0.0
+        self.breaker: Optional[CircuitBreaker] = None
+
+    def is_healthy(self) -> bool:
+        """Ejected members are those whose circuit is open and not yet due for a trial request"""
+        return self.breaker is None or self.breaker.state != OPEN or self.breaker.time_until_retry() == 0
+
+    def __repr__(self) -> str:
+        return f"PoolMember({self.name})"
+
+
+class _Attempt:
+    """One submission of a request to a member, and when it started running there"""
+
+    def __init__(self, member: PoolMember):
+        self.member = member
+        self.started = threading.Event()
+        self.started_at = 0.0
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.started.set()
+
+
+LEAST_OUTSTANDING = "least_outstanding"
+WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+
+
+class LlmPool:
+    """
+    A set of equivalent LLM backends used as one.
+
+    Each request goes to the healthy backend with the fewest outstanding requests relative
+    to its weight (balance="least_outstanding"), or to the next one in smooth weighted
+    round-robin order (balance="weighted_round_robin").
+
+    Requests are hedged: if the chosen backend has not answered within the pool's
+    hedge_percentile latency of starting on it (time queued for one of the pool's `workers`
+    threads doesn't count), the same request is sent to another backend and whichever
+    answers first wins. The slower request is cancelled if it has not started, and its
+    result discarded otherwise (dazllm calls cannot be interrupted mid-flight).
+
+    Each member has its own circuit breaker. A backend with eject_after retryable failures in
+    a row, or a failed health check, is ejected for ejection_time seconds (doubling, with
+    jitter, while it keeps failing). Members with a health_check are probed every
+    health_interval seconds in the background, which also readmits recovered backends early;
+    a member that has answered a request within the interval is not probed. Probes run in the
+    context of the latest request, so they are traced and counted with the work that prompted them.
+    """
+
+    def __init__(self, llms: list[Any], balance: str = LEAST_OUTSTANDING,
+                 hedge_percentile: float = 0.9, initial_hedge_delay: float = 60.0,
+                 min_hedge_delay: float = 1.0, max_hedges: int = 1, latency_window: int = 200,
+                 min_samples: int = 5, eject_after: int = 3, ejection_time: float = 30.0,
+                 health_interval: float = 10.0, workers: Optional[int] = None):
+        if not llms:
+            raise ValueError("An LlmPool needs at least one backend")
+        if balance not in (LEAST_OUTSTANDING, WEIGHTED_ROUND_ROBIN):
+            raise ValueError(f"Unknown balancing strategy: {balance}")
+        self.members = [llm if isinstance(llm, PoolMember) else PoolMember(llm) for llm in llms]
+        for member in self.members:
+            member.breaker = CircuitBreaker(failure_threshold=eject_after, reset_timeout=ejection_time)
+        self.balance = balance
+        self.health_interval = health_interval
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedges = max_hedges
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers or max(4, 4 * len(self.members)),
+                                            thread_name_prefix="llm-pool")
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self._stop = threading.Event()
+        self._last_context: Optional[contextvars.Context] = None
+        if any(member.health_check for member in self.members):
+            threading.Thread(target=self._health_loop, name="llm-pool-health", daemon=True).start()
+
+    @property
+    def model_name(self) -> str:
+        return ",".join(member.name for member in self.members)
+
+    def chat(self, messages: list[dict[str, str]], **kwargs) -> str:
+        return self._call("chat", messages, **kwargs)
+
+    def chat_structured(self, messages: list[dict[str, str]], model_class: Type[BaseModel], **kwargs) -> BaseModel:
+        return self._call("chat_structured", messages, model_class, **kwargs)
+
+    def hedge_delay(self) -> float:
+        """How long to wait on one backend before hedging - the configured percentile of recent latencies"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.initial_hedge_delay
+        index = min(len(samples) - 1, int(self.hedge_percentile * len(samples)))
+        return max(self.min_hedge_delay, samples[index])
+
+    def _pick(self, exclude: list[PoolMember]) -> Optional[PoolMember]:
+        """
+        Choose a backend not already serving this request, preferring healthy ones, and count
+        the request as outstanding on it straight away, so concurrent picks see it
+        """
+        with self._lock:
+            chosen = self._choose(exclude)
+            if chosen is not None:
+                chosen.outstanding += 1
+            return chosen
+
+    def _choose(self, exclude: list[PoolMember]) -> Optional[PoolMember]:
+        candidates = [m for m in self.members if m not in exclude]
+        if not candidates:
+            return None
+        healthy = [m for m in candidates if m.is_healthy()]
+        if not healthy:
+            # Everything is ejected - try whichever backend is due back soonest
+            return min(candidates, key=lambda m: m.breaker.time_until_retry())
+
+        if self.balance == WEIGHTED_ROUND_ROBIN:
+            total = sum(m.weight for m in healthy)
+            for m in healthy:
+                m.current_weight += m.weight
+            chosen = max(healthy, key=lambda m: m.current_weight)
+            chosen.current_weight -= total
+            return chosen
+
+        # Least outstanding, rotating the starting point so ties spread evenly
+        start = self._next % len(healthy)
+        self._next += 1
+        rotated = healthy[start:] + healthy[:start]
+        return min(rotated, key=lambda m: m.outstanding / m.weight)
+
+    def _release(self, member: PoolMember):
+        with self._lock:
+            member.outstanding -= 1
+
+    def _run(self, attempt: _Attempt, method: str, args: tuple, kwargs: dict) -> Any:
+        """Make a request on the member _pick counted it against"""
+        member = attempt.member
+        attempt.start()
+        with self._lock:
+            member.requests += 1
+        start = attempt.started_at
+        try:
+            with span(member.name, "pool", method=method):
+                result = getattr(member.llm, method)(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                member.failures += 1
+            # Only transport-level failures say anything about the backend's health
+            if is_retryable(e):
+                member.breaker.record_failure()
+            raise
+        finally:
+            self._release(member)
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+            member.last_success = time.monotonic()
+        member.breaker.record_success()
+        return result
+
+    def _submit(self, member: PoolMember, method: str, args: tuple, kwargs: dict) -> tuple[Future, _Attempt]:
+        attempt = _Attempt(member)
+        # Run in a copy of the caller's context so the request is traced (on its own track)
+        future = self._executor.submit(contextvars.copy_context().run, self._run, attempt, method, args, kwargs)
+        # A hedge cancelled before it started never runs, so never releases the member itself
+        future.add_done_callback(lambda f: self._release(member) if f.cancelled() else None)
+        future.add_done_callback(lambda f: attempt.started.set())
+        return future, attempt
+
+    def check_health(self):
+        """Probe every member that has a health check, ejecting failures and readmitting recoveries"""
+        for member in self.members:
+            if not member.health_check or time.monotonic() - member.last_success < self.health_interval:
+                continue
+            try:
+                member.health_check()
+            except Exception:
+                member.breaker.trip()
+            else:
+                member.breaker.reset()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            context = self._last_context
+            if context is None:
+                self.check_health()
+            else:
+                context.run(self.check_health)
+
+    def close(self):
+        """Stop background health checks and release worker threads"""
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def status(self) -> list[dict[str, Any]]:
+        """Per-member load and health, for display"""
+        with self._lock:
+            return [{"name": m.name, "weight": m.weight, "outstanding": m.outstanding,
+                     "requests": m.requests, "failures": m.failures, "healthy": m.is_healthy(),
+                     "circuit": m.breaker.state}
+                    for m in self.members]
+
+    def _call(self, method: str, *args, **kwargs) -> Any:
+        self._last_context = contextvars.copy_context()
+        primary = self._pick([])
+        tried = [primary]
+        futures: dict[Future, _Attempt] = dict([self._submit(primary, method, args, kwargs)])
+        hedges = 0
+        errors: list[BaseException] = []
+
+        while futures:
+            can_hedge = hedges < self.max_hedges and len(tried) < len(self.members)
+            timeout = None
+            if can_hedge:
+                # Time spent queued behind other requests says nothing about the backend, so the
+                # hedge clock starts when the latest attempt starts running
+                latest = list(futures.values())[-1]
+                latest.started.wait()
+                timeout = max(0.0, self.hedge_delay() - (time.monotonic() - latest.started_at))
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # The request is slower than usual - race a duplicate on another backend
+                member = self._pick(tried)
+                tried.append(member)
+                hedges += 1
+                self.hedges_fired += 1
+                futures.update([self._submit(member, method, args, kwargs)])
+                continue
+
+            for future in done:
+                member = futures.pop(future).member
+                if future.exception() is None:
+                    for loser in futures:
+                        loser.cancel()
+                    if member is not primary:
+                        self.hedges_won += 1
+                    return future.result()
+                errors.append(future.exception())
+
+            if not futures and len(tried) < len(self.members) and is_retryable(errors[-1]):
+                # Everything in flight failed - fail over to a backend we have not tried
+                member = self._pick(tried)
+                tried.append(member)
+                futures.update([self._submit(member, method, args, kwargs)])
+
+        raise errors[-1]
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+import contextvars
+import threading
+import time
+
+import pytest
+from pydantic import BaseModel
+
+from llm_pool import LlmPool, PoolMember, WEIGHTED_ROUND_ROBIN
+
+
+class Answer(BaseModel):
+    text: str
+
+
+class FakeBackend:
+    """In-process stand-in for an LLM endpoint"""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False):
+        self.model_name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def chat(self, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.model_name} is down")
+        return f"{self.model_name}: {messages[-1]['content']}"
+
+    def chat_structured(self, messages, model_class, **kwargs):
+        return model_class(text=self.chat(messages, **kwargs))
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+@pytest.fixture
+def make_pool():
+    """Build pools that are closed after the test, so their threads don't outlive it"""
+    pools = []
+
+    def make(*args, **kwargs) -> LlmPool:
+        pool = LlmPool(*args, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_single_backend_passthrough(make_pool):
+    """Test that a one-member pool behaves like the backend itself"""
+    pool = make_pool([FakeBackend("a")])
+    assert pool.chat(MESSAGES) == "a: hello"
+    assert pool.chat_structured(MESSAGES, Answer) == Answer(text="a: hello")
+    assert pool.hedges_fired == 0
+
+
+def test_slow_backend_is_hedged(make_pool):
+    """Test that a stalled backend is raced by a duplicate on another one"""
+    slow = FakeBackend("slow", delay=2.0)
+    fast = FakeBackend("fast", delay=0.01)
+    pool = make_pool([slow, fast], initial_hedge_delay=0.1)
+
+    start = time.monotonic()
+    assert pool.chat(MESSAGES) == "fast: hello"
+    assert time.monotonic() - start < 1.0
+    assert pool.hedges_fired == 1
+    assert pool.hedges_won == 1
+
+
+def test_time_queued_for_a_worker_does_not_count_towards_hedging(make_pool):
+    """Test that a request waiting behind others for a pool thread is not hedged for the wait"""
+    a = FakeBackend("a", delay=0.01)
+    b = FakeBackend("b", delay=0.01)
+    pool = make_pool([a, b], initial_hedge_delay=0.2, workers=1)
+    pool._executor.submit(time.sleep, 0.5)
+
+    assert pool.chat(MESSAGES) in ("a: hello", "b: hello")
+    assert pool.hedges_fired == 0
+    assert a.calls + b.calls == 1
+
+
+def test_no_hedge_when_backend_is_quick(make_pool):
+    """Test that requests finishing inside the hedge delay are not duplicated"""
+    a = FakeBackend("a", delay=0.01)
+    b = FakeBackend("b", delay=0.01)
+    pool = make_pool([a, b], initial_hedge_delay=1.0)
+
+    for _ in range(4):
+        pool.chat(MESSAGES)
+
+    assert pool.hedges_fired == 0
+    assert a.calls + b.calls == 4
+
+
+def test_hedge_delay_follows_latency_percentile(make_pool):
+    """Test that the hedge delay adapts to observed latencies"""
+    pool = make_pool([FakeBackend("a")], hedge_percentile=0.9, initial_hedge_delay=30.0,
+                   min_hedge_delay=0.0, min_samples=5)
+    assert pool.hedge_delay() == 30.0
+
+    pool._latencies.extend([0.1] * 9 + [5.0])
+    assert pool.hedge_delay() == 5.0
+
+    pool._latencies.extend([0.1] * 90)
+    assert pool.hedge_delay() == 0.1
+
+
+def test_failed_backend_fails_over(make_pool):
+    """Test that an erroring backend is replaced by another member"""
+    pool = make_pool([FakeBackend("down", fail=True), FakeBackend("up")], initial_hedge_delay=5.0)
+    assert pool.chat(MESSAGES) == "up: hello"
+
+
+def test_all_backends_failing_raises(make_pool):
+    """Test that the last error is raised when no backend can answer"""
+    pool = make_pool([FakeBackend("a", fail=True), FakeBackend("b", fail=True)])
+    with pytest.raises(ConnectionError):
+        pool.chat(MESSAGES)
+
+
+def test_empty_pool_rejected(make_pool):
+    """Test that a pool needs at least one backend"""
+    with pytest.raises(ValueError):
+        make_pool([])
+
+
+def test_least_outstanding_spreads_concurrent_load(make_pool):
+    """Test that concurrent requests go to idle backends first"""
+    backends = [FakeBackend(name, delay=0.2) for name in ("a", "b", "c")]
+    pool = make_pool(backends, initial_hedge_delay=10.0)
+
+    threads = [threading.Thread(target=pool.chat, args=(MESSAGES,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+    assert [b.calls for b in backends] == [1, 1, 1]
+
+
+def test_picks_count_against_a_member_straight_away(make_pool):
+    """Test that requests not yet running already weigh on the next pick"""
+    heavy, light = PoolMember(FakeBackend("heavy"), weight=2), PoolMember(FakeBackend("light"))
+    pool = make_pool([heavy, light])
+
+    picks = [pool._pick([]) for _ in range(6)]
+
+    assert picks.count(heavy) == 4 and picks.count(light) == 2
+    assert (heavy.outstanding, light.outstanding) == (4, 2)
+
+
+def test_health_checks_skip_members_that_just_answered(make_pool):
+    """Test that a member serving requests is not also probed"""
+    probes = []
+    backend = FakeBackend("busy")
+    pool = make_pool([PoolMember(backend, health_check=lambda: probes.append(1))], health_interval=3600)
+    pool.check_health()
+    pool.chat(MESSAGES)
+    pool.check_health()
+    assert len(probes) == 1
+
+
+def test_background_probes_run_in_the_latest_request_context(make_pool):
+    """Test that probes see the caller's context (the step being tracked), not an empty one"""
+    step = contextvars.ContextVar("step", default=None)
+    probed_in_step = threading.Event()
+
+    def probe():
+        if step.get() == "Write section":
+            probed_in_step.set()
+
+    pool = make_pool([PoolMember(FakeBackend("a"), health_check=probe)], health_interval=0.05)
+    step.set("Write section")
+    pool.chat(MESSAGES)
+
+    assert probed_in_step.wait(2.0)
+
+
+def test_weighted_round_robin_respects_weights(make_pool):
+    """Test that a heavier member gets proportionally more requests"""
+    heavy = FakeBackend("heavy")
+    light = FakeBackend("light")
+    pool = make_pool([PoolMember(heavy, weight=3), PoolMember(light, weight=1)],
+                   balance=WEIGHTED_ROUND_ROBIN)
+
+    for _ in range(8):
+        pool.chat(MESSAGES)
+
+    assert heavy.calls == 6
+    assert light.calls == 2
+
+
+def test_failing_member_is_ejected(make_pool):
+    """Test that repeated failures take a backend out of rotation"""
+    down = FakeBackend("down", fail=True)
+    up = FakeBackend("up")
+    pool = make_pool([down, up], eject_after=2, ejection_time=60.0)
+
+    for _ in range(6):
+        assert pool.chat(MESSAGES) == "up: hello"
+
+    assert down.calls == 2
+    status = {s["name"]: s for s in pool.status()}
+    assert not status["down"]["healthy"]
+    assert status["up"]["healthy"]
+
+
+def test_ejected_member_returns_after_ejection_time(make_pool):
+    """Test that ejection is temporary"""
+    flaky = FakeBackend("flaky", fail=True)
+    pool = make_pool([flaky, FakeBackend("up")], eject_after=1, ejection_time=0.1)
+    pool.chat(MESSAGES)
+    assert not pool.status()[0]["healthy"]
+
+    time.sleep(0.15)
+    flaky.fail = False
+    assert pool.status()[0]["healthy"]
+
+
+def test_health_checks_eject_and_readmit(make_pool):
+    """Test that failed probes eject a member and passing probes bring it back"""
+    server_up = {"value": True}
+
+    def probe():
+        if not server_up["value"]:
+            raise ConnectionError("no response")
+
+    backend = FakeBackend("probed")
+    pool = make_pool([PoolMember(backend, health_check=probe), FakeBackend("other")],
+                   ejection_time=60.0, health_interval=3600)
+    server_up["value"] = False
+    pool.check_health()
+    assert not pool.status()[0]["healthy"]
+    for _ in range(4):
+        pool.chat(MESSAGES)
+    assert backend.calls == 0
+
+    server_up["value"] = True
+    pool.check_health()
+    assert pool.status()[0]["healthy"]
+
+
+def test_all_ejected_still_serves(make_pool):
+    """Test that a pool with every member ejected still tries one"""
+    backend = FakeBackend("only", fail=True)
+    pool = make_pool([backend], eject_after=1, ejection_time=60.0)
+    with pytest.raises(ConnectionError):
+        pool.chat(MESSAGES)
+
+    backend.fail = False
+    assert pool.chat(MESSAGES) == "only: hello"
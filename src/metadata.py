@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
 
-import json
 import os
+import sqlite3
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, List, Dict, Any
+from colorama import Fore, Style
 from pydantic import BaseModel
 from enum import Enum
+from catalog import catalog_for
+from layout import output_root
+from journal import COMPLETED, JOURNAL_FILE, STARTED, Journal, read_events
+from safe_io import atomic_write_json, file_lock, read_json
+from tracing import span
+
+METADATA_FILE = "metadata.json"
+# Rewrite metadata.json once the journal has grown this much since it was last compacted
+COMPACT_BYTES = 1024 * 1024
 
 
 class BookStatus(Enum):
@@ -25,110 +35,133 @@ class BookMetadata(BaseModel):
     updated_at: str
     author: str
     model_name: str
+    image_model: Optional[str] = None
     num_chapters: int
     sections_per_chapter: int
     completed_steps: List[str] = []
+    # Steps kept although their inputs changed after they ran (e.g. sections after a regenerated one)
+    stale_steps: List[str] = []
     current_step: Optional[str] = None
     epub_path: Optional[str] = None
     cover_path: Optional[str] = None
+    journal_offset: int = 0
+    # Directory name of the book this one was forked from, if any
+    forked_from: Optional[str] = None
 
 
-def write_metadata(novel_dir: Path, metadata: BookMetadata):
-    """Write metadata to the novel directory"""
-    metadata_path = novel_dir / "metadata.json"
-    metadata.updated_at = datetime.now().isoformat()
+def write_metadata(novel_dir: Path, metadata: BookMetadata, touch: bool = True):
+    """
+    Write metadata to the novel directory, and note it in the output directory's catalog.
+    Unless touch is False (the book was only moved), it is stamped as updated now.
+    """
+    metadata_path = novel_dir / METADATA_FILE
+    if touch:
+        metadata.updated_at = datetime.now().isoformat()
 
     # Convert to dict and ensure enum values are strings
     data = metadata.model_dump()
     data['status'] = metadata.status.value
 
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    atomic_write_json(metadata_path, data, indent=2)
+
+    # metadata.json is the record; a catalog that misses an update is fixed by rebuilding it
+    try:
+        catalog_for(output_root(novel_dir)).upsert(novel_dir, metadata)
+    except sqlite3.Error as e:
+        print(f"{Fore.YELLOW}⚠️  Book catalog not updated ({e}); run './run catalog-rebuild'{Style.RESET_ALL}")
 
 
 def read_metadata(novel_dir: Path) -> Optional[BookMetadata]:
-    """Read metadata from the novel directory"""
-    metadata_path = novel_dir / "metadata.json"
+    """Read metadata from the novel directory, brought up to date with its step journal"""
+    metadata_path = novel_dir / METADATA_FILE
 
-    if not metadata_path.exists():
+    data = read_json(metadata_path)
+    if data is None:
         return None
-
-    with open(metadata_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        return BookMetadata(**data)
+    metadata = BookMetadata(**data)
+    _apply_journal(novel_dir, metadata)
+    return metadata
+
+
+def _apply_journal(novel_dir: Path, metadata: BookMetadata):
+    """Replay the journal events written since metadata.json was last compacted"""
+    for offset, event in read_events(novel_dir / JOURNAL_FILE, metadata.journal_offset):
+        step = event.get("step")
+        if event.get("event") == STARTED:
+            metadata.current_step = step
+        elif event.get("event") == COMPLETED:
+            if step not in metadata.completed_steps:
+                metadata.completed_steps.append(step)
+            if step in metadata.stale_steps:
+                metadata.stale_steps.remove(step)
+            if metadata.current_step == step:
+                metadata.current_step = None
+        metadata.journal_offset = offset
+
+
+def compact_metadata(novel_dir: Path, journal: Optional[Journal] = None):
+    """Fold the journal into metadata.json, so readers replay only what happened since"""
+    with span("compact metadata", "metadata"), file_lock(novel_dir / METADATA_FILE):
+        metadata = read_metadata(novel_dir)
+        if metadata:
+            write_metadata(novel_dir, metadata)
+    if journal is not None:
+        journal.uncompacted_bytes = 0
 
 
-def update_metadata_step(novel_dir: Path, step_name: str, completed: bool = False):
-    """Update metadata with current/completed step"""
-    metadata = read_metadata(novel_dir)
-    if not metadata:
-        return
+def compact_metadata_if_due(novel_dir: Path, journal: Journal):
+    if journal.uncompacted_bytes >= COMPACT_BYTES:
+        compact_metadata(novel_dir, journal)
 
-    if completed:
-        if step_name not in metadata.completed_steps:
-            metadata.completed_steps.append(step_name)
-        if metadata.current_step == step_name:
-            metadata.current_step = None
-    else:
-        metadata.current_step = step_name
 
-    write_metadata(novel_dir, metadata)
+def update_metadata_step(novel_dir: Path, step_name: str, completed: bool = False,
+                         journal: Optional[Journal] = None):
+    """
+    Update metadata with current/completed step.
+    The change is appended to the novel's journal; metadata.json itself is only rewritten by compaction.
+    """
+    if not (novel_dir / METADATA_FILE).exists():
+        return
+    journal = journal or Journal(novel_dir)
+    with span("update metadata", "metadata", step=step_name, completed=completed):
+        journal.append(COMPLETED if completed else STARTED, step_name)
+    compact_metadata_if_due(novel_dir, journal)
 
 
 def mark_book_finished(novel_dir: Path, epub_path: str, cover_path: str):
     """Mark a book as finished with final paths"""
-    metadata = read_metadata(novel_dir)
-    if not metadata:
-        return
-
-    metadata.status = BookStatus.FINISHED
-    metadata.epub_path = epub_path
-    metadata.cover_path = cover_path
-    metadata.current_step = None
+    with file_lock(novel_dir / METADATA_FILE):
+        metadata = read_metadata(novel_dir)
+        if not metadata:
+            return
 
-    write_metadata(novel_dir, metadata)
+        metadata.status = BookStatus.FINISHED
+        metadata.epub_path = epub_path
+        metadata.cover_path = cover_path
+        metadata.current_step = None
 
+        write_metadata(novel_dir, metadata)
 
-def list_books_by_status(output_dir: Path, status: BookStatus) -> List[Dict[str, Any]]:
-    """List all books with a given status"""
-    books = []
 
+def list_books_by_status(output_dir: Path, status: BookStatus, limit: Optional[int] = None,
+                         offset: int = 0) -> List[Dict[str, Any]]:
+    """List books with a given status, most recently updated first, a page at a time if limit is given"""
     if not output_dir.exists():
-        return books
+        return []
+    return catalog_for(output_dir).books(status.value, limit, offset)
 
-    for novel_dir in output_dir.iterdir():
-        if not novel_dir.is_dir():
-            continue
 
-        metadata = read_metadata(novel_dir)
-        if metadata and metadata.status == status:
-            books.append({
-                "title": metadata.title,
-                "description": metadata.description,
-                "created_at": metadata.created_at,
-                "updated_at": metadata.updated_at,
-                "author": metadata.author,
-                "directory": str(novel_dir),
-                "current_step": metadata.current_step,
-                "completed_steps": len(metadata.completed_steps),
-                "epub_path": metadata.epub_path,
-                "cover_path": metadata.cover_path
-            })
-
-    # Sort by updated_at (most recent first)
-    books.sort(key=lambda x: x["updated_at"], reverse=True)
-
-    return books
+def count_books_by_status(output_dir: Path, status: BookStatus) -> int:
+    if not output_dir.exists():
+        return 0
+    return catalog_for(output_dir).count(status.value)
 
 
 def find_book_dir_by_title(output_dir: Path, title: str) -> Optional[Path]:
-    """Find a book directory by its title"""
-    for novel_dir in output_dir.iterdir():
-        if not novel_dir.is_dir():
-            continue
-
-        metadata = read_metadata(novel_dir)
-        if metadata and metadata.title == title:
-            return novel_dir
-
-    return None
\ No newline at end of file
+    """
+    Find a book directory by its title, or by its directory name. Forks share their parent's
+    title, so the original book is preferred; a fork is found by its directory name.
+    """
+    if not output_dir.exists():
+        return None
+    return catalog_for(output_dir).find(title)
\ No newline at end of file
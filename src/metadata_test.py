@@ -186,4 +186,46 @@ def test_find_book_dir_by_title():
 
         # Try to find non-existent book
         not_found = find_book_dir_by_title(output_dir, "Non-existent")
-        assert not_found is None
\ No newline at end of file
+        assert not_found is None
+
+def test_read_metadata_quarantines_corrupt_file():
+    """Test that truncated metadata is treated as missing rather than crashing listings"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output_dir = Path(tmpdir)
+        novel_dir = output_dir / "broken_novel"
+        novel_dir.mkdir()
+        (novel_dir / "metadata.json").write_text('{"title": "Broken', encoding='utf-8')
+
+        assert read_metadata(novel_dir) is None
+        assert list(novel_dir.glob("metadata.json.corrupt-*"))
+        assert list_books_by_status(output_dir, BookStatus.ONGOING) == []
+
+
+def test_metadata_is_a_compacted_view_of_the_journal(monkeypatch):
+    """Test that step updates go to the journal and are folded into metadata.json on compaction"""
+    import metadata
+    with tempfile.TemporaryDirectory() as tmpdir:
+        novel_dir = Path(tmpdir) / "journal_novel"
+        novel_dir.mkdir()
+        write_metadata(novel_dir, BookMetadata(
+            title="Journal Novel", description="d", status=BookStatus.ONGOING,
+            created_at=datetime.now().isoformat(), updated_at=datetime.now().isoformat(),
+            author="a", model_name="m", num_chapters=1, sections_per_chapter=1))
+        snapshot = (novel_dir / "metadata.json").read_text()
+
+        for n in range(3):
+            update_metadata_step(novel_dir, f"Step {n}", completed=False)
+            update_metadata_step(novel_dir, f"Step {n}", completed=True)
+
+        # metadata.json is untouched, but reads see every step
+        assert (novel_dir / "metadata.json").read_text() == snapshot
+        assert read_metadata(novel_dir).completed_steps == ["Step 0", "Step 1", "Step 2"]
+
+        # Once the journal has grown enough, the view is compacted
+        monkeypatch.setattr(metadata, "COMPACT_BYTES", 1)
+        update_metadata_step(novel_dir, "Step 3", completed=False)
+        with open(novel_dir / "metadata.json") as f:
+            data = json.load(f)
+        assert data["completed_steps"] == ["Step 0", "Step 1", "Step 2"]
+        assert data["current_step"] == "Step 3"
+        assert data["journal_offset"] == (novel_dir / "journal.jsonl").stat().st_size
@@ -1,74 +1,202 @@
 #!/usr/bin/env python3
 
+import contextvars
 import sys
 import os
 from pathlib import Path
+from typing import Any, Iterable, Optional
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(os.path.expanduser('~/src/dazllm'))
 
 from brain import Brain
-from dazllm import Llm
+from backends import model_named
+from rate_limit import default_rate_limiter
 
 # Import our clean, tested modules
-from record import record, reset_novel_dir, set_continue_mode, set_novel_dir
-from generate_title import generate_title
-from generate_cover import generate_cover
-from determine_plot_type import determine_plot_type
-from select_themes import select_themes
-from create_characters import create_characters
-from create_outline import create_outline
-from add_humor_and_romance import add_humor_and_romance
-from define_writing_style import define_writing_style
-from break_into_chapters import break_into_chapters
-from break_into_sections import break_into_sections
-from write_section import write_section
-from epub_generator import create_epub
-from metadata import BookMetadata, BookStatus, write_metadata, read_metadata, mark_book_finished
+from journal import Journal
+from record import print_skipped, record
+from layout import output_root
+from session import NovelSession, novel_dir_for
+from steps import content_hash, register_step
+from generate_title import Title, generate_title
+from generate_cover import IMAGE_MODEL, CoverResult, generate_cover
+from determine_plot_type import PlotType, determine_plot_type
+from select_themes import ThemeSelection, select_themes
+from create_characters import CharactersList, create_characters
+from create_outline import Outline, create_outline
+from add_humor_and_romance import EnhancedOutline, add_humor_and_romance
+from define_writing_style import WritingStyle, define_writing_style
+from break_into_chapters import ChapterPlan, break_into_chapters
+from break_into_sections import SectionPlan, break_into_sections
+from write_section import PREVIOUS_TEXT_CHARS, SectionResult, write_section
+from epub_generator import EpubResult, create_epub
+from tracing import TRACE_FILE, start_trace
+from metadata import BookMetadata, BookStatus, read_metadata, write_metadata
 from datetime import datetime
 
+SECTION_STEP = r"Write Chapter \d+, Section \d+"
+
+
+def section_step(chapter_num: int, section_num: int) -> str:
+    """Name of the step that writes a section"""
+    return f"Write Chapter {chapter_num}, Section {section_num}"
+
+
+def _section_carry(story_hash: str, result: SectionResult) -> dict[str, Any]:
+    """What a section carries forward: the story hash after it, its own hash and its new facts"""
+    section_hash = content_hash(result)
+    return {"story": content_hash((story_hash, section_hash)), "hash": section_hash, "facts": result.new_facts}
+
+
+def _story_tail(journal: Journal, previous_text: str, steps: list[str]) -> str:
+    """previous_text followed by the sections of steps, cut to the tail a section sees, reading as few as it takes"""
+    tail = ""
+    for step in reversed(steps):
+        tail = "\n\n" + journal.result(step)["text"] + tail
+        if len(tail) >= PREVIOUS_TEXT_CHARS:
+            return tail[-PREVIOUS_TEXT_CHARS:]
+    return (previous_text + tail)[-PREVIOUS_TEXT_CHARS:]
+
+
+# The result model of every step, so continue mode gets typed results back from the journal
+register_step("Generate a title", Title)
+register_step("Generate cover image", CoverResult)
+register_step("Determine plot type", PlotType)
+register_step("Select themes", ThemeSelection)
+register_step("Create characters", CharactersList)
+register_step("Create outline", Outline)
+register_step("Add humor and romance", EnhancedOutline)
+register_step("Define writing style", WritingStyle)
+register_step(r"Break into \d+ chapters", ChapterPlan)
+register_step(r"Break Chapter \d+ into \d+ sections", SectionPlan)
+register_step(SECTION_STEP, SectionResult)
+register_step("Create EPUB", EpubResult)
 
 def write_novel(description: str, output_dir: Path, model_name: str = "ollama:gpt-oss:20b",
                 num_chapters: int = 10, sections_per_chapter: int = 10, author: str = "Darren Oakey",
-                continue_novel_dir: Path = None) -> Path:
+                continue_novel_dir: Path = None, image_model: str = IMAGE_MODEL,
+                brain: Optional[Brain] = None, rerun: Iterable[str] = (),
+                keep_stale: Optional[str] = None) -> Path:
     """
     Generate a complete novel using a clean, linear pipeline.
     Each step is recorded and displayed with progress tracking.
     Can continue from a previous incomplete novel generation.
+
+    All per-novel state lives in this call (its session, trace and usage tracking run in a
+    copy of the caller's context), so several novels can be written at once on different
+    threads. Pass the same brain to each to share its cache, limiter and connections; by
+    default each call gets its own, caching under output_dir/cache.
+
+    When continuing, the steps in rerun are run again with fresh answers rather than ones
+    from the response cache, and steps matching the keep_stale pattern keep their results
+    even if their inputs have changed (see NovelSession).
+    """
+    return contextvars.copy_context().run(
+        _write_novel, description, output_dir, model_name, num_chapters, sections_per_chapter,
+        author, continue_novel_dir, image_model, brain, rerun, keep_stale)
+
+
+def regenerate_section(novel_dir: Path, chapter_num: int, section_num: int, downstream: bool = False,
+                       output_dir: Optional[Path] = None, brain: Optional[Brain] = None) -> EpubResult:
+    """
+    Write one section of a book again and rebuild its EPUB. The facts the book carries
+    forward are recomputed from the new section. Later sections were written from the old
+    facts and text: with downstream they are rewritten too, otherwise they are kept and
+    flagged in the metadata's stale_steps. Only finished books can have a section regenerated:
+    on an unfinished one this would write the rest of the book too, which is what continuing is for.
+    """
+    step = section_step(chapter_num, section_num)
+    metadata = read_metadata(novel_dir)
+    if metadata is None or metadata.status != BookStatus.FINISHED:
+        raise ValueError(f"'{Path(novel_dir).name}' is not finished - continue it before regenerating a section")
+    if Journal(novel_dir).result(step) is None:
+        raise ValueError(f"'{Path(novel_dir).name}' has no recorded '{step}'")
+    return write_novel("", output_dir or output_root(novel_dir), continue_novel_dir=novel_dir, brain=brain,
+                       rerun=[step], keep_stale=None if downstream else SECTION_STEP)
+
+
+def fork_novel(novel_dir: Path, from_step: str, model_name: Optional[str] = None,
+               output_dir: Optional[Path] = None, brain: Optional[Brain] = None) -> EpubResult:
     """
+    Write a variant of a book: a new book in a directory of its own that keeps every step
+    completed before from_step and writes from_step onwards again, with model_name if given.
+    The kept steps are not copied - the fork's journal refers to its parent's - and the
+    parent's cover and unchanged chapters are reused for its EPUB.
+    """
+    novel_dir = Path(novel_dir)
+    output_dir = Path(output_dir or output_root(novel_dir))
+    metadata = read_metadata(novel_dir)
+    if metadata is None:
+        raise ValueError(f"'{novel_dir.name}' is not a book")
+    model_name = model_name or metadata.model_name
+
+    fork_dir = novel_dir_for(output_dir, f"{novel_dir.name} {model_name}")
+    copy = 1
+    while fork_dir.exists():
+        copy += 1
+        fork_dir = novel_dir_for(output_dir, f"{novel_dir.name} {model_name} {copy}")
+    fork_dir.mkdir(parents=True)
+    journal = Journal(fork_dir)
+    try:
+        inherited = journal.fork(Journal(novel_dir), from_step)
+    except ValueError:
+        fork_dir.rmdir()
+        raise
+
+    write_metadata(fork_dir, metadata.model_copy(update={
+        "status": BookStatus.ONGOING,
+        "created_at": datetime.now().isoformat(),
+        "model_name": model_name,
+        "completed_steps": inherited,
+        "stale_steps": [],
+        "current_step": None,
+        "epub_path": None,
+        "cover_path": None,
+        "journal_offset": journal.end_offset(),
+        "forked_from": novel_dir.name,
+    }))
+    return write_novel("", output_dir, continue_novel_dir=fork_dir, brain=brain, rerun=[from_step])
+
+
+def _write_novel(description: str, output_dir: Path, model_name: str, num_chapters: int,
+                 sections_per_chapter: int, author: str, continue_novel_dir: Optional[Path],
+                 image_model: str, brain: Optional[Brain], rerun: Iterable[str],
+                 keep_stale: Optional[str]) -> Path:
+    # Trace the run into the novel's directory (held in memory until the title is known)
+    start_trace(continue_novel_dir / TRACE_FILE if continue_novel_dir else None)
 
     # Handle continue mode
     if continue_novel_dir:
-        set_continue_mode(True)
-        set_novel_dir(continue_novel_dir)
-        metadata = read_metadata(continue_novel_dir)
+        session = NovelSession.resume(continue_novel_dir, output_dir, rerun=rerun, keep_stale=keep_stale)
+        metadata = session.metadata
         if metadata:
             description = metadata.description
             model_name = metadata.model_name
             num_chapters = metadata.num_chapters
             sections_per_chapter = metadata.sections_per_chapter
             author = metadata.author
+            image_model = metadata.image_model or image_model
     else:
-        # Reset the novel directory state for this new novel
-        reset_novel_dir()
+        # A fresh session for this new novel
+        session = NovelSession(output_dir)
     
     # Initialize the brain
-    llm = Llm.model_named(model_name)
-    brain = Brain(llm)
+    if brain is None:
+        # Pool health checks share the budget Brain's calls are paced by
+        brain = Brain(model_named(model_name, default_rate_limiter(output_dir)), output_dir, rate_key=model_name)
     
     # Linear pipeline - each line is clear and testable
     # Use lambdas for all steps to enable skipping in continue mode
     title = record("Generate a title", None,
-                  lambda: generate_title(brain, description), output_dir)
+                  lambda: generate_title(brain, description), session=session,
+                  inputs=description)
 
     # Create metadata immediately after getting the title
+    title_str = title.title
     if not continue_novel_dir:
-        # Handle both object and dict formats
-        title_str = title.title if hasattr(title, 'title') else title.get('title', title)
-        novel_dir = output_dir / title_str.replace(' ', '_').replace(':', '_')
-        novel_dir.mkdir(exist_ok=True)
-        metadata = BookMetadata(
+        session.start(BookMetadata(
             title=title_str,
             description=description,
             status=BookStatus.ONGOING,
@@ -76,48 +204,49 @@ def write_novel(description: str, output_dir: Path, model_name: str = "ollama:gp
             updated_at=datetime.now().isoformat(),
             author=author,
             model_name=model_name,
+            image_model=image_model,
             num_chapters=num_chapters,
             sections_per_chapter=sections_per_chapter
-        )
-        write_metadata(novel_dir, metadata)
+        ))
 
     # Generate cover immediately after title for early visual feedback
-    # Generate cover immediately after title for early visual feedback
-    title_str = title.title if hasattr(title, 'title') else title.get('title', title)
     cover = record("Generate cover image", title,
-                  lambda: generate_cover(title_str, author, output_dir), output_dir)
+                  lambda: generate_cover(title_str, author, output_dir, image_model=image_model,
+                                         novel_dir=session.dir_for()), session=session,
+                  inputs=(title, author, image_model))
 
     plot_type = record("Determine plot type", title,
-                      lambda: determine_plot_type(brain, description), output_dir)
+                      lambda: determine_plot_type(brain, description), session=session,
+                      inputs=description)
 
-    # Handle both object and dict formats for plot_type
-    plot_type_value = plot_type.plot_type.value if hasattr(plot_type, 'plot_type') else plot_type.get('plot_type', plot_type)
+    plot_type_value = plot_type.plot_type.value
     themes = record("Select themes", plot_type,
-                   lambda: select_themes(brain, description, plot_type_value), output_dir)
+                   lambda: select_themes(brain, description, plot_type_value), session=session,
+                   inputs=(description, plot_type))
     
-    # Handle both object and dict formats for themes
-    theme_values = [t.value for t in themes.themes] if hasattr(themes, 'themes') else themes.get('themes', [])
+    theme_values = [t.value for t in themes.themes]
     characters = record("Create characters", themes,
                        lambda: create_characters(brain, description, plot_type_value,
-                                       theme_values), output_dir)
+                                       theme_values), session=session,
+                       inputs=(description, plot_type, themes))
     
-    # Handle both object and dict formats for characters
-    chars = characters.characters if hasattr(characters, 'characters') else characters.get('characters', [])
+    chars = characters.characters
     outline = record("Create outline", characters,
                     lambda: create_outline(brain, description, plot_type_value,
                                  theme_values, chars,
-                                 num_chapters, sections_per_chapter), output_dir)
+                                 num_chapters, sections_per_chapter), session=session,
+                    inputs=(description, plot_type, themes, characters, num_chapters, sections_per_chapter))
     
-    # Handle both object and dict formats for outline
-    outline_text = outline.outline if hasattr(outline, 'outline') else outline.get('outline', outline)
+    outline_text = outline.outline
     enhanced_outline = record("Add humor and romance", outline,
-                            lambda: add_humor_and_romance(brain, outline_text), output_dir)
+                            lambda: add_humor_and_romance(brain, outline_text), session=session,
+                            inputs=outline)
     
-    # Handle both object and dict formats for enhanced_outline
-    enhanced_text = enhanced_outline.outline if hasattr(enhanced_outline, 'outline') else enhanced_outline.get('outline', enhanced_outline)
+    enhanced_text = enhanced_outline.outline
     writing_style = record("Define writing style", enhanced_outline,
                          lambda: define_writing_style(brain, enhanced_text,
-                                            theme_values), output_dir)
+                                            theme_values), session=session,
+                         inputs=(enhanced_outline, themes))
     
     chapters = record(f"Break into {num_chapters} chapters", writing_style,
                      lambda: break_into_chapters(brain, enhanced_text,
@@ -125,56 +254,83 @@ def write_novel(description: str, output_dir: Path, model_name: str = "ollama:gp
                                        theme_values,
                                        plot_type_value,
                                        enhanced_text,
-                                       num_chapters), output_dir)
+                                       num_chapters), session=session,
+                     inputs=(enhanced_outline, characters, themes, plot_type, num_chapters))
     
-    # Write all the sections
-    all_text = ""
+    # Write all the sections. Only the tail of the story so far is kept, as that is all a
+    # section sees; the EPUB reads each section's text back from the journal when it renders it.
+    # story_hash chains every section written so far, standing in for the text and facts it
+    # carries forward: change one section and every later one sees different inputs.
+    # When continuing, a section already written from the same inputs is taken from its carry
+    # without reading it; the tail is only read back, from the last of them, if a section is written.
+    previous_text = ""
+    unread_sections: list[str] = []
     facts = []
+    story_hash = ""
     content_by_chapter = {}
+    chapter_hashes = {}
     
-    # Handle both object and dict formats for chapters
-    chapter_list = chapters.chapters if hasattr(chapters, 'chapters') else chapters.get('chapters', [])
+    chapter_list = chapters.chapters
     for chapter in chapter_list:
-        chapter_num = chapter.number if hasattr(chapter, 'number') else chapter.get('number')
+        chapter_num = chapter.number
         content_by_chapter[chapter_num] = {}
+        section_hashes = []
 
         # Break this chapter into sections
         section_plan = record(f"Break Chapter {chapter_num} into {sections_per_chapter} sections", chapter,
-                             lambda ch=chapter: break_into_sections(brain, ch, sections_per_chapter), output_dir)
-
-        # Handle both object and dict formats for sections
-        section_list = section_plan.sections if hasattr(section_plan, 'sections') else section_plan.get('sections', [])
+                             lambda ch=chapter: break_into_sections(brain, ch, sections_per_chapter), session=session,
+                             inputs=(chapter, sections_per_chapter))
 
         # Write each section
-        for section in section_list:
-            section_num = section.number if hasattr(section, 'number') else section.get('number')
-            section_result = record(f"Write Chapter {chapter_num}, Section {section_num}",
-                                  (chapter, section, all_text, facts),
-                                  lambda ch=chapter, sec=section, txt=all_text, f=facts, ws=writing_style: write_section(brain, ch, sec, txt, f, ws),
-                                  output_dir)
+        for section in section_plan.sections:
+            section_num = section.number
+            step = section_step(chapter_num, section_num)
+            inputs = (chapter, section, writing_style, story_hash)
+            carried = session.completed_carry(step, content_hash(inputs))
+            if carried is not None:
+                print_skipped(step)
+                unread_sections.append(step)
+            else:
+                if unread_sections:
+                    previous_text = _story_tail(session.journal(), previous_text, unread_sections)
+                    unread_sections = []
+                section_result = record(step,
+                                      (chapter, section, previous_text, facts),
+                                      lambda ch=chapter, sec=section, txt=previous_text, f=facts, ws=writing_style: write_section(brain, ch, sec, txt, f, ws),
+                                      session=session, inputs=inputs,
+                                      carry=lambda result, before=story_hash: _section_carry(before, result))
+                carried = _section_carry(story_hash, section_result)
+                previous_text = (previous_text + "\n\n" + section_result.text)[-PREVIOUS_TEXT_CHARS:]
 
             # Update state for next section
-            section_text = section_result.text if hasattr(section_result, 'text') else section_result.get('text', '')
-            new_facts = section_result.new_facts if hasattr(section_result, 'new_facts') else section_result.get('new_facts', [])
-            all_text += "\n\n" + section_text
-            facts.extend(new_facts)
-            content_by_chapter[chapter_num][section_num] = section_text
-    
-    # Create the final EPUB
-    # Convert chapters to dict format if needed
-    chapters_data = [ch.model_dump() if hasattr(ch, 'model_dump') else ch for ch in chapter_list]
+            facts.extend(carried["facts"])
+            section_hashes.append(carried["hash"])
+            story_hash = carried["story"]
+            content_by_chapter[chapter_num][section_num] = session.journal().loader(step, "text")
+
+        # What the chapter renders from, so a rebuilt EPUB can reuse the chapters that did not change
+        chapter_hashes[chapter_num] = content_hash((chapter, len(chapter_list), section_hashes))
+
+        # A finished chapter is worth showing in the book's metadata straight away
+        session.flush()
+    
+    # Create the final EPUB, reusing what it can of the last one if the book is being reworked
+    chapters_data = [ch.model_dump() for ch in chapter_list]
     epub_result = record("Create EPUB", content_by_chapter,
                         lambda: create_epub(title_str, author,
                                   chapters_data,
                                   content_by_chapter, output_dir,
                                   theme_values,
-                                  plot_type_value), output_dir)
+                                  plot_type_value,
+                                  image_model=image_model,
+                                  chapter_hashes=chapter_hashes,
+                                  previous=session.recorded_result("Create EPUB", from_parent=True) if continue_novel_dir else None,
+                                  novel_dir=session.dir_for()),
+                        session=session,
+                        inputs=(title_str, author, chapters_data, story_hash, theme_values, plot_type_value, image_model))
 
     # Mark the book as finished
-    novel_dir = output_dir / title_str.replace(' ', '_').replace(':', '_')
-    epub_path = epub_result.epub_path if hasattr(epub_result, 'epub_path') else epub_result.get('epub_path', '')
-    cover_path = cover.cover_path if hasattr(cover, 'cover_path') else cover.get('cover_path', '')
-    mark_book_finished(novel_dir, epub_path, cover_path)
+    session.finish(epub_result.epub_path, epub_result.cover_path)
 
     return epub_result
 
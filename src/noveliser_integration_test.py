@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
 
 import tempfile
+from collections import Counter
+import pytest
+from datetime import datetime
 from pathlib import Path
-from noveliser import write_novel
-import json
+from concurrent.futures import ThreadPoolExecutor
+from backends import model_named
+from brain import Brain
+from journal import Journal, read_events
+from layout import Layout, load_layout, migrate_layout
+from safe_io import atomic_write_json
+from metadata import BookStatus, find_book_dir_by_title, read_metadata, write_metadata
+from noveliser import fork_novel, regenerate_section, write_novel
+from tracing import current_tracer, read_trace
+from usage import read_usage
 
 
 def test_multi_chapter_novel():
@@ -38,16 +49,11 @@ def test_multi_chapter_novel():
             novel_dir = novel_dirs[0]
             print(f"\nNovel directory: {novel_dir.name}")
             
-            # Check break_into_N_chapters.json 
-            break_files = list(novel_dir.glob("break_into_*_chapters.json"))
-            if not break_files:
-                raise Exception("No break_into_chapters file found")
-            break_file = break_files[0]
-            if not break_file.exists():
-                raise Exception("break_into_chapters.json not found")
-            
-            with open(break_file) as f:
-                chapters_data = json.load(f)
+            # Check the chapter plan in the step journal
+            results = Journal(novel_dir).results()
+            chapters_data = results.get("Break into 2 chapters")
+            if chapters_data is None:
+                raise Exception("Break into 2 chapters not found in journal")
             
             chapters = chapters_data.get('chapters', [])
             print(f"\nPlanned chapters: {len(chapters)}")
@@ -61,26 +67,25 @@ def test_multi_chapter_novel():
                 if len(sections) != 2:
                     raise Exception(f"Chapter {ch['number']} has {len(sections)} sections, expected 2")
             
-            # Check that all section files were written
-            expected_files = [
-                "write_chapter_1,_section_1.json",
-                "write_chapter_1,_section_2.json", 
-                "write_chapter_2,_section_1.json",
-                "write_chapter_2,_section_2.json"
+            # Check that all sections were written
+            expected_steps = [
+                "Write Chapter 1, Section 1",
+                "Write Chapter 1, Section 2",
+                "Write Chapter 2, Section 1",
+                "Write Chapter 2, Section 2"
             ]
             
-            print(f"\nChecking for section files...")
-            missing_files = []
-            for expected_file in expected_files:
-                file_path = novel_dir / expected_file
-                if file_path.exists():
-                    print(f"  ✓ {expected_file}")
+            print(f"\nChecking for sections...")
+            missing_steps = []
+            for expected_step in expected_steps:
+                if expected_step in results:
+                    print(f"  ✓ {expected_step}")
                 else:
-                    print(f"  ✗ {expected_file} - MISSING")
-                    missing_files.append(expected_file)
+                    print(f"  ✗ {expected_step} - MISSING")
+                    missing_steps.append(expected_step)
             
-            if missing_files:
-                print(f"\nFAILED: Missing section files: {missing_files}")
+            if missing_steps:
+                print(f"\nFAILED: Missing sections: {missing_steps}")
                 return False
             
             print(f"\n✅ SUCCESS: Novel generated with 2 chapters, 2 sections each!")
@@ -93,6 +98,279 @@ def test_multi_chapter_novel():
             return False
 
 
+def test_offline_novel_with_fake_backend(tmp_path):
+    """The whole pipeline, cover and EPUB included, runs offline against the fake backend"""
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+
+    result = write_novel(
+        description="A simple detective story about solving a mystery",
+        output_dir=output_dir,
+        model_name="fake",
+        num_chapters=2,
+        sections_per_chapter=2,
+        author="Test Author",
+        image_model="fake"
+    )
+
+    assert Path(result.epub_path).exists()
+    assert Path(result.cover_path).exists()
+    novel_dir = Path(result.cover_path).parent
+    results = Journal(novel_dir).results()
+    for chapter in (1, 2):
+        for section in (1, 2):
+            assert results[f"Write Chapter {chapter}, Section {section}"]["text"]
+
+
+
+def test_concurrent_novels_share_one_brain(tmp_path):
+    """Several novels written at once on a thread pool keep their state apart"""
+    output_dir = tmp_path / "output"
+    brain = Brain(model_named("fake:words=50"), output_dir, cache_dir=tmp_path / "shared-cache")
+    descriptions = [f"Story {n}: a keeper of lighthouse number {n}" for n in range(4)]
+
+    def write(description):
+        return write_novel(description, output_dir, model_name="fake:words=50", num_chapters=2,
+                           sections_per_chapter=2, author="Test Author", image_model="fake", brain=brain)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(write, descriptions))
+
+    novel_dirs = {Path(result.cover_path).parent for result in results}
+    assert len(novel_dirs) == 4
+    for novel_dir in novel_dirs:
+        results = Journal(novel_dir).results()
+        assert len([step for step in results if step.startswith("Write Chapter")]) == 4
+        steps = [event["name"] for event in read_trace(novel_dir / "trace.json") if event.get("cat") == "step"]
+        assert steps.count("Generate a title") == 1
+    assert (tmp_path / "shared-cache").exists()
+    assert not (output_dir / "cache").exists()
+    # Nothing leaks into the caller's context
+    assert current_tracer() is None
+
+
+
+def test_offline_novel_resumes_from_its_journal(tmp_path):
+    """A novel interrupted part-way continues from typed journal results"""
+    output_dir = tmp_path / "output"
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake",
+                        num_chapters=2, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+
+    # Cut the journal off just before the second chapter's sections were written
+    journal_path = novel_dir / "journal.jsonl"
+    lines = journal_path.read_text().splitlines(keepends=True)
+    cut = next(i for i, line in enumerate(lines) if '"step":"Write Chapter 2, Section 1"' in line)
+    journal_path.write_text("".join(lines[:cut]))
+    metadata = read_metadata(novel_dir)
+    metadata.status = BookStatus.ONGOING
+    metadata.journal_offset = 0
+    metadata.completed_steps = []
+    write_metadata(novel_dir, metadata)
+
+    resumed = write_novel("", output_dir, continue_novel_dir=novel_dir)
+
+    assert resumed.epub_path == first.epub_path
+    assert read_metadata(novel_dir).status == BookStatus.FINISHED
+    assert "Write Chapter 2, Section 2" in Journal(novel_dir).results()
+
+
+def test_resume_reads_only_the_last_written_section(tmp_path, monkeypatch):
+    """Resuming takes earlier sections' facts and hashes from the journal index, reading back only the story's tail"""
+    output_dir = tmp_path / "output"
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake:words=500",
+                        num_chapters=2, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+    last_section = Journal(novel_dir).result("Write Chapter 2, Section 2")
+
+    journal_path = novel_dir / "journal.jsonl"
+    lines = journal_path.read_text().splitlines(keepends=True)
+    cut = next(i for i, line in enumerate(lines) if '"step":"Write Chapter 2, Section 2"' in line)
+    journal_path.write_text("".join(lines[:cut]))
+    metadata = read_metadata(novel_dir)
+    metadata.status = BookStatus.ONGOING
+    metadata.journal_offset = 0
+    write_metadata(novel_dir, metadata)
+
+    reads = []
+    read_result = Journal._read_result
+    monkeypatch.setattr(Journal, "_read_result", lambda self, step: reads.append(step) or read_result(self, step))
+    write_novel("", output_dir, continue_novel_dir=novel_dir)
+
+    # The tail and the EPUB read the last written section; the EPUB reads the rest
+    assert Counter(step for step in reads if step.startswith("Write Chapter")) == {
+        "Write Chapter 1, Section 1": 1, "Write Chapter 1, Section 2": 1,
+        "Write Chapter 2, Section 1": 2, "Write Chapter 2, Section 2": 1}
+    # Same tail and facts, so the same prompt and the same section as before
+    assert Journal(novel_dir).result("Write Chapter 2, Section 2") == last_section
+    assert read_metadata(novel_dir).status == BookStatus.FINISHED
+
+
+
+def _completions(novel_dir):
+    return [event["step"] for _, event in read_events(novel_dir / "journal.jsonl")
+            if event["event"] == "completed" and "result" in event]
+
+
+def test_continuing_reruns_only_what_an_edit_affects(tmp_path):
+    """Editing a recorded section re-writes the sections after it and the EPUB, and nothing else"""
+    output_dir = tmp_path / "output"
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake",
+                        num_chapters=2, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+
+    # Hand-edit chapter 1, section 2, as it would be if its text were fixed up
+    journal = Journal(novel_dir)
+    edited = dict(journal.result("Write Chapter 1, Section 2"), text="An edited section.")
+    journal.completed("Write Chapter 1, Section 2", edited, journal.inputs("Write Chapter 1, Section 2"))
+
+    write_novel("", output_dir, continue_novel_dir=novel_dir)
+
+    completions = _completions(novel_dir)
+    assert completions.count("Create outline") == 1
+    assert completions.count("Write Chapter 1, Section 1") == 1
+    assert completions.count("Write Chapter 1, Section 2") == 2
+    assert completions.count("Write Chapter 2, Section 1") == 2
+    assert completions.count("Write Chapter 2, Section 2") == 2
+    assert completions.count("Create EPUB") == 2
+
+
+
+def test_regenerating_a_section_flags_later_ones(tmp_path):
+    """Regenerating one section keeps the later ones, flagged stale, and rebuilds the EPUB from them"""
+    from ebooklib import epub
+    output_dir = tmp_path / "output"
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake",
+                        num_chapters=2, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+    chapter_2 = epub.read_epub(first.epub_path, {"ignore_ncx": True}).get_item_with_href("chapter_2.xhtml")
+
+    # A different model writes a different section, as a live model would on a second try
+    brain = Brain(model_named("fake:words=30"), output_dir)
+    regenerate_section(novel_dir, 1, 2, brain=brain)
+
+    completions = _completions(novel_dir)
+    assert completions.count("Write Chapter 1, Section 1") == 1
+    assert completions.count("Write Chapter 1, Section 2") == 2
+    assert completions.count("Write Chapter 2, Section 1") == 1
+    assert completions.count("Create EPUB") == 2
+    assert read_metadata(novel_dir).stale_steps == ["Write Chapter 2, Section 1", "Write Chapter 2, Section 2"]
+
+    # Chapter 2 did not change, so the rebuilt EPUB carries it over as it was
+    rebuilt = epub.read_epub(first.epub_path, {"ignore_ncx": True})
+    assert rebuilt.get_item_with_href("chapter_2.xhtml").get_body_content() == chapter_2.get_body_content()
+    new_text = Journal(novel_dir).result("Write Chapter 1, Section 2")["text"]
+    assert new_text.split("\n\n")[0].strip().encode() in rebuilt.get_item_with_href("chapter_1.xhtml").get_body_content()
+
+    # Continuing rewrites the stale sections from the new text
+    write_novel("", output_dir, continue_novel_dir=novel_dir, brain=brain)
+    assert _completions(novel_dir).count("Write Chapter 2, Section 2") == 2
+    assert read_metadata(novel_dir).stale_steps == []
+
+
+def test_regenerating_downstream_rewrites_later_sections(tmp_path):
+    """With downstream, every section after the regenerated one is rewritten straight away"""
+    output_dir = tmp_path / "output"
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake",
+                        num_chapters=2, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+
+    brain = Brain(model_named("fake:words=30"), output_dir)
+    regenerate_section(novel_dir, 2, 1, downstream=True, brain=brain)
+
+    completions = _completions(novel_dir)
+    assert completions.count("Write Chapter 1, Section 2") == 1
+    assert completions.count("Write Chapter 2, Section 1") == 2
+    assert completions.count("Write Chapter 2, Section 2") == 2
+    assert read_metadata(novel_dir).stale_steps == []
+
+    with pytest.raises(ValueError):
+        regenerate_section(novel_dir, 3, 1, brain=brain)
+
+
+def test_regenerating_a_section_of_an_unfinished_book_is_refused(tmp_path):
+    """Regenerating a section does not quietly write the rest of an unfinished book"""
+    output_dir = tmp_path / "output"
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake",
+                        num_chapters=2, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+    journal_path = novel_dir / "journal.jsonl"
+    lines = journal_path.read_text().splitlines(keepends=True)
+    cut = next(i for i, line in enumerate(lines) if '"step":"Write Chapter 2, Section 1"' in line)
+    journal_path.write_text("".join(lines[:cut]))
+    metadata = read_metadata(novel_dir)
+    metadata.status = BookStatus.ONGOING
+    metadata.journal_offset = 0
+    write_metadata(novel_dir, metadata)
+    written = journal_path.read_bytes()
+
+    with pytest.raises(ValueError, match="not finished"):
+        regenerate_section(novel_dir, 1, 1, brain=Brain(model_named("fake:words=30"), output_dir))
+
+    assert journal_path.read_bytes() == written
+    assert read_metadata(novel_dir).status == BookStatus.ONGOING
+
+
+
+def test_fork_shares_steps_up_to_its_branch_point(tmp_path):
+    """A fork keeps its parent's steps before the branch point and writes its own from there"""
+    output_dir = tmp_path / "output"
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake",
+                        num_chapters=2, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+    parent_journal = (novel_dir / "journal.jsonl").read_bytes()
+
+    forked = fork_novel(novel_dir, "Define writing style", model_name="fake:words=30")
+
+    fork_dir = output_dir / Path(forked.epub_path).stem
+    assert forked.epub_path != first.epub_path and Path(first.epub_path).exists()
+    assert forked.cover_path == first.cover_path
+    assert (novel_dir / "journal.jsonl").read_bytes() == parent_journal
+    # Only the fork's own steps are in its journal; the rest are read from the parent's
+    completions = _completions(fork_dir)
+    assert "Create outline" not in completions and "Define writing style" in completions
+    assert Journal(fork_dir).result("Create outline") == Journal(novel_dir).result("Create outline")
+    metadata = read_metadata(fork_dir)
+    assert metadata.status == BookStatus.FINISHED
+    assert metadata.forked_from == novel_dir.name and metadata.model_name == "fake:words=30"
+    assert metadata.title == read_metadata(novel_dir).title
+    assert find_book_dir_by_title(output_dir, metadata.title) == novel_dir
+    assert find_book_dir_by_title(output_dir, fork_dir.name) == fork_dir
+    # Later steps whose prompts did not change are still asked of the fork's model, not taken from the cache
+    chapter_calls = [call for call in read_usage(fork_dir) if call.step == "Break into 2 chapters"]
+    assert chapter_calls and all(call.model == "fake:words=30" and not call.cache_hit for call in chapter_calls)
+
+
+def test_sharded_books_can_be_migrated_back(tmp_path):
+    """Books go to their hash shard, and migrating the tree moves them, their EPUBs and their forks"""
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    atomic_write_json(output_dir / "layout.json", {"shard": "hash", "levels": 2})
+    first = write_novel("A lighthouse keeper finds a message", output_dir, model_name="fake",
+                        num_chapters=1, sections_per_chapter=2, author="Test Author", image_model="fake")
+    novel_dir = Path(first.cover_path).parent
+    assert novel_dir.relative_to(output_dir) == Layout(shard="hash").book_dir(novel_dir.name, datetime.now())
+    assert Path(first.epub_path).parent == novel_dir.parent
+    fork_dir = Path(fork_novel(novel_dir, "Create outline", model_name="fake:words=30").epub_path).with_suffix("")
+    title = read_metadata(novel_dir).title
+    assert find_book_dir_by_title(output_dir, title) == novel_dir
+
+    assert migrate_layout(output_dir, Layout()) == 2
+    assert load_layout(output_dir) == Layout()
+    assert sorted(path.name for path in output_dir.iterdir() if path.is_dir()) == sorted(
+        ["cache", novel_dir.name, fork_dir.name])
+    flat_dir = output_dir / novel_dir.name
+    assert find_book_dir_by_title(output_dir, title) == flat_dir
+    metadata = read_metadata(flat_dir)
+    assert Path(metadata.epub_path).exists() and Path(metadata.cover_path).parent == flat_dir
+    assert Journal(flat_dir).result("Generate cover image")["cover_path"] == metadata.cover_path
+    assert Journal(output_dir / fork_dir.name).result("Generate a title") == Journal(flat_dir).result("Generate a title")
+
+    # Continuing the moved book finds everything in place and regenerates nothing
+    continued = write_novel("", output_dir, continue_novel_dir=flat_dir, model_name="fake", image_model="fake")
+    assert continued.epub_path == metadata.epub_path
+
+
 if __name__ == "__main__":
     success = test_multi_chapter_novel()
     exit(0 if success else 1)
\ No newline at end of file
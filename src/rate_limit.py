@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+from colorama import Fore, Style
+from pydantic import BaseModel
+from tracing import span
+
+# Kept in the output directory, beside the books
+RATE_LIMITS_NAME = "rate_limits.json"
+RATE_STATE_NAME = "rate_limits.sqlite"
+
+
+class RateLimits(BaseModel):
+    """Budget for one provider or provider:model. Buckets refill continuously and hold one minute's worth."""
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for pacing before the real count is known"""
+    return max(1, len(text) // 4)
+
+
+def load_rate_limits(path: Path) -> dict[str, RateLimits]:
+    """
+    Read limits keyed by provider ("openai") or provider and model ("openai:gpt-image-1"), e.g.
+    {"openai": {"requests_per_minute": 60, "tokens_per_minute": 90000}}. A missing file means no limits.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {key: RateLimits(**value) for key, value in data.items()}
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter shared by every thread and process using the same state file.
+
+    Each limited key has a requests bucket and a tokens bucket stored in SQLite; acquiring
+    updates both in one IMMEDIATE transaction, so concurrent workers never overspend.
+    A request larger than a whole bucket is let through once the bucket is full and leaves
+    it in debt, which delays the requests that follow.
+    """
+
+    def __init__(self, limits: dict[str, RateLimits], state_path: Path,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.limits = limits
+        self.state_path = Path(state_path)
+        self._clock = clock
+        self._sleep = sleep
+        self._local = threading.local()
+
+    def limits_for(self, key: str) -> tuple[Optional[str], Optional[RateLimits]]:
+        """Most specific configured limits for a provider:model key, and the key they are stored under"""
+        parts = key.split(":")
+        for i in range(len(parts), 0, -1):
+            candidate = ":".join(parts[:i])
+            if candidate in self.limits:
+                return candidate, self.limits[candidate]
+        return None, None
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.state_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _level(conn: sqlite3.Connection, name: str, capacity: float, now: float) -> float:
+        """Current fill of a bucket after refilling at capacity per minute since its last update"""
+        row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        return min(capacity, row[0] + (now - row[1]) * capacity / 60.0)
+
+    def _buckets(self, bucket_key: str, limits: RateLimits, tokens: float) -> list[tuple[str, float, float]]:
+        """(bucket name, capacity, cost) for each configured bucket; capacity is one minute of budget"""
+        buckets = []
+        if limits.requests_per_minute:
+            buckets.append((f"{bucket_key}|requests", limits.requests_per_minute, 1.0))
+        if limits.tokens_per_minute and tokens:
+            buckets.append((f"{bucket_key}|tokens", limits.tokens_per_minute, float(tokens)))
+        return buckets
+
+    def _try_take(self, buckets: list[tuple[str, float, float]]) -> float:
+        """Take from every bucket if all can pay, returning 0; otherwise take nothing and return the wait"""
+        conn = self._connection()
+        now = self._clock()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = {}
+            wait = 0.0
+            for name, capacity, cost in buckets:
+                level = self._level(conn, name, capacity, now)
+                levels[name] = level
+                needed = min(cost, capacity)
+                if level < needed:
+                    wait = max(wait, (needed - level) * 60.0 / capacity)
+
+            for name, capacity, cost in buckets:
+                level = levels[name] - (cost if wait == 0 else 0.0)
+                conn.execute("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)", (name, level, now))
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, key: str, tokens: int = 0):
+        """Block until one request of about `tokens` tokens may be sent for this provider:model"""
+        bucket_key, limits = self.limits_for(key)
+        if limits is None:
+            return
+        buckets = self._buckets(bucket_key, limits, tokens)
+        if not buckets:
+            return
+        announced = False
+        while True:
+            wait = self._try_take(buckets)
+            if wait <= 0:
+                return
+            if not announced and wait >= 1.0:
+                print(f"{Fore.YELLOW}   ⏳ Rate limit for {bucket_key}: waiting {wait:.1f}s{Style.RESET_ALL}")
+                announced = True
+            with span("rate limit wait", "wait", key=bucket_key):
+                self._sleep(wait)
+
+    def record_tokens(self, key: str, tokens: int):
+        """Charge tokens only known after the call (the completion) against the tokens bucket"""
+        bucket_key, limits = self.limits_for(key)
+        if limits is None or not limits.tokens_per_minute or not tokens:
+            return
+        name = f"{bucket_key}|tokens"
+        capacity = limits.tokens_per_minute
+        conn = self._connection()
+        now = self._clock()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            level = self._level(conn, name, capacity, now)
+            conn.execute("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)", (name, level - tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_default_limiters: dict[Path, RateLimiter] = {}
+_default_guard = threading.Lock()
+
+
+def default_rate_limiter(output_dir: Path) -> RateLimiter:
+    """Process-wide limiter for an output directory, configured from its rate_limits.json"""
+    output_dir = Path(os.path.abspath(output_dir))
+    with _default_guard:
+        limiter = _default_limiters.get(output_dir)
+        if limiter is None:
+            limiter = RateLimiter(load_rate_limits(output_dir / RATE_LIMITS_NAME), output_dir / RATE_STATE_NAME)
+            _default_limiters[output_dir] = limiter
+        return limiter
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+
+from rate_limit import RateLimiter, RateLimits, default_rate_limiter, estimate_tokens, load_rate_limits
+
+
+class FakeClock:
+    """Manually advanced clock; sleeping advances it"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def make_limiter(tmp_path, limits, clock):
+    return RateLimiter(limits, tmp_path / "rate.sqlite", clock=clock, sleep=clock.sleep)
+
+
+def test_unlimited_key_never_waits(tmp_path):
+    """Test that keys without configured limits pass straight through"""
+    clock = FakeClock()
+    limiter = make_limiter(tmp_path, {"openai": RateLimits(requests_per_minute=1)}, clock)
+    for _ in range(10):
+        limiter.acquire("ollama:llama3", tokens=10000)
+    assert clock.slept == []
+    assert not (tmp_path / "rate.sqlite").exists()
+
+
+def test_requests_per_minute_paces_requests(tmp_path):
+    """Test that a full bucket allows a burst and then paces at the refill rate"""
+    clock = FakeClock()
+    limiter = make_limiter(tmp_path, {"openai": RateLimits(requests_per_minute=6)}, clock)
+    for _ in range(6):
+        limiter.acquire("openai:gpt-4o")
+    assert clock.slept == []
+
+    limiter.acquire("openai:gpt-4o")
+    assert abs(sum(clock.slept) - 10.0) < 1e-6
+
+
+def test_oversized_request_leaves_bucket_in_debt(tmp_path):
+    """Test that a request larger than the token bucket waits for a full bucket and delays the next"""
+    clock = FakeClock()
+    limiter = make_limiter(tmp_path, {"openai": RateLimits(tokens_per_minute=1000)}, clock)
+    limiter.acquire("openai", tokens=3000)
+    assert clock.slept == []
+
+    limiter.acquire("openai", tokens=100)
+    # Back from -2000 to +100 at 1000 tokens a minute
+    assert abs(sum(clock.slept) - 126.0) < 1e-6
+
+
+def test_completion_tokens_are_charged(tmp_path):
+    """Test that tokens recorded after a call delay later requests"""
+    clock = FakeClock()
+    limiter = make_limiter(tmp_path, {"openai": RateLimits(tokens_per_minute=600)}, clock)
+    limiter.acquire("openai", tokens=100)
+    limiter.record_tokens("openai", 500)
+    limiter.acquire("openai", tokens=60)
+    assert abs(sum(clock.slept) - 6.0) < 1e-6
+
+
+def test_most_specific_limits_apply(tmp_path):
+    """Test that provider:model limits override provider limits"""
+    limiter = RateLimiter({"openai": RateLimits(requests_per_minute=60),
+                           "openai:gpt-image-1": RateLimits(requests_per_minute=5)}, tmp_path / "rate.sqlite")
+    assert limiter.limits_for("openai:gpt-image-1") == ("openai:gpt-image-1", RateLimits(requests_per_minute=5))
+    assert limiter.limits_for("openai:gpt-4o")[0] == "openai"
+    assert limiter.limits_for("anthropic:claude") == (None, None)
+
+
+def test_limiters_share_state_file(tmp_path):
+    """Test that separate limiters on one state file (as in separate processes) share a budget"""
+    clock = FakeClock()
+    limits = {"openai": RateLimits(requests_per_minute=2)}
+    first = make_limiter(tmp_path, limits, clock)
+    second = make_limiter(tmp_path, limits, clock)
+    first.acquire("openai")
+    second.acquire("openai")
+    assert clock.slept == []
+    first.acquire("openai")
+    assert abs(sum(clock.slept) - 30.0) < 1e-6
+
+
+def test_threads_do_not_overspend(tmp_path):
+    """Test that concurrent acquirers take exactly the available budget without waiting"""
+    limiter = RateLimiter({"openai": RateLimits(requests_per_minute=20)}, tmp_path / "rate.sqlite",
+                          clock=lambda: 1000.0, sleep=lambda seconds: (_ for _ in ()).throw(TimeoutError()))
+    granted = []
+    refused = []
+
+    def worker():
+        try:
+            limiter.acquire("openai")
+            granted.append(1)
+        except TimeoutError:
+            refused.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(granted) == 20
+    assert len(refused) == 10
+
+
+def test_load_rate_limits(tmp_path):
+    """Test reading limits from JSON and treating a missing file as no limits"""
+    assert load_rate_limits(tmp_path / "missing.json") == {}
+    path = tmp_path / "rate_limits.json"
+    path.write_text(json.dumps({"openai": {"requests_per_minute": 60, "tokens_per_minute": 90000}}))
+    assert load_rate_limits(path) == {"openai": RateLimits(requests_per_minute=60, tokens_per_minute=90000)}
+
+
+def test_default_limiter_belongs_to_its_output_dir(tmp_path):
+    """Test that each output directory's limits and state are its own, wherever the process runs"""
+    limited, unlimited = tmp_path / "limited", tmp_path / "unlimited"
+    limited.mkdir()
+    (limited / "rate_limits.json").write_text(json.dumps({"openai": {"requests_per_minute": 60}}))
+
+    limiter = default_rate_limiter(limited)
+    assert limiter.limits == {"openai": RateLimits(requests_per_minute=60)}
+    assert limiter.state_path == limited / "rate_limits.sqlite"
+    assert default_rate_limiter(limited / ".." / "limited") is limiter
+    assert default_rate_limiter(unlimited).limits == {}
+
+
+def test_estimate_tokens():
+    """Test the rough character-based token estimate"""
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 100
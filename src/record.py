@@ -1,54 +1,49 @@
 #!/usr/bin/env python3
 
-import json
 import os
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 from colorama import init, Fore, Style
 from pydantic import BaseModel
+from brain import fresh_answers
+from session import NovelSession
+from steps import content_hash
+from usage import LlmCall, save_usage, track_usage
+from tracing import attach_trace, span
 
 init(autoreset=True)
 
-# Global state for the novel directory and continue mode
-_novel_dir: Optional[Path] = None
-_continue_mode: bool = False
 
-
-def record(step_description: str, previous_result: Any, generator_result: Any, output_dir: Path = Path("output")) -> Any:
+def record(step_description: str, previous_result: Any, generator_result: Any, output_dir: Path = Path("output"),
+           session: Optional[NovelSession] = None, inputs: Any = None,
+           carry: Optional[Callable[[Any], Any]] = None) -> Any:
     """
     Record a step in the novel generation process with nice console output.
-    In continue mode, skips execution if the output already exists.
+    In continue mode, skips execution if the novel's journal already holds the step's result,
+    made from the same inputs.
 
     Args:
         step_description: What this step does (e.g., "Generate a title")
         previous_result: Result from the previous step (for context display)
         generator_result: The result from the generator function (or a callable that generates it)
-        output_dir: Base directory for outputs
+        output_dir: Base directory for outputs, when no session is given
+        session: The novel being written; without one the step is recorded on its own
+        inputs: Everything the step's result depends on, upstream results included; a change
+            to any of it makes continue mode re-run the step (and so everything that uses it)
+        carry: Gives, from the result, what later steps need of it, journaled beside it so
+            continue mode can have it without reading the result (see NovelSession.completed_carry)
 
     Returns:
         The generator_result (for chaining)
     """
-    global _continue_mode
-
-    # Determine the novel directory (stateful)
-    novel_dir = _get_or_set_novel_dir(None, output_dir)
-
-    # Generate step filename
-    step_name = step_description.lower().replace(' ', '_').replace('generate_', '').replace('determine_', '').replace('create_', '').replace('select_', '')
-    file_path = novel_dir / f"{step_name}.json"
-
-    # In continue mode, check if this step was already completed
-    if _continue_mode and file_path.exists():
-        print(f"\n{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}")
-        print(f"{Fore.BLUE}⏭️  Skipping: {step_description} (already completed){Style.RESET_ALL}")
-
-        # Load and return the existing result
-        with open(file_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
+    session = session or NovelSession(output_dir)
+    inputs_hash = content_hash(inputs) if inputs is not None else None
 
-        # Try to reconstruct the object if possible
-        from metadata import update_metadata_step
-        update_metadata_step(novel_dir, step_description, completed=True)
+    # In continue mode, check if this step was already completed from the same inputs
+    # (a torn journal line or a corrupt legacy step file just means the step re-runs)
+    json_data = session.completed_result(step_description, inputs_hash)
+    if json_data is not None:
+        print_skipped(step_description)
 
         # Return the loaded data
         return json_data
@@ -66,11 +61,16 @@ def record(step_description: str, previous_result: Any, generator_result: Any, o
                 print(f"{Fore.BLUE}   Context: {prev_str}{Style.RESET_ALL}")
 
         # Update metadata to show current step
-        from metadata import update_metadata_step
-        update_metadata_step(novel_dir, step_description, completed=False)
-
-        # Execute the generator
-        actual_result = generator_result()
+        session.step_started(step_description)
+
+        # Execute the generator, attributing its LLM calls to this step
+        calls: list[LlmCall] = []
+        try:
+            with track_usage(calls), span(step_description, "step"), fresh_answers(step_description in session.rerun):
+                actual_result = generator_result()
+        except BaseException:
+            save_usage(session.dir_for(), step_description, calls)
+            raise
     else:
         # Display what we're doing
         print(f"\n{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}")
@@ -83,37 +83,44 @@ def record(step_description: str, previous_result: Any, generator_result: Any, o
                 print(f"{Fore.BLUE}   Context: {prev_str}{Style.RESET_ALL}")
 
         actual_result = generator_result
+        calls = []
 
     # Format the result for display
     result_str = _format_for_display(actual_result)
     print(f"{Fore.GREEN}✓ Result: {result_str}{Style.RESET_ALL}")
 
-    # Update the novel directory if we have a title now
-    if hasattr(actual_result, 'title'):
-        _get_or_set_novel_dir(actual_result, output_dir)
+    # Fix the novel directory if we have a title now; the step is logged where the novel will live
+    novel_dir = session.dir_for(actual_result)
+    save_usage(novel_dir, step_description, calls)
+    if session.novel_dir is not None:
+        attach_trace(session.novel_dir)
 
     # Convert to JSON-serializable format
-    json_data = _to_json_data(actual_result)
+    with span("serialize", "serialize", step=step_description):
+        json_data = _to_json_data(actual_result)
 
-    # Save to file
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=2, ensure_ascii=False, default=str)
+    # Journal the result, which also marks the step as completed
+    session.step_completed(step_description, json_data, novel_dir, inputs_hash,
+                           carry(actual_result) if carry else None)
 
     # Try to get relative path, otherwise use absolute
+    journal_path = session.journal(novel_dir).path
     try:
-        display_path = file_path.relative_to(Path.cwd())
+        display_path = journal_path.relative_to(Path.cwd())
     except ValueError:
-        display_path = file_path
+        display_path = journal_path
 
     print(f"{Fore.BLUE}   Saved to: {display_path}{Style.RESET_ALL}")
 
-    # Update metadata to mark step as completed
-    from metadata import update_metadata_step
-    update_metadata_step(novel_dir, step_description, completed=True)
-
     return actual_result
 
 
+def print_skipped(step_description: str):
+    """Report a step continue mode found already completed"""
+    print(f"\n{Fore.CYAN}{'─' * 60}{Style.RESET_ALL}")
+    print(f"{Fore.BLUE}⏭️  Skipping: {step_description} (already completed){Style.RESET_ALL}")
+
+
 def _format_for_display(result: Any) -> str:
     """Format a result for nice console display"""
     if result is None:
@@ -148,53 +155,9 @@ def _format_for_display(result: Any) -> str:
     return result_str[:50] + "..." if len(result_str) > 50 else result_str
 
 
-def _get_or_set_novel_dir(result: Any, base_dir: Path) -> Path:
-    """Get or set the novel directory based on title (stateful)"""
-    global _novel_dir
-    
-    # If we already have a novel directory set, use it
-    if _novel_dir is not None:
-        return _novel_dir
-    
-    # Try to extract title from result
-    title = None
-    if hasattr(result, 'title'):
-        title = result.title
-    elif isinstance(result, dict) and 'title' in result:
-        title = result['title']
-    
-    if title:
-        # Clean title for directory name
-        clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-        clean_title = clean_title.replace(' ', '_')
-        novel_dir = base_dir / clean_title
-        # Set the global state so all future calls use this directory
-        _novel_dir = novel_dir
-    else:
-        # Use a temporary directory if no title yet, but don't set global state
-        novel_dir = base_dir / "novel_in_progress"
-    
-    novel_dir.mkdir(parents=True, exist_ok=True)
-    return novel_dir
-
-
-def reset_novel_dir():
-    """Reset the novel directory state for a new novel generation"""
-    global _novel_dir, _continue_mode
-    _novel_dir = None
-    _continue_mode = False
-
-
-def set_continue_mode(enabled: bool = True):
-    """Enable or disable continue mode"""
-    global _continue_mode
-    _continue_mode = enabled
-
-
-def set_novel_dir(novel_dir: Path):
-    """Set the novel directory for continuing a book"""
-    global _novel_dir
-    _novel_dir = novel_dir
+def _get_novel_dir(result: Any, base_dir: Path) -> Path:
+    """Directory a result would be recorded in, if it started a novel of its own"""
+    return NovelSession(base_dir).dir_for(result)
 
 
 def _to_json_data(data: Any) -> Any:
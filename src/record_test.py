@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from typing import List
 from enum import Enum
 
+from journal import Journal
 from record import record, _format_for_display, _get_novel_dir, _to_json_data
 
 
@@ -48,12 +49,8 @@ def test_record_with_title():
         novel_dir = output_dir / "The_Great_Adventure"
         assert novel_dir.exists()
         
-        file_path = novel_dir / "a_title.json"
-        assert file_path.exists()
-        
-        # Check content
-        with open(file_path) as f:
-            data = json.load(f)
+        # Check the result was journaled
+        data = Journal(novel_dir).result("Generate a title")
         assert data['title'] == "The Great Adventure"
         assert data['subtitle'] == "A Journey Begins"
 
@@ -74,8 +71,7 @@ def test_record_with_previous_context():
         
         # Check file was created in correct directory
         novel_dir = output_dir / "novel_in_progress"  # No title in plot_result
-        file_path = novel_dir / "plot_type.json"
-        assert file_path.exists()
+        assert Journal(novel_dir).result("Determine plot type")["reasoning"] == "It's funny"
 
 
 def test_format_for_display_with_title():
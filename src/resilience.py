@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import errno
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+from colorama import Fore, Style
+from tracing import span
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_RETRYABLE_ERRNOS = {errno.ECONNREFUSED, errno.ECONNRESET, errno.ECONNABORTED, errno.ETIMEDOUT,
+                     errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EPIPE}
+_RETRYABLE_MESSAGES = ("timed out", "timeout", "connection refused", "connection reset", "connection aborted",
+                       "temporarily unavailable", "service unavailable", "bad gateway", "gateway timeout",
+                       "internal server error", "overloaded", "too many requests", "rate limit",
+                       "remote end closed", "max retries exceeded")
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because its circuit is open and waiting is not allowed"""
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    for source in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "status", "http_status"):
+            value = getattr(source, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Whether an LLM call failure is transient (timeouts, 5xx, 429, refused or reset connections)
+    rather than permanent (bad request, unknown model, invalid output).
+    dazllm wraps provider errors, so the chain of causes and the message are checked too.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (TimeoutError, ConnectionError)):
+            return True
+        if isinstance(exc, OSError) and exc.errno in _RETRYABLE_ERRNOS:
+            return True
+        status = _status_code(exc)
+        if status is not None:
+            return status == 429 or status >= 500
+        message = str(exc).lower()
+        if any(marker in message for marker in _RETRYABLE_MESSAGES):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class Backoff:
+    """Exponential backoff with full jitter: a random delay up to base * factor**attempt, capped"""
+
+    def __init__(self, base: float = 1.0, factor: float = 2.0, max_delay: float = 300.0,
+                 rng: Optional[random.Random] = None):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def ceiling(self, attempt: int) -> float:
+        return min(self.max_delay, self.base * self.factor ** attempt)
+
+    def delay(self, attempt: int) -> float:
+        return self._rng.uniform(0, self.ceiling(attempt))
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    After failure_threshold consecutive retryable failures the circuit opens and calls are
+    refused until reset_timeout has passed; then one trial call is let through (half-open)
+    while other callers wait for its outcome. Success closes the circuit; failure reopens it
+    with the timeout doubled (with jitter), up to max_reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 600.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._clock = clock
+        # A Condition, so callers waiting on a half-open trial wake when it has an outcome
+        self._lock = threading.Condition()
+        self._rng = random.Random()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.opened_until = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now. In half-open state only one trial call is allowed."""
+        with self._lock:
+            if self.state == OPEN and self._clock() >= self.opened_until:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def time_until_retry(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.opened_until - self._clock())
+
+    def trial_in_flight(self) -> bool:
+        with self._lock:
+            return self.state == HALF_OPEN and self._trial_in_flight
+
+    def wait_for_trial(self, timeout: Optional[float] = None) -> bool:
+        """Block until the half-open trial call has an outcome; False if timeout passed first"""
+        with self._lock:
+            return self._lock.wait_for(lambda: not (self.state == HALF_OPEN and self._trial_in_flight), timeout)
+
+    def abandon_trial(self):
+        """The trial call ended without an outcome (e.g. it was interrupted): let another caller try"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+                self._lock.notify_all()
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.times_opened = 0
+            self._trial_in_flight = False
+            self._lock.notify_all()
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self):
+        """Open the circuit immediately, e.g. after a failed health check"""
+        with self._lock:
+            self._open()
+
+    def reset(self):
+        """Close the circuit immediately, e.g. after a passing health check"""
+        self.record_success()
+
+    def _open(self):
+        # Each reopening without an intervening success doubles the wait, with jitter so that
+        # many workers sharing a backend do not all retry at the same moment
+        timeout = self.reset_timeout
+        if self.times_opened:
+            ceiling = min(self.max_reset_timeout, self.reset_timeout * 2 ** self.times_opened)
+            timeout = ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+        self.state = OPEN
+        self.times_opened += 1
+        self.opened_until = self._clock() + timeout
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        self._lock.notify_all()
+
+
+def call_with_breaker(breaker: CircuitBreaker, fn: Callable[[], Any], backoff: Optional[Backoff] = None,
+                      give_up_after: Optional[float] = 6 * 3600, what: str = "LLM backend",
+                      sleep: Callable[[float], None] = time.sleep,
+                      clock: Callable[[], float] = time.monotonic) -> Any:
+    """
+    Call fn through a circuit breaker, pausing rather than failing while the backend is down.
+
+    Retryable errors are retried with jittered exponential backoff and counted against the
+    breaker; while the circuit is open the caller waits for it to half-open. Permanent errors
+    are raised immediately. While another caller's trial call is deciding whether the circuit
+    closes, the caller blocks until it has. After give_up_after seconds of continuous failure
+    the last error (or CircuitOpenError) is raised.
+    """
+    backoff = backoff or Backoff()
+    started = clock()
+    attempt = 0
+    last_error: Optional[BaseException] = None
+
+    while True:
+        if not breaker.allow():
+            if breaker.trial_in_flight():
+                remaining = None if give_up_after is None else max(0.0, give_up_after - (clock() - started))
+                with span("circuit trial", "wait", what=what):
+                    decided = breaker.wait_for_trial(remaining)
+                if not decided:
+                    if last_error:
+                        raise last_error
+                    raise CircuitOpenError(f"{what} circuit is half-open")
+                continue
+            wait = max(breaker.time_until_retry(), 0.05)
+            if give_up_after is not None and clock() - started + wait > give_up_after:
+                if last_error:
+                    raise last_error
+                raise CircuitOpenError(f"{what} circuit is open")
+            print(f"{Fore.YELLOW}   ⏸️  {what} unavailable, pausing for {wait:.0f}s before retrying{Style.RESET_ALL}")
+            with span("circuit open", "wait", what=what):
+                sleep(wait)
+            continue
+
+        try:
+            result = fn()
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # Interrupted (KeyboardInterrupt, cancellation): no verdict on the backend either way
+                breaker.abandon_trial()
+                raise
+            if not is_retryable(e):
+                # The backend answered - it is healthy even though this request was bad
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            last_error = e
+            delay = backoff.delay(attempt)
+            attempt += 1
+            if give_up_after is not None and clock() - started + delay > give_up_after:
+                raise
+            print(f"{Fore.YELLOW}   ↻  {what} error ({e}); retrying in {delay:.1f}s{Style.RESET_ALL}")
+            with span("retry backoff", "wait", what=what, error=type(e).__name__):
+                sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
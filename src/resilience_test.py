@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import errno
+import random
+import threading
+import time
+
+import pytest
+
+from resilience import (
+    Backoff, CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN,
+    call_with_breaker, is_retryable
+)
+
+
+class FakeClock:
+    """Manually advanced clock shared by the breaker and the retry loop"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class HttpError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_retryable_classification():
+    """Test which failures count as transient"""
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionRefusedError())
+    assert is_retryable(OSError(errno.ECONNRESET, "reset"))
+    assert is_retryable(HttpError(503))
+    assert is_retryable(HttpError(429))
+    assert is_retryable(Exception("Ollama request timed out after 600s"))
+    assert not is_retryable(HttpError(400))
+    assert not is_retryable(HttpError(404))
+    assert not is_retryable(ValueError("model returned invalid JSON"))
+
+
+def test_retryable_cause_chain():
+    """Test that wrapped transport errors are recognised"""
+    try:
+        try:
+            raise ConnectionRefusedError("refused")
+        except ConnectionRefusedError as e:
+            raise RuntimeError("dazllm call failed") from e
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
+
+
+def test_backoff_is_capped_and_jittered():
+    """Test exponential growth, the cap and full jitter"""
+    backoff = Backoff(base=1.0, factor=2.0, max_delay=10.0, rng=random.Random(1))
+    assert backoff.ceiling(0) == 1.0
+    assert backoff.ceiling(3) == 8.0
+    assert backoff.ceiling(10) == 10.0
+    delays = [backoff.delay(5) for _ in range(50)]
+    assert all(0 <= d <= 10.0 for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_breaker_opens_and_half_opens():
+    """Test the closed -> open -> half-open -> closed cycle"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0, clock=clock)
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.time_until_retry() == 30.0
+
+    clock.sleep(30.0)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one trial call while half-open
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_for_longer():
+    """Test that the reset timeout grows while the backend keeps failing"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, max_reset_timeout=1000.0, clock=clock)
+    breaker.record_failure()
+    assert breaker.time_until_retry() == 10.0
+
+    clock.sleep(10.0)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert 10.0 <= breaker.time_until_retry() <= 20.0
+
+    clock.sleep(20.0)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert 20.0 <= breaker.time_until_retry() <= 40.0
+
+
+def test_call_pauses_through_outage():
+    """Test that a backend restart pauses the caller rather than failing it"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0, clock=clock)
+    outcomes = [ConnectionRefusedError("down")] * 5 + ["ok"]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    result = call_with_breaker(breaker, call, backoff=Backoff(base=0.5, rng=random.Random(2)),
+                               sleep=clock.sleep, clock=clock)
+
+    assert result == "ok"
+    assert breaker.state == CLOSED
+    assert clock.now > 1030.0
+
+
+def test_permanent_errors_are_not_retried():
+    """Test that a bad request fails immediately and leaves the circuit closed"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, clock=clock)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise HttpError(400)
+
+    with pytest.raises(HttpError):
+        call_with_breaker(breaker, call, sleep=clock.sleep, clock=clock)
+    assert len(calls) == 1
+    assert breaker.state == CLOSED
+
+
+def test_gives_up_after_limit():
+    """Test that an outage longer than give_up_after eventually raises"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0, clock=clock)
+
+    def call():
+        raise TimeoutError("still down")
+
+    with pytest.raises(TimeoutError):
+        call_with_breaker(breaker, call, give_up_after=300.0, sleep=clock.sleep, clock=clock)
+    assert clock.now - 1000.0 <= 300.0
+
+
+def test_open_circuit_without_history_raises_circuit_open():
+    """Test the error raised when the circuit was opened elsewhere and waiting is not allowed"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(reset_timeout=60.0, clock=clock)
+    breaker.trip()
+
+    with pytest.raises(CircuitOpenError):
+        call_with_breaker(breaker, lambda: "unused", give_up_after=10.0, sleep=clock.sleep, clock=clock)
+
+
+def test_callers_wait_for_half_open_trial(capsys):
+    """Test that while the trial call runs, other callers block on its outcome rather than polling"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 31.0
+    trial_started = threading.Event()
+    finish_trial = threading.Event()
+    sleeps = []
+
+    def trial():
+        trial_started.set()
+        finish_trial.wait(5)
+        return "trial"
+
+    results = []
+    trial_thread = threading.Thread(target=lambda: results.append(call_with_breaker(breaker, trial, clock=clock)))
+    trial_thread.start()
+    assert trial_started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(
+        call_with_breaker(breaker, lambda: "waiter", sleep=sleeps.append, clock=clock)))
+    waiter.start()
+    time.sleep(0.2)
+    assert waiter.is_alive()
+    finish_trial.set()
+    trial_thread.join(5)
+    waiter.join(5)
+
+    assert sorted(results) == ["trial", "waiter"]
+    assert sleeps == []
+    assert "pausing" not in capsys.readouterr().out
+
+
+def test_interrupted_trial_frees_the_breaker():
+    """Test that a trial ended by KeyboardInterrupt lets the next caller make the trial"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 31.0
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        call_with_breaker(breaker, interrupted, sleep=clock.sleep, clock=clock)
+
+    assert breaker.state == HALF_OPEN
+    assert not breaker.trial_in_flight()
+    assert call_with_breaker(breaker, lambda: "ok", sleep=clock.sleep, clock=clock, give_up_after=1.0) == "ok"
+    assert breaker.state == CLOSED
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Optional
+from colorama import Fore, Style
+from tracing import span
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms fall back to in-process locking only
+    fcntl = None
+
+
+class _PathLock:
+    """Re-entrant lock for one lock file, shared by all threads in this process"""
+
+    def __init__(self, lock_path: Path):
+        self.lock_path = lock_path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.fd: Optional[int] = None
+
+
+_locks_guard = threading.Lock()
+_locks: dict[str, _PathLock] = {}
+
+
+def _lock_path_for(path: Path) -> Path:
+    """Lock file guarding a path - a hidden sibling for files, '.lock' inside directories"""
+    if path.is_dir():
+        return path / ".lock"
+    return path.with_name(f".{path.name}.lock")
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on a file or directory.
+
+    The lock is re-entrant within a thread, serialises threads within this process
+    and uses flock() to serialise other processes sharing the same output tree.
+    """
+    lock_path = _lock_path_for(Path(path))
+    with _locks_guard:
+        entry = _locks.setdefault(str(lock_path), _PathLock(lock_path))
+
+    with entry.thread_lock:
+        if entry.depth == 0:
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+            entry.fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl:
+                fcntl.flock(entry.fd, fcntl.LOCK_EX)
+        entry.depth += 1
+        try:
+            yield
+        finally:
+            entry.depth -= 1
+            if entry.depth == 0:
+                if fcntl:
+                    fcntl.flock(entry.fd, fcntl.LOCK_UN)
+                os.close(entry.fd)
+                entry.fd = None
+
+
+def _fsync_dir(directory: Path):
+    """Flush a directory entry so a completed rename survives a crash"""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_writer(path: Path) -> Iterator[BinaryIO]:
+    """
+    Stream bytes to a file that only appears, complete, once the block exits cleanly.
+    Writes to a temp file in the same directory, fsyncs it, then renames over the target.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_dir(path.parent)
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Write bytes so readers only ever see the old or the new content"""
+    with atomic_writer(path) as f:
+        f.write(data)
+
+
+def atomic_write_text(path: Path, text: str):
+    """Atomically write UTF-8 text"""
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_json(path: Path, data: Any, lock: bool = True, **dump_kwargs):
+    """Atomically write JSON, holding the file's advisory lock unless told not to"""
+    dump_kwargs.setdefault('ensure_ascii', False)
+    dump_kwargs.setdefault('default', str)
+    with span(f"write {Path(path).name}", "io") as args:
+        text = json.dumps(data, **dump_kwargs)
+        args["bytes"] = len(text)
+        if lock:
+            with file_lock(path):
+                atomic_write_text(path, text)
+        else:
+            atomic_write_text(path, text)
+
+
+def quarantine(path: Path) -> Path:
+    """Move a corrupt file aside so the next run regenerates it instead of crashing"""
+    path = Path(path)
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    target = path.with_name(f"{path.name}.corrupt-{stamp}")
+    os.replace(path, target)
+    print(f"{Fore.YELLOW}⚠️  Corrupt file quarantined: {path} -> {target.name}{Style.RESET_ALL}")
+    return target
+
+
+def read_json(path: Path) -> Optional[Any]:
+    """
+    Read a JSON file, returning None if it is missing.
+    Truncated or otherwise unreadable files are quarantined and treated as missing.
+    """
+    path = Path(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        try:
+            quarantine(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+
+def append_jsonl(path: Path, record: Any, fsync: bool = False) -> int:
+    """
+    Append one JSON record as a line and return its size in bytes. The line goes out in a single
+    O_APPEND write, so concurrent writers never interleave and a crash can only tear the last line.
+    With fsync, the line is on disk before this returns.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(record, ensure_ascii=False, default=str, separators=(',', ':')) + "\n").encode('utf-8')
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+        if fsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    return len(line)
+
+
+def read_jsonl(path: Path) -> Iterator[Any]:
+    """Records written by append_jsonl, oldest first. A missing file is empty; torn lines are skipped."""
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from safe_io import (
+    append_jsonl, atomic_write_json, atomic_write_text, file_lock, quarantine, read_json, read_jsonl
+)
+
+
+def test_atomic_write_json_round_trip():
+    """Test that atomically written JSON reads back unchanged"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "nested" / "data.json"
+
+        atomic_write_json(path, {"title": "Café", "count": 3}, indent=2)
+
+        assert read_json(path) == {"title": "Café", "count": 3}
+        # No temp files are left behind
+        assert [p.name for p in path.parent.iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_atomic_write_replaces_existing_content():
+    """Test that a rewrite fully replaces the previous content"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "data.json"
+
+        atomic_write_json(path, {"value": "x" * 1000})
+        atomic_write_json(path, {"value": "short"})
+
+        assert read_json(path) == {"value": "short"}
+
+
+def test_read_json_missing_file():
+    """Test that a missing file reads as None"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        assert read_json(Path(tmpdir) / "missing.json") is None
+
+
+def test_read_json_quarantines_truncated_file():
+    """Test that truncated JSON is moved aside instead of raising"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "broken.json"
+        path.write_text('{"title": "Half a', encoding='utf-8')
+
+        assert read_json(path) is None
+        assert not path.exists()
+
+        quarantined = list(Path(tmpdir).glob("broken.json.corrupt-*"))
+        assert len(quarantined) == 1
+        assert quarantined[0].read_text(encoding='utf-8') == '{"title": "Half a'
+
+
+def test_quarantine_keeps_each_corrupt_copy():
+    """Test that quarantining twice does not overwrite the first copy"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "broken.json"
+        path.write_text("first", encoding='utf-8')
+        quarantine(path)
+        path.write_text("second", encoding='utf-8')
+        quarantine(path)
+
+        assert len(list(Path(tmpdir).glob("broken.json.corrupt-*"))) == 2
+
+
+def test_file_lock_is_reentrant():
+    """Test that the same thread can take a lock it already holds"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "metadata.json"
+
+        with file_lock(path):
+            with file_lock(path):
+                atomic_write_text(path, "{}")
+
+        assert read_json(path) == {}
+
+
+def test_file_lock_serialises_read_modify_write():
+    """Test that concurrent read-modify-write cycles under the lock lose no updates"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "counter.json"
+        atomic_write_json(path, {"count": 0})
+
+        def increment():
+            for _ in range(20):
+                with file_lock(path):
+                    data = read_json(path)
+                    data["count"] += 1
+                    atomic_write_json(path, data)
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert json.loads(path.read_text(encoding='utf-8')) == {"count": 80}
+
+
+def test_jsonl_append_and_read_skips_torn_line():
+    """Test that appended records read back in order and a torn final line is ignored"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "log.jsonl"
+        assert list(read_jsonl(path)) == []
+
+        append_jsonl(path, {"n": 1})
+        append_jsonl(path, {"n": 2})
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"n": 3')
+
+        assert list(read_jsonl(path)) == [{"n": 1}, {"n": 2}]
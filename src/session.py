@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+from colorama import Fore, Style
+from pydantic import ValidationError
+from catalog import catalog_for
+from journal import COMPLETED, Journal
+from layout import book_name, load_layout, output_root
+from metadata import BookMetadata, BookStatus, METADATA_FILE, read_metadata, write_metadata
+from safe_io import file_lock
+from steps import rehydrate
+from tracing import span
+
+IN_PROGRESS_DIR = "novel_in_progress"
+# Rewrite metadata.json at most this often while steps complete; the journal is always current
+FLUSH_INTERVAL = 5.0
+
+
+def novel_dir_for(output_dir: Path, title: str) -> Path:
+    """
+    Directory a novel with this title lives in: the one the catalog has for it, or for a
+    new book, where the output directory's layout puts it
+    """
+    existing = catalog_for(output_dir).directory_of(title)
+    if existing is not None:
+        return existing
+    return Path(output_dir) / load_layout(output_dir).book_dir(book_name(title), datetime.now())
+
+
+def title_of(result: Any) -> Optional[str]:
+    if hasattr(result, 'title'):
+        return result.title
+    if isinstance(result, dict) and 'title' in result:
+        return result['title']
+    return None
+
+
+class NovelSession:
+    """
+    One novel being written: its directory, whether it is being continued, and its metadata,
+    held in memory. Step results go straight to the novel's journal (fsynced), so metadata.json
+    is only rewritten every flush_interval seconds and at the boundaries write_novel flushes
+    at. A crash loses nothing - read_metadata replays the journal written since the last flush.
+
+    When continuing, steps named in rerun run again, asking the model afresh, and steps
+    matching the keep_stale pattern keep their results even if their inputs have changed
+    (listed in stale_steps until they next run).
+    """
+
+    def __init__(self, output_dir: Path, novel_dir: Optional[Path] = None, continue_mode: bool = False,
+                 flush_interval: float = FLUSH_INTERVAL, clock: Callable[[], float] = time.monotonic,
+                 rerun: Iterable[str] = (), keep_stale: Optional[str] = None):
+        self.output_dir = Path(output_dir)
+        self.novel_dir = Path(novel_dir) if novel_dir else None
+        self.continue_mode = continue_mode
+        self.rerun = set(rerun)
+        self.keep_stale = re.compile(keep_stale) if keep_stale else None
+        self.flush_interval = flush_interval
+        self.metadata: Optional[BookMetadata] = read_metadata(self.novel_dir) if self.novel_dir else None
+        self._clock = clock
+        self._last_flush = clock()
+        self._dirty = False
+        self._journals: dict[Path, Journal] = {}
+        self._completed_untracked: list[str] = []
+
+    @classmethod
+    def resume(cls, novel_dir: Path, output_dir: Optional[Path] = None, **kwargs) -> "NovelSession":
+        """A session continuing the novel in novel_dir"""
+        return cls(output_dir or output_root(novel_dir), novel_dir, continue_mode=True, **kwargs)
+
+    def dir_for(self, result: Any = None) -> Path:
+        """
+        The novel's directory. The first result with a title fixes it;
+        until then results go to novel_in_progress.
+        """
+        if self.novel_dir is None:
+            title = title_of(result)
+            if not title:
+                directory = self.output_dir / IN_PROGRESS_DIR
+                directory.mkdir(parents=True, exist_ok=True)
+                return directory
+            self.novel_dir = novel_dir_for(self.output_dir, title)
+            self.novel_dir.mkdir(parents=True, exist_ok=True)
+        return self.novel_dir
+
+    def journal(self, novel_dir: Optional[Path] = None) -> Journal:
+        """The journal for the novel's directory, kept for the session so its results index loads once"""
+        novel_dir = novel_dir or self.dir_for()
+        if novel_dir not in self._journals:
+            self._journals[novel_dir] = Journal(novel_dir)
+        return self._journals[novel_dir]
+
+    def completed_result(self, step: str, inputs: Optional[str] = None) -> Optional[Any]:
+        """
+        In continue mode, the recorded result of a step that has already completed, as its
+        registered model. A result that no longer fits its model, or that was made from inputs
+        other than the given inputs hash, counts as not completed. Results recorded without a
+        hash (before steps hashed their inputs) are taken as current.
+        """
+        if not self.continue_mode:
+            return None
+        if step in self.rerun:
+            print(f"{Fore.YELLOW}⟳ Regenerating '{step}'{Style.RESET_ALL}")
+            return None
+        journal = self.journal()
+        recorded_inputs = journal.inputs(step)
+        stale = bool(inputs and recorded_inputs and recorded_inputs != inputs)
+        if stale and not (self.keep_stale and self.keep_stale.fullmatch(step)):
+            print(f"{Fore.YELLOW}⟳ Inputs of '{step}' have changed since it was recorded, re-running it{Style.RESET_ALL}")
+            return None
+        result = self.recorded_result(step)
+        if result is None:
+            return None
+        if stale:
+            print(f"{Fore.YELLOW}⚠️  Keeping '{step}' although its inputs have changed (flagged stale){Style.RESET_ALL}")
+            self._flag_stale(step)
+        # Novels from before the journal only recorded the result in a step file
+        if not journal.has_result(step):
+            journal.append(COMPLETED, step)
+            self._completed(step)
+        return result
+
+    def completed_carry(self, step: str, inputs: str) -> Optional[Any]:
+        """
+        In continue mode, the carry (see Journal.carry) of a step that has already completed
+        from the given inputs hash, without reading its result. None means the step has to go
+        through completed_result: it is to be re-run, its inputs have changed, or it has no carry.
+        """
+        if not self.continue_mode or step in self.rerun:
+            return None
+        journal = self.journal()
+        if journal.inputs(step) != inputs:
+            return None
+        return journal.carry(step)
+
+    def recorded_result(self, step: str, from_parent: bool = False) -> Optional[Any]:
+        """
+        The step's latest recorded result as its registered model, whatever inputs it was made
+        from, or None if there is none or it no longer fits its model. With from_parent, a
+        fork falls back on the result its parent had recorded when it was forked.
+        """
+        journal = self.journal()
+        data = journal.result(step)
+        if data is None and from_parent and journal.parent is not None:
+            data = journal.parent.result(step)
+        if data is None:
+            return None
+        try:
+            return rehydrate(step, data)
+        except ValidationError as e:
+            print(f"{Fore.YELLOW}⚠️  Recorded result of '{step}' no longer fits its model, re-running it: "
+                  f"{e.error_count()} error(s){Style.RESET_ALL}")
+            return None
+
+    def start(self, metadata: BookMetadata):
+        """Create the novel's metadata, once its directory is known"""
+        self.metadata = metadata
+        for step in self._completed_untracked:
+            if step not in metadata.completed_steps:
+                metadata.completed_steps.append(step)
+        self._completed_untracked = []
+        self.flush(force=True)
+
+    def step_started(self, step: str):
+        if self.metadata is None:
+            return
+        self.journal().started(step)
+        self.metadata.current_step = step
+        # Completions, not starts, are what readers wait for - the flush waits for the step to finish
+        self._dirty = True
+        self._note_progress()
+
+    def step_completed(self, step: str, result: Any, novel_dir: Optional[Path] = None,
+                       inputs: Optional[str] = None, carry: Any = None):
+        """Journal a step's result (durably) with the hash of its inputs and its carry, then note it in the metadata"""
+        journal = self.journal(novel_dir)
+        with span("journal", "io", step=step):
+            journal.completed(step, result, inputs, carry)
+        self._completed(step)
+
+    def _completed(self, step: str):
+        if self.metadata is None:
+            self._completed_untracked.append(step)
+            return
+        if step not in self.metadata.completed_steps:
+            self.metadata.completed_steps.append(step)
+        if step in self.metadata.stale_steps:
+            self.metadata.stale_steps.remove(step)
+        if self.metadata.current_step == step:
+            self.metadata.current_step = None
+        self._dirty = True
+        if self._clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+        else:
+            self._note_progress()
+
+    def _note_progress(self):
+        """Bring the book's catalog row up to date with its steps, so listings do not wait for a flush"""
+        if self.novel_dir is None:
+            return
+        try:
+            catalog_for(self.output_dir).update_progress(self.novel_dir, self.metadata)
+        except sqlite3.Error as e:
+            print(f"{Fore.YELLOW}⚠️  Book catalog not updated ({e}); run './run catalog-rebuild'{Style.RESET_ALL}")
+
+    def _flag_stale(self, step: str):
+        if self.metadata is not None and step not in self.metadata.stale_steps:
+            self.metadata.stale_steps.append(step)
+            self._dirty = True
+
+    def flush(self, force: bool = False):
+        """Write the in-memory metadata to metadata.json, if anything changed since the last flush"""
+        if self.metadata is None or self.novel_dir is None or not (self._dirty or force):
+            return
+        journal = self.journal()
+        with span("flush metadata", "metadata"), file_lock(self.novel_dir / METADATA_FILE):
+            self.metadata.journal_offset = journal.end_offset()
+            write_metadata(self.novel_dir, self.metadata)
+        journal.uncompacted_bytes = 0
+        self._dirty = False
+        self._last_flush = self._clock()
+
+    def finish(self, epub_path: str, cover_path: str):
+        """Mark the book as finished with its final paths"""
+        if self.metadata is None:
+            return
+        self.metadata.status = BookStatus.FINISHED
+        self.metadata.epub_path = epub_path
+        self.metadata.cover_path = cover_path
+        self.metadata.current_step = None
+        self.flush(force=True)
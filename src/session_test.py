@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import json
+from datetime import datetime
+
+from catalog import catalog_for
+from journal import Journal
+from metadata import BookMetadata, BookStatus, read_metadata
+from record import record
+from session import NovelSession, novel_dir_for, title_of
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _metadata(title: str) -> BookMetadata:
+    now = datetime.now().isoformat()
+    return BookMetadata(title=title, description="d", status=BookStatus.ONGOING, created_at=now,
+                        updated_at=now, author="a", model_name="fake", num_chapters=1, sections_per_chapter=2)
+
+
+def _on_disk(novel_dir):
+    with open(novel_dir / "metadata.json") as f:
+        return json.load(f)
+
+
+def test_novel_dir_for_strips_punctuation(tmp_path):
+    """Test that every title maps to the directory record and noveliser agree on"""
+    assert novel_dir_for(tmp_path, "Test Novel: The Beginning").name == "Test_Novel_The_Beginning"
+
+
+def test_metadata_flushes_are_debounced(tmp_path):
+    """Test that steps reach metadata.json only when the flush interval has passed"""
+    clock = FakeClock()
+    session = NovelSession(tmp_path, flush_interval=5, clock=clock)
+    record("Generate a title", None, {"title": "Slow Tide"}, session=session)
+    session.start(_metadata("Slow Tide"))
+    novel_dir = session.novel_dir
+    assert _on_disk(novel_dir)["completed_steps"] == ["Generate a title"]
+
+    record("Write Chapter 1, Section 1", None, lambda: {"text": "one"}, session=session)
+    assert _on_disk(novel_dir)["completed_steps"] == ["Generate a title"]
+    # ...but readers replay the journal, so nothing is lost if the process dies now
+    assert read_metadata(novel_dir).completed_steps == ["Generate a title", "Write Chapter 1, Section 1"]
+
+    clock.now = 6
+    record("Write Chapter 1, Section 2", None, lambda: {"text": "two"}, session=session)
+    on_disk = _on_disk(novel_dir)
+    assert on_disk["completed_steps"][-1] == "Write Chapter 1, Section 2"
+    assert on_disk["journal_offset"] == (novel_dir / "journal.jsonl").stat().st_size
+
+    session.finish("book.epub", "cover.png")
+    assert read_metadata(novel_dir).status == BookStatus.FINISHED
+
+
+def test_catalog_shows_progress_between_flushes(tmp_path):
+    """Test that listings see each step start and complete without waiting for metadata.json"""
+    session = NovelSession(tmp_path, flush_interval=5, clock=FakeClock())
+    record("Generate a title", None, {"title": "Slow Tide"}, session=session)
+    session.start(_metadata("Slow Tide"))
+    catalog = catalog_for(tmp_path)
+
+    session.step_started("Write Chapter 1, Section 1")
+    book = catalog.books("ongoing")[0]
+    assert (book["current_step"], book["completed_steps"]) == ("Write Chapter 1, Section 1", 1)
+
+    record("Write Chapter 1, Section 1", None, lambda: {"text": "one"}, session=session)
+    book = catalog.books("ongoing")[0]
+    assert (book["current_step"], book["completed_steps"]) == (None, 2)
+    assert _on_disk(session.novel_dir)["completed_steps"] == ["Generate a title"]
+
+
+def test_resumed_session_returns_journaled_results(tmp_path):
+    """Test that continue mode skips completed steps instead of running them"""
+    session = NovelSession(tmp_path)
+    record("Generate a title", None, {"title": "Second Wind"}, session=session)
+    session.start(_metadata("Second Wind"))
+    record("Choose a plot", None, {"plot_type": "quest"}, session=session)
+
+    resumed = NovelSession.resume(session.novel_dir)
+    assert resumed.metadata.completed_steps == ["Generate a title", "Choose a plot"]
+    assert record("Choose a plot", None, lambda: 1 / 0, session=resumed) == {"plot_type": "quest"}
+
+
+def test_resume_reruns_steps_whose_inputs_changed(tmp_path):
+    """Test that a recorded result is reused only for the inputs it was made from"""
+    session = NovelSession(tmp_path)
+    record("Generate a title", None, {"title": "Low Water"}, session=session)
+    session.start(_metadata("Low Water"))
+    record("Choose a plot", None, lambda: {"plot_type": "quest"}, session=session, inputs=("a sea story", 3))
+
+    resumed = NovelSession.resume(session.novel_dir)
+    assert record("Choose a plot", None, lambda: 1 / 0, session=resumed,
+                  inputs=("a sea story", 3)) == {"plot_type": "quest"}
+    assert record("Choose a plot", None, lambda: {"plot_type": "voyage"}, session=resumed,
+                  inputs=("a sea story", 4)) == {"plot_type": "voyage"}
+    # Results recorded without a hash are trusted, whatever the inputs now
+    assert title_of(record("Generate a title", None, lambda: 1 / 0, session=resumed, inputs="anything")) == "Low Water"
+
+
+def test_sessions_are_independent(tmp_path):
+    """Test that two novels recorded side by side keep to their own directories"""
+    first, second = NovelSession(tmp_path), NovelSession(tmp_path)
+    record("Generate a title", None, {"title": "First"}, session=first)
+    record("Generate a title", None, {"title": "Second"}, session=second)
+    record("Determine plot type", None, {"plot_type": "a"}, session=first)
+    record("Determine plot type", None, {"plot_type": "b"}, session=second)
+
+    assert Journal(tmp_path / "First").result("Determine plot type") == {"plot_type": "a"}
+    assert Journal(tmp_path / "Second").result("Determine plot type") == {"plot_type": "b"}
+    assert not (tmp_path / "novel_in_progress").exists()
+
+
+def test_resume_rehydrates_and_reruns_stale_results(tmp_path):
+    """Test that resumed results are typed, and ones that no longer fit their model re-run"""
+    from steps import register_step
+    from write_section import SectionResult
+    register_step(r"Test Section \d+", SectionResult)
+
+    session = NovelSession(tmp_path)
+    record("Generate a title", None, {"title": "Typed"}, session=session)
+    session.start(_metadata("Typed"))
+    record("Test Section 1", None, SectionResult(text="one", new_facts=["a"]), session=session)
+    record("Test Section 2", None, {"text": "missing its facts"}, session=session)
+
+    resumed = NovelSession.resume(session.novel_dir)
+    assert record("Test Section 1", None, lambda: 1 / 0, session=resumed) == SectionResult(text="one", new_facts=["a"])
+    rerun = record("Test Section 2", None, lambda: SectionResult(text="two", new_facts=[]), session=resumed)
+    assert rerun.text == "two"
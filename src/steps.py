@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import re
+from typing import Any, Optional, Type
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
+
+_registry: list[tuple[re.Pattern, Type[BaseModel]]] = []
+
+
+def register_step(pattern: str, model: Type[BaseModel]):
+    """
+    Declare the result model of the steps whose description matches pattern (a regex matched
+    against the whole description), so recorded results come back as that model
+    """
+    _registry.append((re.compile(pattern), model))
+
+
+def result_model(step: str) -> Optional[Type[BaseModel]]:
+    for pattern, model in _registry:
+        if pattern.fullmatch(step):
+            return model
+    return None
+
+
+def rehydrate(step: str, data: Any) -> Any:
+    """
+    A recorded result as its step's model; steps with no registered model get their data back
+    unchanged. Raises pydantic.ValidationError if the data no longer fits the model.
+
+    This validates rather than using model_construct: pydantic's compiled validator builds
+    nested models and enums several times faster than constructing them from Python.
+    """
+    model = result_model(step)
+    if model is None or not isinstance(data, dict):
+        return data
+    return model.model_validate(data)
+
+
+def content_hash(value: Any) -> str:
+    """
+    A stable hash of a step's inputs: models, enums and containers of them hash the same
+    however they were built, so an unchanged input gives the same hash on every run
+    """
+    data = json.dumps(to_jsonable_python(value, fallback=str), sort_keys=True, ensure_ascii=False,
+                      separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
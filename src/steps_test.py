@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import pytest
+from pydantic import ValidationError
+
+import noveliser  # noqa: F401 - registers the pipeline's steps
+from create_characters import CharacterRole, CharactersList
+from steps import content_hash, rehydrate, result_model
+from write_section import SectionResult
+
+
+def test_pipeline_steps_have_result_models():
+    """Test that every step write_novel records is registered, including numbered ones"""
+    assert result_model("Create characters") is CharactersList
+    assert result_model("Write Chapter 12, Section 3") is SectionResult
+    assert result_model("Break into 10 chapters").__name__ == "ChapterPlan"
+    assert result_model("Break Chapter 2 into 5 sections").__name__ == "SectionPlan"
+    assert result_model("Write Chapter 1") is None
+
+
+def test_rehydrate_builds_nested_models_and_enums():
+    """Test that recorded JSON comes back as the typed objects the next steps expect"""
+    data = {"characters": [{"name": "Ada", "biography": "b", "role": "protagonist", "traits": ["brave"]}]}
+    characters = rehydrate("Create characters", data)
+
+    assert isinstance(characters, CharactersList)
+    assert characters.characters[0].role is CharacterRole.PROTAGONIST
+
+
+def test_rehydrate_leaves_unregistered_steps_alone():
+    assert rehydrate("Some custom step", {"a": 1}) == {"a": 1}
+
+
+def test_rehydrate_rejects_results_that_no_longer_fit():
+    with pytest.raises(ValidationError):
+        rehydrate("Write Chapter 1, Section 1", {"text": "only text"})
+
+
+def test_content_hash_ignores_how_inputs_were_built():
+    """Test that a model and the JSON it was recorded as hash alike, and any change shows"""
+    section = SectionResult(text="The tide turned.", new_facts=["The tide turned"])
+    assert content_hash((section, 3)) == content_hash([{"new_facts": ["The tide turned"], "text": "The tide turned."}, 3])
+    assert content_hash((section, 3)) != content_hash((section, 4))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from colorama import Fore, Style
+
+TRACE_FILE = "trace.json"
+
+
+class Tracer:
+    """
+    Writes Chrome trace-event JSON (viewable in Perfetto or chrome://tracing) for one novel.
+
+    Events are appended one per line to a JSON array that is never closed, which the trace
+    viewers accept, so a crashed run still leaves a readable trace. Each thread is its own
+    track. Until the novel's directory is known (before the title exists) events are held
+    in memory and written when attach() is called.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path: Optional[Path] = None
+        self.pid = os.getpid()
+        self._pending: list[dict[str, Any]] = []
+        self._named_threads: set[int] = set()
+        self._lock = threading.Lock()
+        self.failed = False
+        if path is not None:
+            self.attach(path)
+
+    def attach(self, path: Path):
+        """Start writing to path (appending if it exists), flushing anything recorded so far"""
+        with self._lock:
+            if self.path is not None:
+                return
+            self.path = Path(path)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            pending, self._pending = self._pending, []
+            self._write(pending)
+
+    def _write(self, events: list[dict[str, Any]]):
+        if not events or self.failed:
+            return
+        text = "".join(json.dumps(event, default=str, separators=(',', ':')) + ",\n" for event in events)
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    text = "[\n" + text
+                os.write(fd, text.encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            # Tracing must never break a run - give up on this trace instead
+            self.failed = True
+            print(f"{Fore.YELLOW}⚠️  Tracing stopped, cannot write {self.path}: {e}{Style.RESET_ALL}")
+
+    def emit(self, event: dict[str, Any]):
+        thread = threading.current_thread()
+        tid = threading.get_native_id()
+        event.setdefault("pid", self.pid)
+        event.setdefault("tid", tid)
+        events = [event]
+        with self._lock:
+            if tid not in self._named_threads:
+                self._named_threads.add(tid)
+                events.insert(0, {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                                  "args": {"name": thread.name}})
+            if self.path is None:
+                self._pending.extend(events)
+            else:
+                self._write(events)
+
+    @contextmanager
+    def span(self, name: str, cat: str, **args) -> Iterator[dict[str, Any]]:
+        """Record the body as one complete ("X") event. The yielded dict becomes the event's args."""
+        for listener in _listeners:
+            listener.span_started(name, cat)
+        start = time.time()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            end = time.time()
+            event = {"name": name, "cat": cat, "ph": "X", "ts": int(start * 1e6),
+                     "dur": int((end - start) * 1e6), "args": args}
+            self.emit(event)
+            for listener in _listeners:
+                listener.span_finished(event)
+
+    def instant(self, name: str, cat: str, **args):
+        self.emit({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": int(time.time() * 1e6), "args": args})
+
+
+class TraceListener:
+    """Told about every span as it starts and ends, in the thread running it (e.g. to measure phases)"""
+
+    def span_started(self, name: str, cat: str):
+        pass
+
+    def span_finished(self, event: dict[str, Any]):
+        pass
+
+
+_listeners: list[TraceListener] = []
+_tracer: ContextVar[Optional[Tracer]] = ContextVar("tracer", default=None)
+
+
+def add_listener(listener: TraceListener):
+    _listeners.append(listener)
+
+
+def remove_listener(listener: TraceListener):
+    _listeners.remove(listener)
+
+
+def start_trace(path: Optional[Path] = None) -> Tracer:
+    """Trace everything run from this context (and work it hands to pool threads) from now on"""
+    tracer = Tracer(path)
+    _tracer.set(tracer)
+    return tracer
+
+
+def stop_trace():
+    _tracer.set(None)
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _tracer.get()
+
+
+def attach_trace(novel_dir: Path):
+    """Point the current trace at a novel's directory once it is known"""
+    tracer = _tracer.get()
+    if tracer is not None:
+        tracer.attach(novel_dir / TRACE_FILE)
+
+
+@contextmanager
+def span(name: str, cat: str, **args) -> Iterator[dict[str, Any]]:
+    """Trace the body if a trace is active; otherwise just run it"""
+    tracer = _tracer.get()
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, cat, **args) as event_args:
+        yield event_args
+
+
+def read_trace(path: Path) -> list[dict[str, Any]]:
+    """Events from a trace file, tolerating the unclosed array and a torn last line"""
+    events = []
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return events
+    with f:
+        for line in f:
+            line = line.strip().rstrip(',')
+            if line in ("[", "]", ""):
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return events
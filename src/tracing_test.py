@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import contextvars
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+from tracing import TRACE_FILE, attach_trace, read_trace, span, start_trace, stop_trace
+
+
+def test_span_without_trace_just_runs():
+    """Test that spans are harmless when nothing is being traced"""
+    with span("work", "test") as args:
+        args["extra"] = 1
+
+
+def test_events_before_attach_are_kept():
+    """Test that spans recorded before the novel directory exists are written on attach"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start_trace()
+        try:
+            with span("Generate a title", "step"):
+                with span("cache lookup", "cache") as args:
+                    args["hit"] = False
+            novel_dir = Path(tmpdir) / "novel"
+            assert not (novel_dir / TRACE_FILE).exists()
+
+            attach_trace(novel_dir)
+            with span("Determine plot type", "step"):
+                pass
+        finally:
+            stop_trace()
+
+        events = [e for e in read_trace(novel_dir / TRACE_FILE) if e["ph"] == "X"]
+        assert [e["name"] for e in events] == ["cache lookup", "Generate a title", "Determine plot type"]
+        assert events[0]["args"] == {"hit": False}
+        # The inner span lies within the outer one
+        assert events[1]["ts"] <= events[0]["ts"]
+        assert events[0]["ts"] + events[0]["dur"] <= events[1]["ts"] + events[1]["dur"]
+
+
+def test_trace_file_is_chrome_json_array():
+    """Test that the unclosed array loads as JSON once closed, as trace viewers do"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / TRACE_FILE
+        start_trace(path)
+        try:
+            with span("write metadata.json", "io"):
+                pass
+        finally:
+            stop_trace()
+
+        text = path.read_text()
+        assert text.startswith("[\n")
+        events = json.loads(text.rstrip().rstrip(",") + "]")
+        assert {e["ph"] for e in events} == {"M", "X"}
+
+
+def test_failed_span_records_error():
+    """Test that an exception is noted on the span and still propagates"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / TRACE_FILE
+        start_trace(path)
+        try:
+            with pytest.raises(ValueError):
+                with span("Write Chapter 1, Section 1", "step"):
+                    raise ValueError("bad output")
+        finally:
+            stop_trace()
+
+        [event] = [e for e in read_trace(path) if e["ph"] == "X"]
+        assert event["args"]["error"] == "ValueError"
+
+
+def test_threads_get_their_own_tracks():
+    """Test that work handed to threads with the caller's context lands on separate named tracks"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / TRACE_FILE
+        start_trace(path)
+        try:
+            def work(n):
+                with span(f"request {n}", "pool"):
+                    pass
+
+            threads = [threading.Thread(target=contextvars.copy_context().run, args=(work, n), name=f"worker-{n}")
+                       for n in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            stop_trace()
+
+        events = read_trace(path)
+        spans = [e for e in events if e["ph"] == "X"]
+        assert len({e["tid"] for e in spans}) == 3
+        names = {e["args"]["name"] for e in events if e["ph"] == "M"}
+        assert names == {"worker-0", "worker-1", "worker-2"}
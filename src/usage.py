@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+from pydantic import BaseModel
+from safe_io import append_jsonl, read_jsonl
+
+USAGE_FILE = "usage.jsonl"
+
+
+class LlmCall(BaseModel):
+    """One LLM call made through Brain (or a cover image), attributed to the pipeline step that made it"""
+    step: Optional[str] = None
+    kind: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    cache_hit: bool
+    at: float
+
+
+class UsageTotals(BaseModel):
+    """
+    Rolled-up usage. Token counts cover only calls that reached the model;
+    tokens_saved is what cache hits would otherwise have cost.
+    """
+    calls: int = 0
+    cache_hits: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tokens_saved: int = 0
+    llm_seconds: float = 0.0
+
+    def add(self, call: LlmCall):
+        self.calls += 1
+        if call.cache_hit:
+            self.cache_hits += 1
+            self.tokens_saved += call.prompt_tokens + call.completion_tokens
+        else:
+            self.prompt_tokens += call.prompt_tokens
+            self.completion_tokens += call.completion_tokens
+            self.llm_seconds += call.latency
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        return self.cache_hits / self.calls if self.calls else None
+
+
+class UsageSummary(BaseModel):
+    total: UsageTotals = UsageTotals()
+    by_step: dict[str, UsageTotals] = {}
+    by_model: dict[str, UsageTotals] = {}
+
+
+_current_calls: ContextVar[Optional[list[LlmCall]]] = ContextVar("current_calls", default=None)
+
+
+@contextmanager
+def track_usage(calls: list[LlmCall]) -> Iterator[list[LlmCall]]:
+    """Collect every call recorded in this context (this thread or task) into `calls`"""
+    token = _current_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _current_calls.reset(token)
+
+
+def record_call(kind: str, model: str, prompt_tokens: int, completion_tokens: int,
+                latency: float, cache_hit: bool):
+    """Note one call against the step being tracked, if any"""
+    calls = _current_calls.get()
+    if calls is None:
+        return
+    calls.append(LlmCall(kind=kind, model=model, prompt_tokens=prompt_tokens,
+                         completion_tokens=completion_tokens, latency=round(latency, 3),
+                         cache_hit=cache_hit, at=round(time.time(), 3)))
+
+
+def save_usage(novel_dir: Path, step: str, calls: list[LlmCall]) -> UsageTotals:
+    """Append a step's calls to the novel's usage log and return their totals"""
+    totals = UsageTotals()
+    for call in calls:
+        call.step = step
+        totals.add(call)
+        append_jsonl(novel_dir / USAGE_FILE, call.model_dump())
+    return totals
+
+
+def read_usage(novel_dir: Path) -> list[LlmCall]:
+    """Every call logged for a novel, oldest first"""
+    return [LlmCall(**record) for record in read_jsonl(novel_dir / USAGE_FILE)]
+
+
+def summarize_usage(calls: list[LlmCall]) -> UsageSummary:
+    """Totals for the whole novel, per step (in the order steps first ran) and per model"""
+    summary = UsageSummary()
+    for call in calls:
+        summary.total.add(call)
+        summary.by_step.setdefault(call.step or "(no step)", UsageTotals()).add(call)
+        summary.by_model.setdefault(call.model, UsageTotals()).add(call)
+    return summary
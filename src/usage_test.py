@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import tempfile
+from pathlib import Path
+
+from usage import LlmCall, read_usage, record_call, save_usage, summarize_usage, track_usage
+
+
+def test_calls_outside_a_step_are_ignored():
+    """Test that recording without an active tracker is a no-op"""
+    record_call("chat", "ollama:test", 10, 5, 0.1, cache_hit=False)
+
+
+def test_track_usage_collects_calls():
+    """Test that calls made inside a tracked block are collected, and only those"""
+    calls: list[LlmCall] = []
+    with track_usage(calls):
+        record_call("chat", "ollama:test", 100, 50, 1.5, cache_hit=False)
+        record_call("chat", "ollama:test", 100, 50, 0.0, cache_hit=True)
+    record_call("chat", "ollama:test", 1, 1, 0.0, cache_hit=False)
+
+    assert [call.cache_hit for call in calls] == [False, True]
+    assert calls[0].prompt_tokens == 100
+
+
+def test_save_and_summarize_usage():
+    """Test that per-step logs roll up per step, per model and per novel"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        novel_dir = Path(tmpdir)
+        title_calls: list[LlmCall] = []
+        with track_usage(title_calls):
+            record_call("chat_structured:TitleResult", "ollama:a", 200, 20, 2.0, cache_hit=False)
+        section_calls: list[LlmCall] = []
+        with track_usage(section_calls):
+            record_call("chat", "ollama:a", 1000, 800, 10.0, cache_hit=False)
+            record_call("chat", "ollama:b", 1000, 800, 0.01, cache_hit=True)
+
+        step_totals = save_usage(novel_dir, "Generate a title", title_calls)
+        save_usage(novel_dir, "Write Chapter 1, Section 1", section_calls)
+
+        assert step_totals.calls == 1
+        summary = summarize_usage(read_usage(novel_dir))
+
+        assert list(summary.by_step) == ["Generate a title", "Write Chapter 1, Section 1"]
+        assert summary.total.calls == 3
+        assert summary.total.cache_hits == 1
+        assert summary.total.prompt_tokens == 1200
+        assert summary.total.completion_tokens == 820
+        assert summary.total.tokens_saved == 1800
+        assert summary.total.llm_seconds == 12.0
+        assert summary.by_model["ollama:b"].hit_ratio == 1.0
+        assert summary.by_step["Write Chapter 1, Section 1"].completion_tokens == 800
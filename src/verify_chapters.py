@@ -10,6 +10,7 @@ import sys
 sys.path.append(str(Path(__file__).parent.parent))
 
 from src.noveliser import write_novel
+from src.journal import Journal
 from pathlib import Path
 import tempfile
 
@@ -39,28 +40,26 @@ def test_multiple_chapters():
             novel_dir = novel_dirs[0]
             print(f"\nNovel directory: {novel_dir.name}")
             
-            # Count chapter files
-            chapter_files = list(novel_dir.glob("write_chapter_*.json"))
-            print(f"Chapter files found: {len(chapter_files)}")
-            for cf in sorted(chapter_files):
-                print(f"  - {cf.name}")
+            # Count written sections
+            results = Journal(novel_dir).results()
+            section_steps = [step for step in results if step.startswith("Write Chapter")]
+            print(f"Sections written: {len(section_steps)}")
+            for step in section_steps:
+                print(f"  - {step}")
             
             # Check break_into_chapters
-            break_file = novel_dir / "break_into_chapters.json"
-            if break_file.exists():
-                import json
-                with open(break_file) as f:
-                    data = json.load(f)
-                    chapters = data.get('chapters', [])
-                    print(f"\nPlanned chapters: {len(chapters)}")
-                    for ch in chapters:
-                        print(f"  - Chapter {ch['number']}: {ch['title']} ({len(ch.get('sections', []))} sections)")
+            plan = next((data for step, data in results.items() if step.startswith("Break into")), None)
+            if plan is not None:
+                chapters = plan.get('chapters', [])
+                print(f"\nPlanned chapters: {len(chapters)}")
+                for ch in chapters:
+                    print(f"  - Chapter {ch['number']}: {ch['title']} ({len(ch.get('sections', []))} sections)")
             
             # Verify
-            if len(chapter_files) == 2:
+            if len(section_steps) == 2:
                 print("\n✅ SUCCESS: Both chapters were written!")
             else:
-                print(f"\n❌ ISSUE: Expected 2 chapter files, found {len(chapter_files)}")
+                print(f"\n❌ ISSUE: Expected 2 sections, found {len(section_steps)}")
         
         return result
 
@@ -4,7 +4,10 @@ from pydantic import BaseModel
 from brain import Brain
 from break_into_chapters import Chapter
 from break_into_sections import Section
+from define_writing_style import WritingStyle
 
+# How much of the story so far a section sees
+PREVIOUS_TEXT_CHARS = 2000
 
 class SectionResult(BaseModel):
     text: str
@@ -13,7 +16,7 @@ class SectionResult(BaseModel):
 
 def write_section(brain: Brain, chapter: Chapter, section: Section, 
                  previous_text: str, established_facts: list[str], 
-                 writing_style: str) -> SectionResult:
+                 writing_style: WritingStyle) -> SectionResult:
     """Write a single section of the novel."""
     
     # Determine position in story
@@ -38,7 +41,7 @@ Chapter Title: {chapter.title}
 Section Goal: {section.goal}
 Key Events: {section.key_events}
 
-{f'Previous text (last 2000 chars):\n{previous_text[-2000:]}' if previous_text else 'This is the beginning of the story.'}
+{f'Previous text (last {PREVIOUS_TEXT_CHARS} chars):\n{previous_text[-PREVIOUS_TEXT_CHARS:]}' if previous_text else 'This is the beginning of the story.'}
 
 Established Facts:
 {chr(10).join(established_facts) if established_facts else 'None yet'}
@@ -47,7 +50,7 @@ Write approximately 1500-2000 words for this section. Maintain continuity and st
 IMPORTANT: Do NOT include section headings, chapter numbers, or section numbers in your output. Write only the narrative text."""}
     ]
     
-    section_text = brain.chat(messages)
+    section_text = brain.chat(messages, label="chat:section")
     
     # Extract new facts
     fact_messages = [
@@ -63,7 +66,7 @@ Extract only NEW concrete facts like character descriptions, locations, relation
 Return as a simple list."""}
     ]
     
-    fact_response = brain.chat(fact_messages)
+    fact_response = brain.chat(fact_messages, label="chat:facts")
     # Parse the response into a list (simple approach)
     new_facts = [line.strip('- ').strip() for line in fact_response.split('\n') 
                 if line.strip() and not line.strip().startswith('Existing')]